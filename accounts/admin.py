@@ -12,10 +12,11 @@ class CustomUserAdmin(UserAdmin):
     list_display = [
         "email",
         "username",
-        "money",
+        "chips",
         "is_staff",
     ]
-    fieldsets = UserAdmin.fieldsets + ((None, {"fields": ("money",)}),)
-    add_fieldsets = UserAdmin.add_fieldsets + ((None, {"fields": ("money",)}),)
+    # the balance only moves through the chip ledger, see the adjust chips action in gameplay/admin.py
+    fieldsets = UserAdmin.fieldsets + ((None, {"fields": ("chips",)}),)
+    readonly_fields = ("chips",)
 
 admin.site.register(CustomUser, CustomUserAdmin)
\ No newline at end of file
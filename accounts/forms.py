@@ -7,7 +7,6 @@ class CustomUserCreationForm(UserCreationForm):
         fields = UserCreationForm.Meta.fields + (
             "username",
             "email",
-            "money",
         )
 
 
@@ -17,5 +16,4 @@ class CustomUserChangeForm(UserChangeForm):
         fields = (
             "username",
             "email",
-            "money",
         )
\ No newline at end of file
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:20
+
+from django.db import migrations, models
+
+
+def money_to_chips(apps, schema_editor):
+    CustomUser = apps.get_model("accounts", "CustomUser")
+    users = list(CustomUser.objects.all())
+    for user in users:
+        user.chips = round(user.money * 100)
+    CustomUser.objects.bulk_update(users, ["chips"], batch_size=500)
+
+
+def chips_to_money(apps, schema_editor):
+    CustomUser = apps.get_model("accounts", "CustomUser")
+    users = list(CustomUser.objects.all())
+    for user in users:
+        user.money = user.chips / 100
+    CustomUser.objects.bulk_update(users, ["money"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("accounts", "0002_remove_customuser_age_customuser_money"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="chips",
+            field=models.BigIntegerField(default=1000),
+        ),
+        migrations.RunPython(money_to_chips, chips_to_money),
+        migrations.RemoveField(
+            model_name="customuser",
+            name="money",
+        ),
+    ]
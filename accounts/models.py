@@ -2,6 +2,13 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 class CustomUser(AbstractUser):
-    money = models.FloatField(default=10.00)
+    # Balance in integer cents. A cache of the user's gameplay.ChipTransaction
+    # ledger, change it through ChipTransaction.objects.post().
+    chips = models.BigIntegerField(default=1000)
+
+    @property
+    def money(self) -> float:
+        return self.chips / 100
+
     def __str__(self):
         return self.username
@@ -2,6 +2,8 @@
 ASGI config for django_project project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+HTTP goes to Django, WebSockets to the gameplay consumers (table updates).
+Without channels installed it serves HTTP only.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -13,4 +15,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "django_project.settings")
 
-application = get_asgi_application()
+# set up Django before importing anything that touches models
+django_asgi_app = get_asgi_application()
+
+try:
+    from channels.auth import AuthMiddlewareStack  # noqa: E402
+    from channels.routing import ProtocolTypeRouter, URLRouter  # noqa: E402
+    from channels.security.websocket import AllowedHostsOriginValidator  # noqa: E402
+except ImportError:  # channels is optional, see gameplay.push
+    application = django_asgi_app
+else:
+    from gameplay.routing import websocket_urlpatterns  # noqa: E402
+
+    application = ProtocolTypeRouter(
+        {
+            "http": django_asgi_app,
+            "websocket": AllowedHostsOriginValidator(AuthMiddlewareStack(URLRouter(websocket_urlpatterns))),
+        }
+    )
@@ -128,4 +128,52 @@ CRISPY_TEMPLATE_PACK = "bootstrap5"
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 
 STATIC_URL = "static/"
-STATICFILES_DIRS = [BASE_DIR / "static"]
\ No newline at end of file
+STATICFILES_DIRS = [BASE_DIR / "static"]
+# Monte Carlo equity calculator (gameplay/equity.py).
+# EQUITY_WORKERS = 0 runs the simulation on the request thread.
+EQUITY_WORKERS = 4
+EQUITY_CONFIDENCE = 0.95
+EQUITY_MARGIN = 0.01
+EQUITY_MAX_SAMPLES = 200_000
+
+# Preflop equity table built by `manage.py build_preflop_equity`, memory mapped at startup.
+PREFLOP_EQUITY_PATH = BASE_DIR / "data" / "preflop_equity.bin"
+
+# Table actor runtime (gameplay/actors.py): one in-memory owner per game,
+# actions go over a queue instead of through the database.
+TABLE_ACTORS = False
+TABLE_ACTOR_WORKERS = 2
+TABLE_SNAPSHOT_EVERY = 20
+TABLE_SNAPSHOT_INTERVAL = 1.0
+
+# Live table updates over WebSockets (gameplay/push.py, django_project/asgi.py).
+# The in-memory layer only reaches consumers in the same process, use a
+# shared layer (e.g. channels_redis) with more than one server process.
+ASGI_APPLICATION = "django_project.asgi.application"
+CHANNEL_LAYERS = {
+    "default": {"BACKEND": "channels.layers.InMemoryChannelLayer"},
+}
+
+# Lobby pages (gameplay/lobby.py). Pages are cached this many seconds; joins
+# and new games clear this process's copies, other processes catch up when
+# theirs expire.
+LOBBY_PAGE_SIZE = 25
+LOBBY_CACHE_TIMEOUT = 5
+
+# Async gameplay views run their transactional work (dealing, actions) on a
+# pool of this many threads (gameplay/db_threads.py), which bounds the
+# database connections they hold. 0 runs it on the request's thread.
+GAMEPLAY_DB_THREADS = 8
+
+# Finished hands are appended to compressed segment files in this directory
+# (gameplay/history.py) by a background thread, a block every FLUSH_EVERY
+# hands or FLUSH_INTERVAL seconds. Web processes can share it, appends take a
+# file lock. None turns hand history off.
+HAND_HISTORY_DIR = BASE_DIR / "data" / "hands"
+HAND_HISTORY_FLUSH_EVERY = 256
+HAND_HISTORY_FLUSH_INTERVAL = 2.0
+HAND_HISTORY_SEGMENT_BYTES = 64 * 1024 * 1024
+
+# Columnar player statistics built from the hand history by
+# `manage.py player_stats` (gameplay/stats.py).
+HAND_STATS_DIR = BASE_DIR / "data" / "stats"
@@ -0,0 +1,237 @@
+"""
+Table actors: an optional runtime where each game has one in-memory owner.
+
+A TableRuntime runs a fixed set of worker threads and shards games over them
+by game_id, so every game always belongs to the same worker. That worker
+keeps the game's engine.HandState in memory and applies its actions one at a
+time from its queue: a single writer per table, and no database reads on the
+action path. Views hand work over with act() / start_round(), or aact() /
+astart_round() from async views, and wait for the reply.
+
+The owner checkpoints the hand to the models (Game.checkpoint) every
+snapshot_every actions, when a dirty table has not been saved for
+snapshot_interval seconds, when the hand ends (so balances settle right
+away) and on shutdown. After a restart tables are loaded again from the last
+snapshot.
+
+Enabled with settings.TABLE_ACTORS. Workers are threads of this process, so
+a deployment with several web processes has to route each game to the same
+process. A second writer is caught by Game's version check: the actions the
+owner had not saved yet are lost, so the table is marked stale, the action
+that found out and every later one answer stale, and the next start_round
+reloads the table from the database (which refuses to deal over the hand
+saved there until it is played out).
+"""
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from . import db_threads
+from .models import Game, StaleGameError
+
+logger = logging.getLogger(__name__)
+
+
+class _Table:
+    __slots__ = ("game", "state", "pending", "saved_at", "stale")
+
+    def __init__(self, game: Game):
+        self.game = game
+        self.state = game.load_hand()
+        self.pending = 0  # actions applied since the last checkpoint
+        self.saved_at = time.monotonic()
+        self.stale = False  # the game was written outside this worker, the state here can't be saved
+
+
+class TableWorker:
+    """Owns the tables sharded to it. threaded=False runs every call inline."""
+
+    def __init__(self, snapshot_every: int, snapshot_interval: float, threaded: bool = True):
+        self.snapshot_every = snapshot_every
+        self.snapshot_interval = snapshot_interval
+        self.tables: Dict[int, _Table] = {}
+        self._inbox: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True) if threaded else None
+        if self._thread is not None:
+            self._thread.start()
+
+    def call(self, fn: Callable, *args) -> Future:
+        future = Future()
+        if self._thread is None:
+            self._execute(fn, args, future)
+        else:
+            self._inbox.put((fn, args, future))
+        return future
+
+    def stop(self):
+        if self._thread is None:
+            self.snapshot_all()
+        else:
+            self._inbox.put(None)
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            try:
+                item = self._inbox.get(timeout=self.snapshot_interval)
+            except queue.Empty:
+                self._snapshot_due()
+                continue
+            if item is None:
+                self.snapshot_all()
+                connection.close()
+                return
+            self._execute(*item)
+
+    def _execute(self, fn, args, future: Future):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            close_old_connections()
+            future.set_result(fn(self, *args))
+        except BaseException as e:
+            future.set_exception(e)
+        self._snapshot_due()
+
+    # -- table state, only ever touched on the worker ------------------------
+
+    def table(self, game_id: int) -> _Table:
+        if game_id not in self.tables:
+            self.tables[game_id] = _Table(Game.objects.get(pk=game_id))
+        return self.tables[game_id]
+
+    def snapshot(self, game_id: int) -> bool:
+        """Checkpoint a table. False if it is stale: someone outside this worker wrote the game."""
+        table = self.tables[game_id]
+        if table.stale:
+            return False
+        if table.state is not None and table.pending:
+            try:
+                table.game.checkpoint(table.state)
+            except StaleGameError:
+                table.stale = True
+                logger.error(
+                    "Game #%s was written outside its table owner, %s acknowledged actions were not saved",
+                    game_id, table.pending,
+                )
+                return False
+        table.pending = 0
+        table.saved_at = time.monotonic()
+        return True
+
+    def snapshot_all(self):
+        self._snapshot_where(lambda table: True)
+
+    def _snapshot_due(self):
+        now = time.monotonic()
+        self._snapshot_where(lambda table: table.pending and now - table.saved_at >= self.snapshot_interval)
+
+    def _snapshot_where(self, due: Callable[[_Table], bool]):
+        # runs on the worker loop: a failed checkpoint must not end the thread, the next one retries
+        for game_id, table in list(self.tables.items()):
+            if not table.stale and due(table):
+                try:
+                    self.snapshot(game_id)
+                except Exception:
+                    logger.exception("Checkpoint of game #%s failed", game_id)
+
+
+def _stale(table: _Table) -> Dict[str, object]:
+    return {
+        "success": False, "stale": True, "version": table.game.version,
+        "message": "The table was changed elsewhere and its latest actions were lost, start the hand again.",
+    }
+
+
+def _act(worker: TableWorker, game_id: int, player_id: int, action: str, chips: int, version=None):
+    table = worker.table(game_id)
+    if table.stale:
+        return _stale(table)
+    if version not in (None, "") and str(version) != str(table.game.version):
+        return {"success": False, "stale": True, "message": "The table has moved on, refresh and try again.", "version": table.game.version}
+    if table.state is None:
+        return {"success": False, "message": "No hand in progress.", "version": table.game.version}
+    result = table.state.act(player_id, action, chips)
+    if result["success"]:
+        table.pending += 1
+        if (table.state.finished or table.pending >= worker.snapshot_every) and not worker.snapshot(game_id):
+            return _stale(table)
+    result["version"] = table.game.version
+    return result
+
+
+def _start_round(worker: TableWorker, game_id: int):
+    if game_id in worker.tables and not worker.snapshot(game_id):
+        del worker.tables[game_id]  # reload what the database has
+    table = worker.table(game_id)
+    table.game.invalidate_players()  # someone may just have sat down
+    try:
+        table.state = table.game.start_new_round()
+    except StaleGameError:
+        del worker.tables[game_id]
+        raise
+    table.pending = 0
+    table.saved_at = time.monotonic()
+    return {"hands": {p.id: p.hand for p in table.game.players_list()}, "version": table.game.version}
+
+
+class TableRuntime:
+    def __init__(self, workers: int = 2, snapshot_every: int = 20, snapshot_interval: float = 1.0, timeout: float = 5.0):
+        """workers=0 runs a single inline owner on the calling thread."""
+        self.timeout = timeout
+        self.workers = [
+            TableWorker(snapshot_every, snapshot_interval, threaded=workers > 0) for _ in range(max(workers, 1))
+        ]
+
+    def worker_for(self, game_id: int) -> TableWorker:
+        return self.workers[game_id % len(self.workers)]
+
+    def act(self, game_id: int, player_id: int, action: str, chips: int, version=None) -> Dict[str, object]:
+        return self.worker_for(game_id).call(_act, game_id, player_id, action, chips, version).result(self.timeout)
+
+    def start_round(self, game_id: int) -> Dict[str, object]:
+        return self.worker_for(game_id).call(_start_round, game_id).result(self.timeout)
+
+    async def aact(self, game_id: int, player_id: int, action: str, chips: int, version=None) -> Dict[str, object]:
+        return await self._await(game_id, _act, game_id, player_id, action, chips, version)
+
+    async def astart_round(self, game_id: int) -> Dict[str, object]:
+        return await self._await(game_id, _start_round, game_id)
+
+    async def _await(self, game_id: int, fn: Callable, *args):
+        """Wait for a worker without holding a thread. Inline workers run on the database pool."""
+        worker = self.worker_for(game_id)
+        if worker._thread is None:
+            return await db_threads.run(lambda: worker.call(fn, *args).result())
+        return await asyncio.wait_for(asyncio.wrap_future(worker.call(fn, *args)), self.timeout)
+
+    def shutdown(self):
+        """Checkpoint every table and stop the workers."""
+        for worker in self.workers:
+            worker.stop()
+
+
+_runtime: Optional[TableRuntime] = None
+_runtime_lock = threading.Lock()
+
+
+def get_runtime() -> TableRuntime:
+    """The runtime shared by every request in this process."""
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None:
+            _runtime = TableRuntime(
+                workers=getattr(settings, "TABLE_ACTOR_WORKERS", 2),
+                snapshot_every=getattr(settings, "TABLE_SNAPSHOT_EVERY", 20),
+                snapshot_interval=getattr(settings, "TABLE_SNAPSHOT_INTERVAL", 1.0),
+            )
+            atexit.register(_runtime.shutdown)
+        return _runtime
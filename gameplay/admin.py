@@ -24,9 +24,12 @@ class DeckAdmin(admin.ModelAdmin):
 
 
 
-from django.contrib import admin
+from decimal import Decimal, InvalidOperation
+
+from django.contrib import admin, messages
 from django.contrib.auth import get_user_model
-from gameplay.models import Game, Player
+from gameplay import seating
+from gameplay.models import ChipTransaction, Game, Player
 from gameplay.forms import SeatUsersForm
 
 User = get_user_model()
@@ -34,26 +37,38 @@ User = get_user_model()
 def seat_users(modeladmin, request, queryset):
     """Admin action: seat selected users in the chosen game."""
     game_id = request.POST.get('game')
+    if not game_id:
+        modeladmin.message_user(request, "Choose a game to seat the users in", messages.ERROR)
+        return
     game = Game.objects.get(pk=game_id)
 
-    added = 0
-    for user in queryset:
-        player, _ = Player.objects.get_or_create(user=user)
-        if not game.players.filter(id=player.id).exists():
-            player.sitting_in = True
-            player.seat_position = game.players.count()
-            player.save()
-            game.players.add(player)
-            added += 1
-
+    added = len(seating.seat_users(game, queryset.values_list('id', flat=True)))
     modeladmin.message_user(request, f"{added} users seated in Game #{game.id}")
 
 seat_users.short_description = "Seat selected users in chosen game"
 
+def adjust_chips(modeladmin, request, queryset):
+    """Admin action: add the amount to the selected users' balances, as a ledger post."""
+    try:
+        amount = round(Decimal(request.POST.get('amount', '')) * 100)
+    except InvalidOperation:
+        amount = 0
+    if not amount:
+        modeladmin.message_user(request, "Enter an amount of chips to add or take", messages.ERROR)
+        return
+
+    entries = ChipTransaction.objects.post(
+        {user_id: amount for user_id in queryset.values_list('id', flat=True)}, ChipTransaction.ADJUSTMENT
+    )
+    modeladmin.message_user(request, f"{len(entries)} balances adjusted by {amount / 100:.2f}")
+
+adjust_chips.short_description = "Adjust chips of selected users"
+
 class UserAdmin(admin.ModelAdmin):
-    actions = [seat_users]          # the action itself
-    action_form = SeatUsersForm     # adds the <select name="game"> box
-    list_display = ("username", "is_staff", "is_superuser")
+    actions = [seat_users, adjust_chips]
+    action_form = SeatUsersForm     # adds the game and amount boxes
+    list_display = ("username", "chips", "is_staff", "is_superuser")
+    readonly_fields = ("chips",)    # the balance only moves through the chip ledger
 
 # replace the stock User admin with our custom one
 admin.site.unregister(User)
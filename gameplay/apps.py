@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class GameplayConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "gameplay"
+
+    def ready(self):
+        from django.conf import settings
+        from . import preflop
+
+        preflop.load_table(settings.PREFLOP_EQUITY_PATH)
@@ -0,0 +1,196 @@
+"""
+Performance benchmarks for the evaluator and the hand lifecycle.
+
+Each bench_* function returns {metric_name: {"value", "unit", "better"}}
+where better is "higher" or "lower". run_all collects them, compare checks
+them against a stored baseline. The database benchmarks expect a throwaway
+(test) database, `manage.py benchmark` sets one up.
+"""
+import random
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import constants, evaluator
+from .models import Deck, Game, Player
+
+
+Metrics = Dict[str, Dict[str, object]]
+
+
+def _metric(value: float, unit: str, better: str) -> Dict[str, object]:
+    return {"value": round(value, 4), "unit": unit, "better": better}
+
+
+def _best_ms(
+    fn: Callable[[], object], repeat: int, setup: Optional[Callable[[], object]] = None, number: int = 1
+) -> float:
+    """
+    Fastest of repeat samples, like timeit: the least disturbed by other load.
+    A sample times number calls and counts their mean, so sub-millisecond
+    calls are not measured against the clock's own jitter. setup runs untimed
+    before each call, and one warmup call runs before the samples.
+    """
+    if setup is not None:
+        setup()
+    fn()
+    timings = []
+    for _ in range(repeat):
+        total = 0.0
+        for _ in range(number):
+            if setup is not None:
+                setup()
+            start = time.perf_counter()
+            fn()
+            total += time.perf_counter() - start
+        timings.append(total / number * 1000)
+    return min(timings)
+
+
+def _count_queries(fn: Callable[[], object], setup: Optional[Callable[[], object]] = None) -> int:
+    if setup is not None:
+        setup()
+    with CaptureQueriesContext(connection) as ctx:
+        fn()
+    return len(ctx.captured_queries)
+
+
+def bench_evaluator(hands: int = 20000) -> Metrics:
+    rng = random.Random(0)
+    rows7 = [rng.sample(range(52), 7) for _ in range(hands)]
+    rows5 = [r[:5] for r in rows7]
+    legacy = [[evaluator.decode_card(c) for c in r] for r in rows5[:2000]]
+
+    def throughput(fn, rows):
+        start = time.perf_counter()
+        for r in rows:
+            fn(r)
+        return len(rows) / (time.perf_counter() - start)
+
+    batch = np.array(rows7)
+    start = time.perf_counter()
+    evaluator.evaluate_batch(batch)
+    batch_rate = len(rows7) / (time.perf_counter() - start)
+
+    return {
+        "evaluator.eval5_per_sec": _metric(throughput(evaluator.evaluate, rows5), "hands/s", "higher"),
+        "evaluator.eval7_per_sec": _metric(throughput(evaluator.evaluate, rows7), "hands/s", "higher"),
+        "evaluator.batch7_per_sec": _metric(batch_rate, "hands/s", "higher"),
+        "evaluator.legacy5_per_sec": _metric(
+            throughput(constants.evaluate_5card_hand_detailed, legacy), "hands/s", "higher"
+        ),
+    }
+
+
+def _make_table(num_players: int, prefix: str) -> Game:
+    User = get_user_model()
+    game = Game.objects.create()
+    Deck.objects.create(game=game)
+    for seat in range(num_players):
+        user = User.objects.create_user(username=f"{prefix}-{seat}")
+        player = Player.objects.create(user=user, seat_position=seat, sitting_in=True)
+        game.players.add(player)
+    return game
+
+
+def bench_determine_winner(repeat: int = 15, number: int = 20) -> Metrics:
+    metrics = {}
+    for num_players in range(2, 10):
+        game = _make_table(num_players, f"winner{num_players}")
+        deck = game.deck
+        deck.build_deck()
+        deck.deal_to_all_players()
+        deck.deal_flop()
+        deck.deal_turn()
+        deck.deal_river()
+        metrics[f"determine_winner.{num_players}p_ms"] = _metric(
+            _best_ms(lambda: game.determine_winner(deck), repeat, number=number), "ms", "lower"
+        )
+        metrics[f"determine_winner.{num_players}p_queries"] = _metric(
+            _count_queries(lambda: game.determine_winner(deck)), "queries", "lower"
+        )
+    return metrics
+
+
+def bench_round_setup(num_players: int = 6, repeat: int = 20) -> Metrics:
+    game = _make_table(num_players, "round")
+    game.start_new_round()
+    deck = game.deck
+
+    def deal():
+        deck.build_deck()
+        deck.deal_to_all_players()
+
+    def end_hand():
+        # a new hand is only dealt once the last one is over, settling it is not what is measured
+        game.hand_state = {}
+
+    return {
+        "start_new_round.queries": _metric(_count_queries(game.start_new_round, end_hand), "queries", "lower"),
+        "start_new_round.ms": _metric(_best_ms(game.start_new_round, repeat, end_hand), "ms", "lower"),
+        "deal_to_all_players.queries": _metric(_count_queries(deck.deal_to_all_players), "queries", "lower"),
+        "deal_to_all_players.ms": _metric(_best_ms(deal, repeat), "ms", "lower"),
+    }
+
+
+@override_settings(GAMEPLAY_DB_THREADS=0)  # keep every query on this connection, where they are counted
+def bench_views(num_players: int = 6, repeat: int = 20) -> Metrics:
+    game = _make_table(num_players - 1, "views")
+    user = get_user_model().objects.create_user(username="views-client")
+    client = Client()
+    client.force_login(user)
+    start_url = reverse("gameplay:start_round_ajax", args=[game.id])
+    join_url = reverse("gameplay:join_game", args=[game.id])
+
+    def post(url):
+        response = client.post(url)
+        assert response.status_code in (200, 302), response.status_code
+
+    def end_hand():
+        Game.objects.filter(pk=game.pk).update(hand_state={})
+
+    return {
+        "views.join.queries": _metric(_count_queries(lambda: post(join_url)), "queries", "lower"),
+        "views.join.ms": _metric(_best_ms(lambda: post(join_url), repeat), "ms", "lower"),
+        "views.start_ajax.queries": _metric(_count_queries(lambda: post(start_url), end_hand), "queries", "lower"),
+        "views.start_ajax.ms": _metric(_best_ms(lambda: post(start_url), repeat, end_hand), "ms", "lower"),
+    }
+
+
+BENCHMARKS = [bench_evaluator, bench_determine_winner, bench_round_setup, bench_views]
+
+
+def run_all() -> Metrics:
+    results = {}
+    for bench in BENCHMARKS:
+        results.update(bench())
+    return results
+
+
+def compare(results: Metrics, baseline: Metrics, tolerance: float) -> List[str]:
+    """
+    Regressions of results against baseline, as readable lines.
+
+    Query counts must not go up at all. Every other metric may get worse by
+    a factor of (1 + tolerance) before it counts, 0.25 = 25% slower.
+    Metrics missing from either side are ignored.
+    """
+    regressions = []
+    for name, base in baseline.items():
+        if name not in results:
+            continue
+        value, expected = results[name]["value"], base["value"]
+        allowed = 0.0 if base["unit"] == "queries" else tolerance
+        if base["better"] == "lower":
+            regressed = value > expected * (1 + allowed)
+        else:
+            regressed = value * (1 + allowed) < expected
+        if regressed:
+            regressions.append(f"{name}: {value} {base['unit']} (baseline {expected}, better is {base['better']})")
+    return regressions
@@ -1,7 +1,8 @@
 from typing import List, Tuple
-from itertools import combinations
 from collections import Counter
 
+from . import evaluator
+
 
 RANK_VALUE = {
         '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7,
@@ -122,18 +123,8 @@ def evaluate_7card_hand_detailed(seven_cards: List[Tuple[str, str]]) -> Tuple[in
     """
     Evaluate 7 cards (2 hole + 5 community) by picking the best 5-card subset.
     Returns (category, tiebreakers).
-    """
-    best = (9, [-1, -1, -1, -1, -1])  # something "worst" by default
-    for combo in combinations(seven_cards, 5):
-        cat, tie = evaluate_5card_hand_detailed(list(combo))
-        # Compare to current best:
-        #  - cat ascending
-        #  - if cat ties, tiebreak descending
-        if cat < best[0]:
-            best = (cat, tie)
-        elif cat == best[0] and tie > best[1]:
-            best = (cat, tie)
-    return best
-
-
 
+    Thin wrapper around the table evaluator in gameplay/evaluator.py, which
+    scores the whole hand in one pass instead of looping over the 21 subsets.
+    """
+    return evaluator.unpack_strength(evaluator.evaluate(evaluator.encode_cards(seven_cards)))
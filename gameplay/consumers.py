@@ -0,0 +1,38 @@
+from channels.db import database_sync_to_async
+from channels.generic.websocket import AsyncJsonWebsocketConsumer
+
+from . import push
+from .models import Player
+
+REJECTED = 4003  # static/js/deal.js stops reconnecting on this close code
+
+
+class TableConsumer(AsyncJsonWebsocketConsumer):
+    """
+    One connection per player watching a table. Joins the table's group and
+    forwards the events gameplay.push sends there, hole cards filtered to
+    the connected player's own.
+    """
+
+    async def connect(self):
+        user = self.scope["user"]
+        if not user.is_authenticated:
+            # accept first so the browser sees the code and stops reconnecting (a refused handshake is just 1006)
+            await self.accept()
+            await self.close(code=REJECTED)
+            return
+        self.game_id = self.scope["url_route"]["kwargs"]["game_id"]
+        self.player_id = await self.get_player_id(user)
+        await self.channel_layer.group_add(push.group_name(self.game_id), self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, code):
+        if hasattr(self, "game_id"):
+            await self.channel_layer.group_discard(push.group_name(self.game_id), self.channel_name)
+
+    async def table_events(self, message):
+        await self.send_json({"events": [push.for_player(event, self.player_id) for event in message["events"]]})
+
+    @database_sync_to_async
+    def get_player_id(self, user):
+        return Player.objects.filter(user=user).values_list("id", flat=True).first()
@@ -0,0 +1,45 @@
+"""
+A bounded thread pool for the database work of the async gameplay views.
+
+The views do their short lookups with Django's async ORM and hand the
+longer transactional work (dealing a hand, applying an action) to run().
+No more than settings.GAMEPLAY_DB_THREADS of those run at once, however
+many requests are waiting, so a burst of players queues up instead of
+opening a database connection each. With 0 they run where Django's async
+ORM runs them, on the request's own thread (what the tests and benchmarks
+use, since they keep everything in one connection).
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.GAMEPLAY_DB_THREADS, thread_name_prefix="gameplay-db")
+        return _executor
+
+
+def _in_pool(fn: Callable, *args):
+    # pool threads outlive requests, so treat every call like one (CONN_MAX_AGE and all)
+    close_old_connections()
+    try:
+        return fn(*args)
+    finally:
+        close_old_connections()
+
+
+async def run(fn: Callable, *args):
+    """Run fn(*args) off the event loop and return its result."""
+    if not settings.GAMEPLAY_DB_THREADS:
+        return await sync_to_async(fn)(*args)
+    return await sync_to_async(_in_pool, thread_sensitive=False, executor=get_executor())(fn, *args)
@@ -0,0 +1,299 @@
+"""
+In-memory hand engine.
+
+HandState runs one hand of no-limit hold'em from the blinds to the payout:
+betting, street changes, all-in runouts and the showdown, without touching
+the database. Money is in integer chips (cents) so nothing needs rounding.
+Game loads a HandState from its snapshot, applies actions to it and writes it
+back at checkpoints (see Game.load_hand / Game.checkpoint).
+
+Betting follows the same rules as Game.bet: a bet must be at least the big
+blind, a raise must at least double the current bet, and going all in for
+less is always allowed.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from . import evaluator, pots
+
+
+PREFLOP, FLOP, TURN, RIVER, SHOWDOWN = range(5)
+STREET_NAMES = ["preflop", "flop", "turn", "river", "showdown"]
+BOARD_SIZE = {PREFLOP: 0, FLOP: 3, TURN: 4, RIVER: 5, SHOWDOWN: 5}
+
+FOLD, CHECK, CALL, BET, ALL_IN = "fold", "check", "call", "bet", "all_in"
+ACTIONS = (FOLD, CHECK, CALL, BET, ALL_IN)
+
+
+def format_chips(chips: int) -> str:
+    """Chips are cents, messages show them as money."""
+    return f"{chips / 100:.2f}"
+
+
+class Seat:
+    __slots__ = ("player_id", "name", "stack", "hand", "street_bet", "total_bet", "folded", "all_in", "acted")
+
+    def __init__(self, player_id: int, name: str, stack: int):
+        self.player_id = player_id
+        self.name = name
+        self.stack = stack
+        self.hand: List[int] = []
+        self.street_bet = 0
+        self.total_bet = 0
+        self.folded = False
+        self.all_in = False
+        self.acted = False
+
+    @property
+    def can_act(self) -> bool:
+        return not self.folded and not self.all_in
+
+    def put_in(self, chips: int) -> int:
+        """Move up to chips from the stack into the pot, returns what was moved."""
+        chips = min(chips, self.stack)
+        self.stack -= chips
+        self.street_bet += chips
+        self.total_bet += chips
+        if self.stack == 0:
+            self.all_in = True
+        return chips
+
+
+class HandState:
+    __slots__ = (
+        "seats", "deck", "draw_index", "board", "street", "dealer", "to_act",
+        "current_bet", "small_blind", "big_blind", "payouts", "log", "streets",
+    )
+
+    def __init__(self, seats: List[Seat], deck: Sequence[int], dealer: int, small_blind: int, big_blind: int):
+        self.seats = seats
+        self.deck = tuple(deck)
+        self.draw_index = 0
+        self.board: List[int] = []
+        self.street = PREFLOP
+        self.dealer = dealer
+        self.to_act: Optional[int] = None
+        self.current_bet = 0
+        self.small_blind = small_blind
+        self.big_blind = big_blind
+        self.payouts: Dict[int, int] = {}
+        self.log: List[Tuple[int, str, int]] = []  # (player_id, action, chips put in)
+        self.streets: List[int] = []  # len(log) when the flop, turn and river were dealt
+
+    # -- setup -------------------------------------------------------------
+
+    @classmethod
+    def new_hand(
+        cls,
+        players: Sequence[Tuple[int, str, int]],
+        deck: Sequence[int],
+        dealer: int,
+        small_blind: int,
+        big_blind: int,
+    ) -> "HandState":
+        """
+        Deal a new hand. players are (player_id, name, stack) in seat order,
+        dealer indexes into them and deck is the full dealing order.
+        Posts the blinds and leaves the first player to act in to_act.
+        """
+        if len(players) < 2:
+            raise ValueError("a hand needs at least two players")
+        seats = [Seat(player_id, name, stack) for player_id, name, stack in players]
+        state = cls(seats, deck, dealer % len(seats), small_blind, big_blind)
+        for seat in seats:
+            seat.hand = state._draw(2)
+
+        sb, bb = state.blind_seats()
+        state.log.append((seats[sb].player_id, "small_blind", seats[sb].put_in(small_blind)))
+        state.log.append((seats[bb].player_id, "big_blind", seats[bb].put_in(big_blind)))
+        state.current_bet = max(seats[sb].street_bet, seats[bb].street_bet)
+        state.to_act = state._next_to_act(bb)
+        if state.to_act is None:
+            state._end_betting_round()
+        return state
+
+    def _draw(self, num_cards: int) -> List[int]:
+        cards = list(self.deck[self.draw_index:self.draw_index + num_cards])
+        self.draw_index += num_cards
+        return cards
+
+    def _next(self, index: int) -> int:
+        return (index + 1) % len(self.seats)
+
+    # -- queries -----------------------------------------------------------
+
+    @property
+    def pot(self) -> int:
+        return sum(seat.total_bet for seat in self.seats)
+
+    @property
+    def finished(self) -> bool:
+        return self.street == SHOWDOWN
+
+    def blind_seats(self) -> Tuple[int, int]:
+        """Indexes of the small and big blind. Heads up the dealer posts the small blind."""
+        if len(self.seats) == 2:
+            return self.dealer, self._next(self.dealer)
+        sb = self._next(self.dealer)
+        return sb, self._next(sb)
+
+    def seat_of(self, player_id: int) -> Seat:
+        for seat in self.seats:
+            if seat.player_id == player_id:
+                return seat
+        raise KeyError(player_id)
+
+    def live_seats(self) -> List[Seat]:
+        return [seat for seat in self.seats if not seat.folded]
+
+    # -- actions -----------------------------------------------------------
+
+    def act(self, player_id: int, action: str, amount: int = 0) -> Dict[str, object]:
+        """
+        Apply one action for player_id. For BET, amount is the street total
+        the player is betting or raising to. Returns {"success", "message"}.
+        """
+        if self.finished:
+            return {"success": False, "message": "The hand is over."}
+        seat = self.seats[self.to_act]
+        if seat.player_id != player_id:
+            return {"success": False, "message": f"It is {seat.name}'s turn."}
+        if action not in ACTIONS:
+            return {"success": False, "message": f"Unknown action {action!r}."}
+
+        to_call = self.current_bet - seat.street_bet
+        if action == FOLD:
+            seat.folded = True
+            message = f"{seat.name} folds."
+            chips = 0
+        elif action == CHECK:
+            if to_call:
+                return {"success": False, "message": f"{seat.name}, you cannot check facing a bet of {format_chips(self.current_bet)}."}
+            message = f"{seat.name} checks."
+            chips = 0
+        elif action == CALL:
+            if not to_call:
+                return {"success": False, "message": f"{seat.name}, there is nothing to call."}
+            chips = seat.put_in(to_call)
+            message = f"{seat.name} calls {format_chips(seat.street_bet)}."
+        elif action == ALL_IN:
+            chips = seat.put_in(seat.stack)
+            message = f"{seat.name} is all in for {format_chips(seat.street_bet)}!"
+        else:
+            if amount < 0:
+                return {"success": False, "message": f"Amount cannot be negative {seat.name}."}
+            if amount - seat.street_bet > seat.stack:
+                return {"success": False, "message": f"{seat.name}, you do not have enough money to bet {format_chips(amount)}, your available money is {format_chips(seat.stack)}"}
+            if amount - seat.street_bet == seat.stack:
+                return self.act(player_id, ALL_IN)
+            if amount <= self.current_bet:
+                return {"success": False, "message": f"{seat.name}, not enough to raise the current bet. Call or fold."}
+            if self.current_bet and amount < 2 * self.current_bet:
+                return {"success": False, "message": f"{seat.name}, your raise must be at least double the current bet."}
+            if amount < self.big_blind:
+                return {"success": False, "message": f"{seat.name}, a bet must be at least the big blind."}
+            chips = seat.put_in(amount - seat.street_bet)
+            message = f"{seat.name} bets {format_chips(seat.street_bet)}"
+
+        self.log.append((player_id, action, chips))
+        seat.acted = True
+        if seat.street_bet > self.current_bet:
+            self.current_bet = seat.street_bet
+            for other in self.seats:
+                if other is not seat and other.can_act:
+                    other.acted = False
+
+        if len(self.live_seats()) == 1:
+            self._award_uncontested()
+        else:
+            self.to_act = self._next_to_act(self.to_act)
+            if self.to_act is None:
+                self._end_betting_round()
+        return {"success": True, "message": message}
+
+    def _next_to_act(self, after: int) -> Optional[int]:
+        """Next seat after `after` that still owes an action this street."""
+        index = after
+        for _ in range(len(self.seats)):
+            index = self._next(index)
+            seat = self.seats[index]
+            if seat.can_act and (not seat.acted or seat.street_bet < self.current_bet):
+                return index
+        return None
+
+    # -- streets and showdown ----------------------------------------------
+
+    def _end_betting_round(self):
+        """Deal the next street, running the board out while nobody can bet."""
+        while True:
+            self.street += 1
+            if self.street == SHOWDOWN:
+                self.to_act = None
+                self._showdown()
+                return
+            self.board += self._draw(BOARD_SIZE[self.street] - len(self.board))
+            self.streets.append(len(self.log))
+            self.current_bet = 0
+            for seat in self.seats:
+                seat.street_bet = 0
+                seat.acted = False
+            if sum(seat.can_act for seat in self.seats) >= 2:
+                self.to_act = self._next_to_act(self.dealer)
+                return
+
+    def _award_uncontested(self):
+        winner = self.live_seats()[0]
+        self.street = SHOWDOWN
+        self.to_act = None
+        self.payouts = {winner.player_id: self.pot}
+        winner.stack += self.pot
+
+    def _showdown(self):
+        strengths = {seat.player_id: evaluator.evaluate(seat.hand + self.board) for seat in self.live_seats()}
+        side_pots = pots.build_pots({s.player_id: s.total_bet for s in self.seats}, strengths)
+        n = len(self.seats)
+        order = [self.seats[(self.dealer + 1 + i) % n].player_id for i in range(n)]
+        self.payouts = pots.settle(side_pots, strengths, order)
+        for seat in self.seats:
+            seat.stack += self.payouts.get(seat.player_id, 0)
+
+    # -- snapshots ---------------------------------------------------------
+
+    def to_dict(self) -> Dict[str, object]:
+        """A snapshot that shares no lists with the state, so it stays put as play goes on."""
+        return {
+            "seats": [
+                [s.player_id, s.name, s.stack, list(s.hand), s.street_bet, s.total_bet, s.folded, s.all_in, s.acted]
+                for s in self.seats
+            ],
+            "draw_index": self.draw_index,
+            "board": list(self.board),
+            "street": self.street,
+            "dealer": self.dealer,
+            "to_act": self.to_act,
+            "current_bet": self.current_bet,
+            "blinds": [self.small_blind, self.big_blind],
+            "payouts": [[pid, chips] for pid, chips in self.payouts.items()],
+            "log": list(self.log),
+            "streets": list(self.streets),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, object], deck: Sequence[int]) -> "HandState":
+        seats = []
+        for player_id, name, stack, hand, street_bet, total_bet, folded, all_in, acted in data["seats"]:
+            seat = Seat(player_id, name, stack)
+            seat.hand = list(hand)
+            seat.street_bet, seat.total_bet = street_bet, total_bet
+            seat.folded, seat.all_in, seat.acted = folded, all_in, acted
+            seats.append(seat)
+        small_blind, big_blind = data["blinds"]
+        state = cls(seats, deck, data["dealer"], small_blind, big_blind)
+        state.draw_index = data["draw_index"]
+        state.board = list(data["board"])
+        state.street = data["street"]
+        state.to_act = data["to_act"]
+        state.current_bet = data["current_bet"]
+        state.payouts = {pid: chips for pid, chips in data["payouts"]}
+        state.log = [tuple(entry) for entry in data["log"]]
+        state.streets = list(data.get("streets", ()))  # not in snapshots from before it was kept
+        return state
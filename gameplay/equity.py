@@ -0,0 +1,227 @@
+"""
+Win / tie probabilities for the live players of a hand.
+
+monte_carlo_equity samples random runouts of the board. Samples are drawn in
+chunks that run on a shared ProcessPoolExecutor, each chunk scored with
+evaluator.evaluate_batch, and sampling stops as soon as every player's equity
+is known within the requested confidence interval.
+
+exact_equity enumerates every runout once the flop or turn is out. Each
+player's hole cards and board are summed into an evaluator key once, then
+every turn card extends that key and every river card extends the turn key,
+so no runout rebuilds a 7 card hand from scratch. Its results are memoised
+under the suit isomorphic key of the board and hands, so the same spot on a
+suit-relabelled board is only enumerated once across hands and tables.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from statistics import NormalDist
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from django.conf import settings
+
+from . import evaluator, isomorphism
+
+
+_executor = None
+
+
+def get_executor(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """The process pool shared by every equity request in this process."""
+    global _executor
+    if _executor is None:
+        if workers is None:
+            workers = getattr(settings, "EQUITY_WORKERS", os.cpu_count())
+        _executor = ProcessPoolExecutor(max_workers=workers)
+    return _executor
+
+
+def _remaining_cards(hands: Sequence[Sequence[int]], board: Sequence[int]) -> np.ndarray:
+    known = set(board)
+    for hand in hands:
+        known.update(hand)
+    if len(known) != len(board) + sum(len(h) for h in hands):
+        raise ValueError("duplicate card in hands/board")
+    return np.array([c for c in range(52) if c not in known], dtype=np.intp)
+
+
+def _score_boards(hands: np.ndarray, boards: np.ndarray) -> np.ndarray:
+    """
+    Equity share of every player on every board.
+    hands is (P, 2), boards is (N, 5). Returns a (P, N) float array where the
+    winner of a board gets 1.0 and tied players split it.
+    """
+    num_boards = boards.shape[0]
+    strengths = np.empty((hands.shape[0], num_boards), dtype=np.int32)
+    for p, hand in enumerate(hands):
+        rows = np.concatenate([np.broadcast_to(hand, (num_boards, 2)), boards], axis=1)
+        strengths[p] = evaluator.evaluate_batch(rows)
+    winners = strengths == strengths.max(axis=0)
+    return winners / winners.sum(axis=0)
+
+
+def _simulate_chunk(hands: List[List[int]], board: List[int], samples: int, seed) -> np.ndarray:
+    """
+    Run one chunk of samples. Returns a (4, P) array of per-player sums:
+        row 0: outright wins, row 1: ties, row 2: equity share, row 3: share squared
+    """
+    rng = np.random.default_rng(seed)
+    hands_arr = np.asarray(hands, dtype=np.intp)
+    remaining = _remaining_cards(hands, board)
+    missing = 5 - len(board)
+
+    keys = rng.random((samples, remaining.size))
+    picks = remaining[np.argpartition(keys, missing - 1, axis=1)[:, :missing]]
+    boards = np.concatenate([np.broadcast_to(np.asarray(board, dtype=np.intp), (samples, len(board))), picks], axis=1)
+
+    share = _score_boards(hands_arr, boards)
+    return np.stack([
+        (share == 1.0).sum(axis=1),
+        ((share > 0) & (share < 1.0)).sum(axis=1),
+        share.sum(axis=1),
+        (share * share).sum(axis=1),
+    ]).astype(np.float64)
+
+
+def _results(totals: np.ndarray, samples: int) -> List[Dict[str, float]]:
+    return [
+        {
+            "win": float(totals[0, p] / samples),
+            "tie": float(totals[1, p] / samples),
+            "equity": float(totals[2, p] / samples),
+        }
+        for p in range(totals.shape[1])
+    ]
+
+
+def monte_carlo_equity(
+    hands: Sequence[Sequence[int]],
+    board: Sequence[int] = (),
+    confidence: float = 0.95,
+    margin: float = 0.01,
+    chunk_size: int = 5000,
+    max_samples: int = 200_000,
+    workers: Optional[int] = None,
+    seed=None,
+) -> Dict[str, object]:
+    """
+    Estimate win / tie / equity for each hand by sampling board runouts.
+
+    hands are the hole cards of each live player and board the community
+    cards dealt so far, all as evaluator ints. Sampling stops once the
+    confidence interval of every player's equity is narrower than +/- margin,
+    or after max_samples runouts.
+
+    With workers == 0 chunks run in the calling process, otherwise they are
+    spread over the shared process pool.
+
+    Returns {"players": [{"win", "tie", "equity"}, ...], "samples": n, "margin": m}
+    where margin is the largest half width actually reached.
+    """
+    hands = [list(h) for h in hands]
+    board = list(board)
+    if len(hands) < 2:
+        raise ValueError("need at least two hands")
+    if any(len(h) != 2 for h in hands) or len(board) > 5:
+        raise ValueError("hands need 2 cards and the board at most 5")
+    _remaining_cards(hands, board)
+
+    if len(board) == 5:
+        share = _score_boards(np.asarray(hands, dtype=np.intp), np.asarray([board], dtype=np.intp))
+        totals = np.concatenate([share == 1.0, (share > 0) & (share < 1.0), share], axis=1).T
+        return {"players": _results(totals, 1), "samples": 1, "margin": 0.0}
+
+    if workers is None:
+        workers = getattr(settings, "EQUITY_WORKERS", os.cpu_count())
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    seeds = np.random.SeedSequence(seed)
+    parallel = max(workers, 1)
+
+    totals = np.zeros((4, len(hands)))
+    samples = 0
+    half_width = math.inf
+    while samples < max_samples and half_width > margin:
+        round_size = min(chunk_size, math.ceil((max_samples - samples) / parallel))
+        chunk_seeds = seeds.spawn(parallel)
+        if workers:
+            futures = [
+                get_executor().submit(_simulate_chunk, hands, board, round_size, s)
+                for s in chunk_seeds
+            ]
+            chunks = [f.result() for f in futures]
+        else:
+            chunks = [_simulate_chunk(hands, board, round_size, s) for s in chunk_seeds]
+        for chunk in chunks:
+            totals += chunk
+        samples += round_size * parallel
+
+        mean = totals[2] / samples
+        variance = np.maximum(totals[3] / samples - mean * mean, 0.0)
+        half_width = float(z * np.sqrt(variance / samples).max())
+
+    return {"players": _results(totals, samples), "samples": samples, "margin": half_width}
+
+
+
+def exact_equity(hands: Sequence[Sequence[int]], board: Sequence[int]) -> Dict[str, object]:
+    """
+    Exact win / tie / equity for each hand over every remaining runout.
+    board must hold at least 3 cards. Same return shape as monte_carlo_equity,
+    with samples being the number of runouts enumerated.
+    """
+    hands = [list(h) for h in hands]
+    board = list(board)
+    if len(hands) < 2:
+        raise ValueError("need at least two hands")
+    if not 3 <= len(board) <= 5:
+        raise ValueError("exact equity needs the flop, turn or river")
+    remaining = _remaining_cards(hands, board).tolist()
+
+    key = isomorphism.canonical_key(board, *hands)
+    result = isomorphism.equity_cache.get_or_compute(key, lambda: _enumerate_runouts(hands, board, remaining))
+    return {"players": [dict(p) for p in result["players"]], "samples": result["samples"], "margin": 0.0}
+
+
+def _enumerate_runouts(hands: List[List[int]], board: List[int], remaining: List[int]) -> Dict[str, object]:
+    card_keys = evaluator.CARD_KEYS
+    strength_from_key = evaluator.strength_from_key
+    num_players = len(hands)
+    wins = [0] * num_players
+    ties = [0] * num_players
+    shares = [0.0] * num_players
+    runouts = 0
+
+    def settle(keys):
+        nonlocal runouts
+        strengths = [strength_from_key(k) for k in keys]
+        best = max(strengths)
+        winners = [p for p, s in enumerate(strengths) if s == best]
+        if len(winners) == 1:
+            wins[winners[0]] += 1
+            shares[winners[0]] += 1.0
+        else:
+            share = 1.0 / len(winners)
+            for p in winners:
+                ties[p] += 1
+                shares[p] += share
+        runouts += 1
+
+    base_keys = [sum(card_keys[c] for c in hand + board) for hand in hands]
+    if len(board) == 5:
+        settle(base_keys)
+    elif len(board) == 4:
+        for river in remaining:
+            river_key = card_keys[river]
+            settle([k + river_key for k in base_keys])
+    else:
+        for i, turn in enumerate(remaining):
+            turn_key = card_keys[turn]
+            turn_keys = [k + turn_key for k in base_keys]
+            for river in remaining[i + 1:]:
+                river_key = card_keys[river]
+                settle([k + river_key for k in turn_keys])
+
+    totals = np.array([wins, ties, shares], dtype=np.float64)
+    return {"players": _results(totals, runouts), "samples": runouts, "margin": 0.0}
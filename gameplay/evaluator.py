@@ -0,0 +1,245 @@
+"""
+Table driven hand evaluator working on integer encoded cards.
+
+A card is an int in [0..51]: rank_index * 4 + suit_index, using the same
+order as Deck.RANKS / Deck.SUITS ("2" is rank 0, "S" is suit 0).
+
+Every card maps to an additive key (CARD_KEYS). Summing the keys of 5 to 7
+cards gives one int that packs:
+    - bits  0..15 : per-suit counts, 4 bits each
+    - bits 16..54 : per-rank counts, 3 bits each
+    - bits 64..127: per-suit rank masks, 16 bits each
+Because the cards of a hand are distinct the sum never carries between
+fields, so the key of a hand can be built up one card at a time.
+
+The key is resolved with two precomputed tables: FLUSH_TABLE (indexed by a
+13 bit rank mask) when some suit holds 5+ cards, RANK_TABLE (keyed by the
+packed rank counts) otherwise. Both return a strength int where bigger is
+better, so hands compare with plain < / > / ==.
+
+evaluate_batch does the same lookups with NumPy over an (N, 5..7) card array.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+
+RANKS = "23456789TJQKA"
+SUITS = "SCHD"
+
+# Same categories as constants.evaluate_5card_hand_detailed, lower is better.
+STRAIGHT_FLUSH = 1
+FOUR_OF_A_KIND = 2
+FULL_HOUSE = 3
+FLUSH = 4
+STRAIGHT = 5
+THREE_OF_A_KIND = 6
+TWO_PAIR = 7
+ONE_PAIR = 8
+HIGH_CARD = 9
+
+# How many tiebreakers each category carries in the detailed API.
+TIEBREAK_LENGTH = {
+    STRAIGHT_FLUSH: 1,
+    FOUR_OF_A_KIND: 2,
+    FULL_HOUSE: 2,
+    FLUSH: 5,
+    STRAIGHT: 1,
+    THREE_OF_A_KIND: 3,
+    TWO_PAIR: 3,
+    ONE_PAIR: 4,
+    HIGH_CARD: 5,
+}
+
+_SUIT_BIAS = 0x3333       # pushes a suit nibble to >= 8 once it holds 5 cards
+_FLUSH_BITS = 0x8888
+_RANK_FIELD = (1 << 39) - 1
+_FLUSH_SUIT = {0x8: 0, 0x80: 1, 0x800: 2, 0x8000: 3}
+_WHEEL = 0b1000000001111  # A-2-3-4-5
+
+
+def encode_card(card: Sequence[str]) -> int:
+    """Convert a (rank, suit) pair like ('A', 'S') to its 0..51 int."""
+    rank, suit = card
+    return RANKS.index(rank) * 4 + SUITS.index(suit)
+
+
+def decode_card(card: int) -> Tuple[str, str]:
+    """Convert a 0..51 int back to its (rank, suit) pair."""
+    return (RANKS[card >> 2], SUITS[card & 3])
+
+
+def encode_cards(cards: Sequence[Sequence[str]]) -> List[int]:
+    return [encode_card(c) for c in cards]
+
+
+def pack_strength(category: int, tiebreakers: Sequence[int]) -> int:
+    """
+    Pack (category, tiebreakers) into a single int, bigger is better.
+    Tiebreakers are rank values (2..14) stored 4 bits each, most significant first.
+    """
+    strength = (9 - category) << 20
+    for i, value in enumerate(tiebreakers):
+        strength |= value << (16 - 4 * i)
+    return strength
+
+
+def unpack_strength(strength: int) -> Tuple[int, List[int]]:
+    """Inverse of pack_strength, gives back (category, tiebreakers)."""
+    category = 9 - (strength >> 20)
+    tiebreakers = [(strength >> (16 - 4 * i)) & 0xF for i in range(TIEBREAK_LENGTH[category])]
+    return (category, tiebreakers)
+
+
+def _straight_top(mask: int) -> int:
+    """Highest straight contained in a 13 bit rank mask as a rank value, 0 if none."""
+    for top in range(12, 3, -1):
+        run = 0b11111 << (top - 4)
+        if mask & run == run:
+            return top + 2
+    if mask & _WHEEL == _WHEEL:
+        return 5
+    return 0
+
+
+def _flush_strength(mask: int) -> int:
+    top = _straight_top(mask)
+    if top:
+        return pack_strength(STRAIGHT_FLUSH, [top])
+    ranks = [r + 2 for r in range(12, -1, -1) if mask >> r & 1]
+    return pack_strength(FLUSH, ranks[:5])
+
+
+def _rank_strength(counts: Sequence[int]) -> int:
+    """Best 5 card strength for a rank multiset with no flush. counts[r] for r in 0..12."""
+    quads, trips, pairs, present = [], [], [], []
+    mask = 0
+    for r in range(12, -1, -1):
+        c = counts[r]
+        if not c:
+            continue
+        mask |= 1 << r
+        present.append(r + 2)
+        if c == 4:
+            quads.append(r + 2)
+        elif c == 3:
+            trips.append(r + 2)
+        elif c == 2:
+            pairs.append(r + 2)
+
+    if quads:
+        kicker = next(v for v in present if v != quads[0])
+        return pack_strength(FOUR_OF_A_KIND, [quads[0], kicker])
+    if trips and (len(trips) > 1 or pairs):
+        pair = max(trips[1:] + pairs)
+        return pack_strength(FULL_HOUSE, [trips[0], pair])
+    top = _straight_top(mask)
+    if top:
+        return pack_strength(STRAIGHT, [top])
+    if trips:
+        kickers = [v for v in present if v != trips[0]][:2]
+        return pack_strength(THREE_OF_A_KIND, [trips[0]] + kickers)
+    if len(pairs) >= 2:
+        kicker = next(v for v in present if v not in pairs[:2])
+        return pack_strength(TWO_PAIR, [pairs[0], pairs[1], kicker])
+    if pairs:
+        kickers = [v for v in present if v != pairs[0]][:3]
+        return pack_strength(ONE_PAIR, [pairs[0]] + kickers)
+    return pack_strength(HIGH_CARD, present[:5])
+
+
+def _build_flush_table() -> List[int]:
+    table = [0] * (1 << 13)
+    for mask in range(1 << 13):
+        if bin(mask).count("1") >= 5:
+            table[mask] = _flush_strength(mask)
+    return table
+
+
+def _build_rank_table() -> Dict[int, int]:
+    table = {}
+    counts = [0] * 13
+
+    def fill(rank: int, cards_left: int, key: int, size: int):
+        if rank == 13:
+            if size >= 5:
+                table[key] = _rank_strength(counts)
+            return
+        for c in range(min(4, cards_left) + 1):
+            counts[rank] = c
+            fill(rank + 1, cards_left - c, key + (c << (3 * rank)), size + c)
+        counts[rank] = 0
+
+    fill(0, 7, 0, 0)
+    return table
+
+
+CARD_KEYS = [
+    (1 << (64 + 16 * (c & 3) + (c >> 2))) | (1 << (16 + 3 * (c >> 2))) | (1 << (4 * (c & 3)))
+    for c in range(52)
+]
+FLUSH_TABLE = _build_flush_table()
+RANK_TABLE = _build_rank_table()
+
+
+def strength_from_key(key: int) -> int:
+    """Resolve a summed CARD_KEYS value of 5..7 cards to its strength."""
+    flush = (key + _SUIT_BIAS) & _FLUSH_BITS
+    if flush:
+        return FLUSH_TABLE[(key >> (64 + 16 * _FLUSH_SUIT[flush])) & 0x1FFF]
+    return RANK_TABLE[(key >> 16) & _RANK_FIELD]
+
+
+def evaluate(cards: Sequence[int]) -> int:
+    """Strength of the best 5 card hand among 5..7 int cards. Bigger is better."""
+    key = 0
+    for c in cards:
+        key += CARD_KEYS[c]
+    return strength_from_key(key)
+
+
+# NumPy views of the tables for evaluate_batch. RANK_TABLE is sparse, so its
+# keys are kept sorted and resolved with searchsorted.
+_NP_RANK_KEYS = np.array([1 << (3 * (c >> 2)) for c in range(52)], dtype=np.int64)
+_NP_SUIT_KEYS = np.array([1 << (4 * (c & 3)) for c in range(52)], dtype=np.int64)
+_NP_RANK_BITS = np.array([1 << (c >> 2) for c in range(52)], dtype=np.int64)
+_NP_SORTED_RANK_KEYS = np.array(sorted(RANK_TABLE), dtype=np.int64)
+_NP_SORTED_RANK_STRENGTHS = np.array([RANK_TABLE[k] for k in _NP_SORTED_RANK_KEYS.tolist()], dtype=np.int32)
+_NP_FLUSH_TABLE = np.array(FLUSH_TABLE, dtype=np.int32)
+
+
+def evaluate_batch(cards: np.ndarray) -> np.ndarray:
+    """
+    Evaluate many hands at once.
+
+    cards is an (N, k) int array of encoded cards with 5 <= k <= 7, one hand
+    per row. Returns an (N,) int32 array of strengths comparable with the
+    values from evaluate().
+    """
+    cards = np.asarray(cards, dtype=np.intp)
+    if cards.ndim != 2 or not 5 <= cards.shape[1] <= 7:
+        raise ValueError(f"expected an (N, 5..7) card array, got shape {cards.shape}")
+
+    rank_keys = _NP_RANK_KEYS[cards].sum(axis=1)
+    strengths = _NP_SORTED_RANK_STRENGTHS[np.searchsorted(_NP_SORTED_RANK_KEYS, rank_keys)]
+
+    flush = (_NP_SUIT_KEYS[cards].sum(axis=1) + _SUIT_BIAS) & _FLUSH_BITS
+    flushed = np.nonzero(flush)[0]
+    if flushed.size:
+        flush = flush[flushed]
+        suit = (flush >= 0x80).astype(np.intp) + (flush >= 0x800) + (flush >= 0x8000)
+        rows = cards[flushed]
+        in_suit = (rows & 3) == suit[:, None]
+        masks = np.where(in_suit, _NP_RANK_BITS[rows], 0).sum(axis=1)
+        strengths[flushed] = _NP_FLUSH_TABLE[masks]
+    return strengths
+
+
+def evaluate_showdown(hole_cards: np.ndarray, board: Sequence[int]) -> np.ndarray:
+    """
+    Strengths for N players sharing one board.
+    hole_cards is (N, 2), board holds 3..5 cards.
+    """
+    hole_cards = np.asarray(hole_cards, dtype=np.intp)
+    board_rows = np.broadcast_to(np.asarray(board, dtype=np.intp), (hole_cards.shape[0], len(board)))
+    return evaluate_batch(np.concatenate([hole_cards, board_rows], axis=1))
@@ -5,9 +5,15 @@ from django.contrib.admin.helpers import ActionForm
 
 
 class SeatUsersForm(ActionForm):
-    """Extra field that will appear in the admin action bar."""
+    """Extra fields that will appear in the admin action bar, each action reads the one it needs."""
     game = forms.ModelChoiceField(
         queryset=Game.objects.filter(game_active=True),
-        required=True,
+        required=False,
         label="Game to seat users in",
+    )
+    amount = forms.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        required=False,
+        label="Chips to add (negative to take)",
     )
\ No newline at end of file
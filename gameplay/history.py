@@ -0,0 +1,322 @@
+"""
+Hand history: every finished hand as one compact binary record.
+
+Records are appended to segment files in a directory. Each segment is a
+data file of zlib compressed blocks, one block per batch of hands, and an
+index of fixed size entries, one per hand, so a hand is found by id with a
+binary search and one block read. Segments are named after their first
+hand id and a new one is started once a segment passes segment_bytes.
+
+    <first id>.hands   magic b"HHST" | version u16 | reserved u16, then blocks
+    <first id>.idx     hand id u64 | block offset u64 | block length u32
+                       | record offset u32 | record length u32
+
+A record, little endian, with amounts in integer chips (cents):
+
+    hand id u64 | game id u64 | played at f64 (unix time) | pot i64
+    | small blind i32 | big blind i32 | dealer seat u8 | seats u8
+    | board cards u8 | streets u8 | actions u16
+    per seat:   player id u64 | stack before the hand i64 | bet i64
+                | payout i64 | hole cards u8 u8 | folded 1, all in 2 u8
+    board:      one u8 per card
+    streets:    u16 per street dealt after preflop, the action it started at
+    per action: seat u8 | action code u8 (ACTION_CODES) | chips put in i64
+
+Game.checkpoint hands finished snapshots to record() once the transaction
+commits. A Recorder thread batches them and writes a block every
+flush_every hands or flush_interval seconds, so requests never wait on the
+disk and history adds no database writes. Web processes can share a
+directory: an append holds an flock on its "lock" file and first catches
+up with the segments and hand ids the others wrote. Without fcntl (on
+Windows) only one process may write a directory.
+"""
+import atexit
+import bisect
+import logging
+import queue
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+from django.conf import settings
+
+from . import engine
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, appends are then only safe from one process
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"HHST"
+VERSION = 2  # 2: street starts
+FILE_HEADER = struct.Struct("<4sHH")
+RECORD = struct.Struct("<QQdqiiBBBBH")
+STREET = struct.Struct("<H")
+SEAT = struct.Struct("<QqqqBBB")
+ACTION = struct.Struct("<BBq")
+INDEX = np.dtype([("hand_id", "<u8"), ("block", "<u8"), ("block_length", "<u4"), ("offset", "<u4"), ("length", "<u4")])
+
+ACTION_CODES = ("small_blind", "big_blind") + engine.ACTIONS
+FOLDED, ALL_IN = 1, 2
+
+_STOP = object()
+
+
+class SeatRecord(NamedTuple):
+    player_id: int
+    stack: int  # before the hand
+    bet: int
+    payout: int
+    hand: Tuple[int, int]
+    folded: bool
+    all_in: bool
+
+
+class HandRecord(NamedTuple):
+    hand_id: int
+    game_id: int
+    played_at: float
+    pot: int
+    small_blind: int
+    big_blind: int
+    dealer: int
+    seats: Tuple[SeatRecord, ...]
+    board: Tuple[int, ...]
+    streets: Tuple[int, ...]  # index of the first flop, turn and river action
+    actions: Tuple[Tuple[int, str, int], ...]  # (player id, action, chips)
+
+
+def encode(hand_id: int, game_id: int, played_at: float, snapshot: Dict[str, object]) -> bytes:
+    """The record of a finished hand from its HandState.to_dict() snapshot."""
+    seats = snapshot["seats"]
+    payouts = {pid: chips for pid, chips in snapshot["payouts"]}
+    index = {s[0]: i for i, s in enumerate(seats)}
+    small_blind, big_blind = snapshot["blinds"]
+    streets = snapshot.get("streets", ())
+    parts = [RECORD.pack(
+        hand_id, game_id, played_at, sum(s[5] for s in seats), small_blind, big_blind,
+        snapshot["dealer"], len(seats), len(snapshot["board"]), len(streets), len(snapshot["log"]),
+    )]
+    for player_id, _, stack, hand, _, total_bet, folded, all_in, _ in seats:
+        payout = payouts.get(player_id, 0)
+        flags = (FOLDED if folded else 0) | (ALL_IN if all_in else 0)
+        parts.append(SEAT.pack(player_id, stack + total_bet - payout, total_bet, payout, hand[0], hand[1], flags))
+    parts.append(bytes(snapshot["board"]))
+    parts.extend(STREET.pack(start) for start in streets)
+    parts.extend(ACTION.pack(index[pid], ACTION_CODES.index(action), chips) for pid, action, chips in snapshot["log"])
+    return b"".join(parts)
+
+
+def decode(data: bytes) -> HandRecord:
+    (hand_id, game_id, played_at, pot, small_blind, big_blind,
+     dealer, num_seats, num_board, num_streets, num_actions) = RECORD.unpack_from(data)
+    offset = RECORD.size
+    seats = []
+    for _ in range(num_seats):
+        player_id, stack, bet, payout, card1, card2, flags = SEAT.unpack_from(data, offset)
+        seats.append(SeatRecord(player_id, stack, bet, payout, (card1, card2), bool(flags & FOLDED), bool(flags & ALL_IN)))
+        offset += SEAT.size
+    board = tuple(data[offset:offset + num_board])
+    offset += num_board
+    streets = tuple(STREET.unpack_from(data, offset + STREET.size * i)[0] for i in range(num_streets))
+    offset += STREET.size * num_streets
+    actions = []
+    for _ in range(num_actions):
+        seat, code, chips = ACTION.unpack_from(data, offset)
+        actions.append((seats[seat].player_id, ACTION_CODES[code], chips))
+        offset += ACTION.size
+    return HandRecord(
+        hand_id, game_id, played_at, pot, small_blind, big_blind, dealer, tuple(seats), board, streets, tuple(actions)
+    )
+
+
+class HandHistory:
+    """The segments in one directory. Appends come from a single writer, reads from anywhere."""
+
+    def __init__(self, path, segment_bytes: int = 64 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.segment_bytes = segment_bytes
+        self._lock = threading.Lock()
+        self._refresh()
+
+    def _refresh(self):
+        """Pick up the segments and hands appended since, by this or another process."""
+        self._segments = sorted(int(p.stem) for p in self.path.glob("*.idx"))
+        self.next_hand_id = 1
+        if self._segments:
+            last = self._segments[-1]
+            with open(self._files(last)[1], "rb") as f:
+                entries = f.seek(0, 2) // INDEX.itemsize
+                if entries:
+                    f.seek((entries - 1) * INDEX.itemsize)
+                    last = int(np.frombuffer(f.read(INDEX.itemsize), dtype=INDEX)["hand_id"][0]) + 1
+            self.next_hand_id = last
+
+    @contextmanager
+    def _writing(self):
+        """Hold the directory for one append, against this process's threads and other processes."""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path / "lock", "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    self._refresh()
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _files(self, first: int) -> Tuple[Path, Path]:
+        return self.path / f"{first:012d}.hands", self.path / f"{first:012d}.idx"
+
+    def _index(self, first: int) -> np.ndarray:
+        data = self._files(first)[1].read_bytes()
+        # a reader can catch the writer half way through appending entries
+        return np.frombuffer(data[: len(data) - len(data) % INDEX.itemsize], dtype=INDEX)
+
+    def append(self, hands: Sequence[Tuple[int, float, Dict[str, object]]]) -> List[int]:
+        """Write (game id, played at, snapshot) hands as one block. Returns their hand ids."""
+        if not hands:
+            return []
+        with self._writing():
+            first_id = self.next_hand_id
+            records = [encode(first_id + i, *hand) for i, hand in enumerate(hands)]
+            block = zlib.compress(b"".join(records))
+
+            data_path = self._files(self._segments[-1])[0] if self._segments else None
+            if data_path is None or data_path.stat().st_size >= self.segment_bytes:
+                self._segments.append(first_id)
+                data_path, index_path = self._files(first_id)
+                data_path.write_bytes(FILE_HEADER.pack(MAGIC, VERSION, 0))
+                index_path.touch()
+            index_path = self._files(self._segments[-1])[1]
+
+            with open(data_path, "ab") as f:
+                block_offset = f.tell()
+                f.write(block)
+            # the index goes last: a block without entries after a crash is never read
+            index = np.zeros(len(records), dtype=INDEX)
+            index["hand_id"] = np.arange(first_id, first_id + len(records))
+            index["block"] = block_offset
+            index["block_length"] = len(block)
+            index["length"] = [len(r) for r in records]
+            index["offset"] = np.concatenate(([0], np.cumsum(index["length"][:-1])))
+            with open(index_path, "ab") as f:
+                f.write(index.tobytes())
+            self.next_hand_id = first_id + len(records)
+        return list(range(first_id, first_id + len(records)))
+
+    def get(self, hand_id: int) -> Optional[HandRecord]:
+        """One hand by id, None if it was never written."""
+        i = bisect.bisect_right(self._segments, hand_id) - 1
+        if i < 0:
+            return None
+        index = self._index(self._segments[i])
+        j = int(np.searchsorted(index["hand_id"], hand_id))
+        if j == len(index) or index["hand_id"][j] != hand_id:
+            return None
+        entry = index[j]
+        block = self._read_block(self._segments[i], int(entry["block"]), int(entry["block_length"]))
+        return decode(block[entry["offset"]:entry["offset"] + entry["length"]])
+
+    def scan(self, start: int = 1) -> Iterator[HandRecord]:
+        """Every hand from hand id start on, in order, decompressing each block once."""
+        first = max(bisect.bisect_right(self._segments, start) - 1, 0)
+        for segment in self._segments[first:]:
+            index = self._index(segment)
+            block_offset, block = None, b""
+            for entry in index[index["hand_id"] >= start]:
+                if entry["block"] != block_offset:
+                    block_offset = entry["block"]
+                    block = self._read_block(segment, int(block_offset), int(entry["block_length"]))
+                yield decode(block[entry["offset"]:entry["offset"] + entry["length"]])
+
+    def _read_block(self, segment: int, offset: int, length: int) -> bytes:
+        with open(self._files(segment)[0], "rb") as f:
+            f.seek(offset)
+            return zlib.decompress(f.read(length))
+
+
+class Recorder:
+    """Batches submitted hands and appends them from a background thread."""
+
+    def __init__(self, history: HandHistory, flush_every: int = 256, flush_interval: float = 2.0):
+        self.history = history
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._inbox: "queue.Queue" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, game_id: int, snapshot: Dict[str, object]):
+        self._inbox.put((game_id, time.time(), snapshot))
+
+    def flush(self, timeout: Optional[float] = None):
+        """Wait until everything submitted so far is on disk."""
+        done = Future()
+        self._inbox.put(done)
+        done.result(timeout)
+
+    def stop(self):
+        self._inbox.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        batch, deadline, error = [], None, None
+        while True:
+            try:
+                item = self._inbox.get(timeout=None if deadline is None else max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = None  # the interval ran out
+            if isinstance(item, tuple):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.flush_every:
+                    continue
+            try:
+                self.history.append(batch)
+            except Exception as e:
+                # keep recording later hands, the next flush() reports the loss
+                logger.exception("Could not record %s hands in %s", len(batch), self.history.path)
+                error = e
+            batch, deadline = [], None
+            if isinstance(item, Future):
+                item.set_exception(error) if error else item.set_result(None)
+                error = None
+            elif item is _STOP:
+                return
+
+
+_recorders: Dict[str, Recorder] = {}
+_recorders_lock = threading.Lock()
+
+
+def get_recorder(path) -> Recorder:
+    """The recorder writing to path, shared by everything in this process."""
+    key = str(path)
+    with _recorders_lock:
+        if key not in _recorders:
+            _recorders[key] = Recorder(
+                HandHistory(path, settings.HAND_HISTORY_SEGMENT_BYTES),
+                settings.HAND_HISTORY_FLUSH_EVERY,
+                settings.HAND_HISTORY_FLUSH_INTERVAL,
+            )
+            atexit.register(_recorders[key].stop)
+        return _recorders[key]
+
+
+def record(game_id: int, snapshot: Dict[str, object]):
+    """Queue a finished hand for settings.HAND_HISTORY_DIR. None turns history off."""
+    if settings.HAND_HISTORY_DIR is not None:
+        get_recorder(settings.HAND_HISTORY_DIR).submit(game_id, snapshot)
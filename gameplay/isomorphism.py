@@ -0,0 +1,93 @@
+"""
+Suit isomorphism and the memo caches built on it.
+
+Relabelling suits never changes how hands compare, so any set of cards can
+be reduced to a canonical key: per suit, the 13 bit rank mask of the cards of
+that suit, with the four suits sorted. Two situations share a key exactly when
+one is a suit permutation of the other. With several groups of cards (a board
+and each player's hole cards) each suit carries one mask per group, which
+keeps who holds what while still ignoring suit names.
+
+LRUCache is the bounded memo that sits behind those keys. Only exact equity
+is memoised: single hands go through evaluator.evaluate, a table lookup that
+is cheaper than building their key.
+"""
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, List, Sequence, Tuple
+
+
+Key = Tuple[Tuple[int, ...], ...]
+
+
+def canonical_key(*groups: Sequence[int]) -> Key:
+    """Suit independent key of one or more groups of int cards."""
+    suits = [[0] * len(groups) for _ in range(4)]
+    for g, cards in enumerate(groups):
+        for c in cards:
+            suits[c & 3][g] |= 1 << (c >> 2)
+    return tuple(sorted(map(tuple, suits), reverse=True))
+
+
+def canonicalize(*groups: Sequence[int]) -> List[List[int]]:
+    """
+    The representative of the groups' isomorphism class: the same ranks, with
+    suits relabelled in canonical order. Returns one sorted card list per group.
+    """
+    result = [[] for _ in groups]
+    for suit, masks in enumerate(canonical_key(*groups)):
+        for g, mask in enumerate(masks):
+            result[g].extend(r * 4 + suit for r in range(13) if mask >> r & 1)
+    return [sorted(cards) for cards in result]
+
+
+class LRUCache:
+    """
+    Bounded mapping that evicts the least recently used entry when full.
+    Counts hits, misses and evictions so the hit rate can be watched.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], object]):
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+        value = compute()
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def info(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+        }
+
+
+# exact_equity results, keyed by board + every hand in seat order.
+equity_cache = LRUCache(maxsize=4096)
@@ -0,0 +1,70 @@
+"""
+The lobby: active games, newest first, a page at a time.
+
+Pages use keyset pagination on the game id (after=<last id seen>), so a
+page costs the same however deep it is, and seats and chips on the table
+are annotated in the same query instead of counted per row. Pages are
+cached for settings.LOBBY_CACHE_TIMEOUT seconds under a generation number
+that invalidate() bumps whenever games are created or players sit down.
+"""
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, Sum
+
+from .models import Game
+
+GENERATION_KEY = "lobby:generation"
+
+
+def invalidate():
+    """Drop every cached lobby page. Call after creating a game or changing its seats."""
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.set(GENERATION_KEY, 1, None)
+
+
+def _cached(name: str, build):
+    generation = cache.get_or_set(GENERATION_KEY, 0, None)
+    key = f"lobby:{generation}:{name}"
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, settings.LOBBY_CACHE_TIMEOUT)
+    return value
+
+
+def page(big_blind: Optional[float] = None, after: Optional[int] = None) -> Dict[str, object]:
+    """
+    {"games": [...], "next": id to pass as after, or None on the last page}.
+    Each game is a dict of id, pot, blinds, seats and stakes (dollars on the table).
+    """
+    def build():
+        games = Game.objects.filter(game_active=True)
+        if big_blind is not None:
+            games = games.filter(big_blind=big_blind)
+        if after is not None:
+            games = games.filter(id__lt=after)
+        size = settings.LOBBY_PAGE_SIZE
+        rows = list(
+            games.order_by("-id")
+            .values("id", "pot", "small_blind", "big_blind")
+            .annotate(seats=Count("players"), stakes=Sum("players__user__chips", default=0))[: size + 1]
+        )
+        for row in rows:
+            row["stakes"] /= 100
+        return {"games": rows[:size], "next": rows[size - 1]["id"] if len(rows) > size else None}
+
+    return _cached(f"page:{big_blind}:{after}", build)
+
+
+def blind_levels() -> List[float]:
+    """The big blinds of the active games, for the lobby filter."""
+    return _cached(
+        "blinds",
+        lambda: list(
+            Game.objects.filter(game_active=True).order_by("big_blind").values_list("big_blind", flat=True).distinct()
+        ),
+    )
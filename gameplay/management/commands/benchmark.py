@@ -0,0 +1,53 @@
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test.runner import DiscoverRunner
+
+from gameplay import benchmarks
+
+
+class Command(BaseCommand):
+    help = "Run the performance benchmarks on a throwaway test database and gate on the stored baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", default="bench_results.json", help="Where to write the results as JSON.")
+        parser.add_argument(
+            "--baseline",
+            default=str(settings.BASE_DIR / "benchmarks" / "baseline.json"),
+            help="Baseline to compare against.",
+        )
+        parser.add_argument(
+            "--tolerance", type=float, default=1.0, help="Allowed drift for timing metrics, 1.0 = twice as slow."
+        )
+        parser.add_argument("--update-baseline", action="store_true", help="Overwrite the baseline with this run.")
+
+    def handle(self, *args, **options):
+        runner = DiscoverRunner(verbosity=0, interactive=False)
+        runner.setup_test_environment()
+        old_config = runner.setup_databases()
+        try:
+            results = benchmarks.run_all()
+        finally:
+            runner.teardown_databases(old_config)
+            runner.teardown_test_environment()
+
+        Path(options["output"]).write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+        for name, metric in sorted(results.items()):
+            self.stdout.write(f"{name:40} {metric['value']:>14} {metric['unit']}")
+
+        baseline_path = Path(options["baseline"])
+        if options["update_baseline"]:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(results, indent=2, sort_keys=True) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}"))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f"No baseline at {baseline_path}, skipping regression check"))
+            return
+
+        regressions = benchmarks.compare(results, json.loads(baseline_path.read_text()), options["tolerance"])
+        if regressions:
+            raise CommandError("Performance regressions:\n  " + "\n  ".join(regressions))
+        self.stdout.write(self.style.SUCCESS("No regressions against baseline"))
@@ -0,0 +1,37 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from gameplay import preflop
+
+
+class Command(BaseCommand):
+    help = "Precompute preflop equity of all 169 starting hands against 1-8 random opponents."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--samples", type=int, default=20000, help="Runouts per hand class and opponent count.")
+        parser.add_argument("--output", default=str(settings.PREFLOP_EQUITY_PATH), help="Where to write the table.")
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        seeds = np.random.SeedSequence(options["seed"]).spawn(preflop.NUM_CLASSES * preflop.MAX_OPPONENTS)
+        jobs = [
+            (hand_class, opponents)
+            for hand_class in preflop.HAND_CLASSES
+            for opponents in range(1, preflop.MAX_OPPONENTS + 1)
+        ]
+        equities = np.zeros((preflop.NUM_CLASSES, preflop.MAX_OPPONENTS), dtype=np.float32)
+
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = [
+                pool.submit(preflop.simulate_class, hand_class, opponents, options["samples"], seed)
+                for (hand_class, opponents), seed in zip(jobs, seeds)
+            ]
+            for i, future in enumerate(futures):
+                equities[divmod(i, preflop.MAX_OPPONENTS)] = future.result()
+
+        preflop.write_table(options["output"], equities)
+        self.stdout.write(self.style.SUCCESS(f"Wrote {preflop.NUM_CLASSES} hand classes to {options['output']}"))
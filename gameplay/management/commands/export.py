@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from gameplay import export, history
+
+
+class Command(BaseCommand):
+    help = "Stream the hand history or the chip ledger as JSONL or CSV."
+
+    def add_arguments(self, parser):
+        parser.add_argument("kind", choices=export.KINDS)
+        parser.add_argument("--format", choices=export.FORMATS, default="jsonl")
+        parser.add_argument("--game", type=int, default=None, help="Only this game id.")
+        parser.add_argument("--user", default=None, help="Only this username.")
+        parser.add_argument("--since", default=None, help="From this date or time on.")
+        parser.add_argument("--until", default=None, help="Up to this date (inclusive) or time.")
+        parser.add_argument("--output", default="-", help="File to write, - for stdout.")
+        parser.add_argument("--history", default=settings.HAND_HISTORY_DIR, help="Hand history directory.")
+
+    def handle(self, *args, **options):
+        filters = {"game_id": options["game"]}
+        try:
+            filters["since"] = export.parse_moment(options["since"])
+            filters["until"] = export.parse_moment(options["until"], end=True)
+        except ValueError as e:
+            raise CommandError(e)
+        if options["user"]:
+            user = get_user_model().objects.filter(username=options["user"]).only("id").first()
+            if user is None:
+                raise CommandError(f"no user {options['user']!r}")
+            filters["user_id"] = user.id
+
+        store = None
+        if options["kind"] == "hands":
+            if options["history"] is None:
+                raise CommandError("hand history is turned off, pass --history")
+            store = history.HandHistory(options["history"])
+        lines = export.export(options["kind"], options["format"], store, **filters)
+        if options["output"] == "-":
+            for line in lines:
+                self.stdout.write(line, ending="")
+        else:
+            with open(options["output"], "w", newline="") as f:
+                f.writelines(lines)
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from gameplay import history, stats
+from gameplay.models import Player
+
+
+class Command(BaseCommand):
+    help = "Bring the player statistics up to date with the hand history and show them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*", help="Users to show (default: everyone with hands).")
+        parser.add_argument("--history", default=settings.HAND_HISTORY_DIR, help="Hand history directory.")
+        parser.add_argument("--output", default=str(settings.HAND_STATS_DIR), help="Where the stat columns live.")
+        parser.add_argument("--no-update", action="store_true", help="Show the stats without reading new hands.")
+
+    def handle(self, *args, **options):
+        columns = stats.StatsColumns(options["output"])
+        if not options["no_update"]:
+            if options["history"] is None:
+                raise CommandError("hand history is turned off, pass --history or --no-update")
+            added = columns.update(history.HandHistory(options["history"]))
+            self.stdout.write(f"Added {added} hands, {columns.rows} rows in total")
+
+        players = Player.objects.select_related("user")
+        if options["usernames"]:
+            players = players.filter(user__username__in=options["usernames"])
+            missing = set(options["usernames"]) - set(players.values_list("user__username", flat=True))
+            if missing:
+                raise CommandError(f"no player for: {', '.join(sorted(missing))}")
+            names = {p.id: p.user.username for p in players}
+            summary = columns.summary(names)
+        else:
+            summary = columns.summary()
+            names = {p.id: p.user.username for p in players.filter(id__in=summary)}
+
+        self.stdout.write(f"{'player':<20} {'hands':>8} {'vpip':>6} {'pfr':>6} {'af':>6} {'wsd':>6} {'net':>12}")
+        for player_id, row in sorted(summary.items(), key=lambda item: -item[1]["hands"]):
+            self.stdout.write(
+                f"{names.get(player_id, player_id):<20} {row['hands']:>8} {row['vpip']:>6.1%} {row['pfr']:>6.1%}"
+                f" {_optional(row['aggression'], '.2f'):>6} {_optional(row['showdown_win_rate'], '.1%'):>6}"
+                f" {row['net'] / 100:>12.2f}"
+            )
+
+
+def _optional(value, spec: str) -> str:
+    return "-" if value is None else format(value, spec)
@@ -0,0 +1,42 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from gameplay import seating
+from gameplay.models import ChipTransaction, Game
+
+
+class Command(BaseCommand):
+    help = "Seat users at a game in bulk, optionally creating them first (for load tests)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("game", type=int, help="Game id.")
+        parser.add_argument("usernames", nargs="*", help="Users to seat.")
+        parser.add_argument("--create", type=int, default=0, help="Also create and seat this many users.")
+        parser.add_argument("--prefix", default="loadtest", help="Username prefix for --create (default: loadtest).")
+
+    def handle(self, *args, **options):
+        try:
+            game = Game.objects.get(pk=options["game"])
+        except Game.DoesNotExist:
+            raise CommandError(f"no game {options['game']}")
+
+        User = get_user_model()
+        usernames = list(options["usernames"])
+        found = dict(User.objects.filter(username__in=usernames).values_list("username", "id"))
+        missing = set(usernames) - set(found)
+        if missing:
+            raise CommandError(f"no user for: {', '.join(sorted(missing))}")
+        user_ids = [found[name] for name in usernames]
+
+        if options["create"]:
+            names = [f"{options['prefix']}{i}" for i in range(options["create"])]
+            existing = set(User.objects.filter(username__in=names).values_list("username", flat=True))
+            created = User.objects.bulk_create([User(username=name) for name in names if name not in existing])
+            # bulk_create skips post_save, so open their ledger here or discrepancies() would flag them
+            ChipTransaction.objects.bulk_create(
+                ChipTransaction(user=user, amount=user.chips, reason=ChipTransaction.OPENING) for user in created
+            )
+            user_ids += User.objects.filter(username__in=names).order_by("id").values_list("id", flat=True)
+
+        seated = seating.seat_users(game, user_ids)
+        self.stdout.write(f"Seated {len(seated)} users in Game #{game.id}")
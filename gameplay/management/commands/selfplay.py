@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from gameplay import selfplay
+
+
+class Command(BaseCommand):
+    help = "Play bot hands on the in-memory engine across a process pool and check every hand for money bugs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hands", type=int, default=100_000, help="Hands in total, split evenly over the tables.")
+        parser.add_argument("--tables", type=int, default=8)
+        parser.add_argument("--players", type=int, default=6, help="Seats per table (2-9).")
+        parser.add_argument(
+            "--bots",
+            default=",".join(selfplay.BOTS),
+            help=f"Comma separated bots, assigned to seats in turn. Choices: {', '.join(selfplay.BOTS)}.",
+        )
+        parser.add_argument("--stack", type=float, default=10.0, help="Starting stack and rebuy, in dollars.")
+        parser.add_argument("--small-blind", type=float, default=0.10)
+        parser.add_argument("--big-blind", type=float, default=0.25)
+        parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count, 0: inline).")
+        parser.add_argument("--seed", type=int, default=None)
+
+    def handle(self, *args, **options):
+        tables = max(1, options["tables"])
+        try:
+            report = selfplay.simulate(
+                tables,
+                -(-options["hands"] // tables),
+                players=options["players"],
+                bots=[name.strip() for name in options["bots"].split(",") if name.strip()],
+                seed=options["seed"],
+                workers=options["workers"],
+                stack=round(options["stack"] * 100),
+                small_blind=round(options["small_blind"] * 100),
+                big_blind=round(options["big_blind"] * 100),
+            )
+        except ValueError as e:
+            raise CommandError(e)
+
+        hands = report["hands"]
+        self.stdout.write(f"{'hands':24} {hands:>14}")
+        self.stdout.write(f"{'seconds':24} {report['seconds']:>14.2f}")
+        self.stdout.write(f"{'hands/sec':24} {report['hands_per_sec']:>14.0f}")
+        self.stdout.write(f"{'actions':24} {report['actions']:>14}")
+        self.stdout.write(f"{'rejected bot actions':24} {report['rejected']:>14}")
+        self.stdout.write(f"{'showdowns':24} {report['showdowns']:>14}")
+        engine_seconds = sum(report["timings"].values()) or 1.0
+        for phase, seconds in report["timings"].items():
+            per_hand = seconds / hands * 1e6 if hands else 0.0
+            self.stdout.write(
+                f"{'time.' + phase:24} {per_hand:>11.1f} us/hand {seconds / engine_seconds:>6.1%}"
+            )
+
+        if report["violations"]:
+            raise CommandError(
+                f"{report['violations']} hands broke chip conservation:\n  " + "\n  ".join(report["examples"])
+            )
+        self.stdout.write(self.style.SUCCESS("No chip conservation violations"))
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+RANKS = "23456789TJQKA"
+SUITS = "SCHD"
+
+
+def to_int(card):
+    if isinstance(card, int):
+        return card
+    rank, suit = card
+    return RANKS.index(rank) * 4 + SUITS.index(suit)
+
+
+def to_pair(card):
+    if not isinstance(card, int):
+        return card
+    return [RANKS[card >> 2], SUITS[card & 3]]
+
+
+def convert(apps, convert_card):
+    Deck = apps.get_model("gameplay", "Deck")
+    Player = apps.get_model("gameplay", "Player")
+
+    decks = list(Deck.objects.all())
+    for deck in decks:
+        deck.cards = [convert_card(c) for c in deck.cards]
+        deck.community_cards = [convert_card(c) for c in deck.community_cards]
+    Deck.objects.bulk_update(decks, ["cards", "community_cards"], batch_size=500)
+
+    players = list(Player.objects.all())
+    for player in players:
+        player.hand = [convert_card(c) for c in player.hand]
+    Player.objects.bulk_update(players, ["hand"], batch_size=500)
+
+
+def forwards(apps, schema_editor):
+    convert(apps, to_int)
+
+
+def backwards(apps, schema_editor):
+    convert(apps, to_pair)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gameplay", "0002_game_game_active"),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:56
+
+import secrets
+
+from django.db import migrations, models
+
+
+def seed_decks(apps, schema_editor):
+    # The stored shuffle cannot be turned back into a seed, so decks get a
+    # fresh one and a hand in progress during the upgrade starts over.
+    Deck = apps.get_model("gameplay", "Deck")
+    decks = list(Deck.objects.all())
+    for deck in decks:
+        deck.seed = secrets.token_hex(32)
+        deck.draw_index = 0
+        deck.community_cards = []
+    Deck.objects.bulk_update(decks, ["seed", "draw_index", "community_cards"], batch_size=500)
+
+
+def unseed_decks(apps, schema_editor):
+    from gameplay.shuffle import deck_order
+
+    Deck = apps.get_model("gameplay", "Deck")
+    decks = list(Deck.objects.exclude(seed=""))
+    for deck in decks:
+        deck.cards = list(deck_order(deck.seed)[deck.draw_index:])
+    Deck.objects.bulk_update(decks, ["cards"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gameplay", "0003_integer_cards"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="deck",
+            name="draw_index",
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="deck",
+            name="seed",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.RunPython(seed_decks, unseed_decks),
+        migrations.RemoveField(
+            model_name="deck",
+            name="cards",
+        ),
+    ]
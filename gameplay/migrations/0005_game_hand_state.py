@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gameplay", "0004_deck_seed"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="hand_state",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
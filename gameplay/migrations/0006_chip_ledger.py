@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:07
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def open_accounts(apps, schema_editor):
+    # existing balances become each user's first ledger entry
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    ChipTransaction = apps.get_model("gameplay", "ChipTransaction")
+    ChipTransaction.objects.bulk_create(
+        [
+            ChipTransaction(user_id=user_id, amount=chips, reason="opening")
+            for user_id, chips in User.objects.exclude(chips=0).values_list("id", "chips")
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gameplay", "0005_game_hand_state"),
+        ("accounts", "0003_customuser_chips"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChipTransaction",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("amount", models.BigIntegerField()),
+                (
+                    "reason",
+                    models.CharField(
+                        choices=[
+                            ("opening", "Opening balance"),
+                            ("bet", "Bet"),
+                            ("win", "Win"),
+                            ("hand", "Hand result"),
+                        ],
+                        max_length=16,
+                    ),
+                ),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "game",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="chip_transactions",
+                        to="gameplay.game",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="chip_transactions",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+        ),
+        migrations.RunPython(open_accounts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("gameplay", "0008_game_lobby_indexes"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="chiptransaction",
+            name="reason",
+            field=models.CharField(
+                choices=[
+                    ("opening", "Opening balance"),
+                    ("bet", "Bet"),
+                    ("win", "Win"),
+                    ("hand", "Hand result"),
+                    ("adjustment", "Staff adjustment"),
+                ],
+                max_length=16,
+            ),
+        ),
+    ]
@@ -1,8 +1,20 @@
-from django.db import models
-from django.db.models import JSONField
+from django.db import models, transaction
+from django.db.models import Case, F, JSONField, Sum, Value, When
+from django.db.models.signals import post_save
+from django.dispatch import receiver
 from django.conf import settings
-import random
-from . import constants
+from django.contrib.auth import get_user_model
+from . import engine, equity, evaluator, history, pots, push, shuffle, unit_of_work
+from .unit_of_work import HandUnitOfWork
+
+def _save_changed(obj, **values):
+    """Set the given fields on obj and save only the ones whose value changed."""
+    changed = [name for name, value in values.items() if getattr(obj, name) != value]
+    for name in changed:
+        setattr(obj, name, values[name])
+    if changed:
+        unit_of_work.save(obj, *changed)
+
 
 class Deck(models.Model):
 
@@ -13,25 +25,42 @@ class Deck(models.Model):
     )
 
 
-    cards = JSONField(default=list, blank=True)
+    # Cards are ints in [0..51] (rank_index * 4 + suit_index), see evaluator.py.
+    # They only become rank/suit strings at the display edge.
+    # The deck itself is only a seed and a pointer: the card order is derived
+    # from the seed (see shuffle.py) and draw_index cards have been dealt.
+    seed = models.CharField(max_length=64, blank=True)
+    draw_index = models.PositiveSmallIntegerField(default=0)
     community_cards = JSONField(default=list, blank=True)
 
-    SUITS = ['S', 'C', 'H', 'D']
-    RANKS = ['2', '3', '4', '5', '6', '7', '8', '9', 'T', 'J', 'Q', 'K', 'A']
+    SUITS = list(evaluator.SUITS)
+    RANKS = list(evaluator.RANKS)
 
     def __str__(self):
         return f'Deck for {self.game}'
+
+    @property
+    def order(self):
+        """Every card of this deck in dealing order, empty before build_deck."""
+        if not self.seed:
+            return ()
+        return shuffle.deck_order(self.seed)
+
+    @property
+    def cards(self):
+        """Cards still left to deal."""
+        return list(self.order[self.draw_index:])
     
     def build_deck(self):
-        deck = [(rank, suit) for rank in self.RANKS for suit in self.SUITS]
-        random.shuffle(deck)
-        self.cards = deck
-        self.save()
+        self.seed = shuffle.new_seed()
+        self.draw_index = 0
+        self.community_cards = []
+        unit_of_work.save(self, 'seed', 'draw_index', 'community_cards')
     
     def draw(self, num_cards=1):
-        drawn = self.cards[:num_cards]
-        self.cards = self.cards[num_cards:]
-        self.save()
+        # Only moves the pointer in memory, whoever deals saves it (see unit_of_work.py)
+        drawn = list(self.order[self.draw_index:self.draw_index + num_cards])
+        self.draw_index += len(drawn)
         return drawn
     
     def burn(self, num_cards=1):
@@ -40,27 +69,27 @@ class Deck(models.Model):
     def deal_flop(self, num_cards=3):
         flop = self.draw(num_cards)
         self.community_cards += flop
-        self.save()
+        unit_of_work.save(self, 'draw_index', 'community_cards')
     
     def deal_turn(self, num_cards=1):
         flop = self.draw(num_cards)
         self.community_cards += flop
-        self.save()
+        unit_of_work.save(self, 'draw_index', 'community_cards')
     
     def deal_river(self, num_cards=1):
         flop = self.draw(num_cards)
         self.community_cards += flop
-        self.save()
+        unit_of_work.save(self, 'draw_index', 'community_cards')
 
     def deal_to_player(self, player, num_cards=2):
-        player.hand.clear()
         player.hand = self.draw(num_cards)
-        player.save()
+        unit_of_work.save(player, 'hand')
     
     def deal_to_all_players(self):
-        for player in self.game.players.all():
-            self.deal_to_player(player)
-            player.save()
+        with HandUnitOfWork():
+            for player in self.game.players.all():
+                self.deal_to_player(player)
+            unit_of_work.save(self, 'draw_index')
 
 
 
@@ -90,9 +119,11 @@ class Player(models.Model):
     is_big_blind = models.BooleanField(default=False)
 
     def update_money(self, amount: float):
-        self.user.money += amount
-        self.user.money = round(self.user.money, 2)
-        self.save()
+        """Add amount (dollars, negative to take money) through the chip ledger."""
+        chips = round(amount * 100)
+        reason = ChipTransaction.WIN if chips > 0 else ChipTransaction.BET
+        unit_of_work.defer(lambda: ChipTransaction.objects.post({self.user_id: chips}, reason))
+        self.user.chips += chips
 
     def perform_check(self):
         pass
@@ -100,17 +131,25 @@ class Player(models.Model):
     def all_in(self):
         self.is_all_in = True
         self.is_folded = True
-        self.save()
+        unit_of_work.save(self, 'is_all_in', 'is_folded')
     
     def fold(self):
         self.is_folded = True
-        self.save()
+        unit_of_work.save(self, 'is_folded')
 
     def sit_in(self):
         self.sitting_in = True
-        self.save()
+        unit_of_work.save(self, 'sitting_in')
+
+
+
+class StaleGameError(Exception):
+    """The game row changed since this instance was loaded."""
 
 
+class HandInProgressError(Exception):
+    """A new hand was asked for before the current one is over."""
+
 
 class Game(models.Model):
 
@@ -131,21 +170,81 @@ class Game(models.Model):
 
     dealer_seat_index = models.PositiveIntegerField(default=0)
 
+    # Snapshot of the hand in progress (engine.HandState.to_dict()), written at checkpoints
+    hand_state = JSONField(default=dict, blank=True)
+
+    # Bumped by every write, see _do_update(). Clients get it back to spot stale state.
+    version = models.PositiveIntegerField(default=0)
+
+    # apply_action re-runs an action this many times when another request wins the race
+    ACTION_ATTEMPTS = 3
+
+    class Meta:
+        # the lobby pages through active games newest first, optionally at one blind level
+        indexes = [
+            models.Index(fields=["game_active", "-id"], name="game_lobby_idx"),
+            models.Index(fields=["game_active", "big_blind", "-id"], name="game_lobby_blind_idx"),
+        ]
+
     def __str__(self):
         return f"Game #{self.id}"
-    
+
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        """
+        Writes to an existing game are conditional: the row is only updated
+        if it is still at the version this instance loaded, and the version
+        goes up by one in the same UPDATE. Otherwise nothing is written and
+        StaleGameError is raised, so concurrent requests never silently
+        overwrite each other. Hooked in here rather than in save() to keep
+        save()'s plain UPDATE, QuerySet.update() costs twice as much.
+        """
+        version = self._meta.get_field('version')
+        values = [v for v in values if v[0] is not version] + [(version, None, self.version + 1)]
+        updated = super()._do_update(
+            base_qs.filter(version=self.version), using, pk_val, values, update_fields, forced_update
+        )
+        if not updated:
+            raise StaleGameError(f"{self} changed since version {self.version}")
+        self.version += 1
+        return updated
+
+
+    # identity map of players_list(), see there
+    _seated_players = None
 
     def players_list(self):
-        return list(self.players.filter(sitting_in = True).order_by('seat_position'))
+        """
+        Players sitting in, in seat order, with their users. Loaded in one
+        query per Game instance and shared by every method after that, so
+        they all work on the same Player objects. Code that seats, unseats or
+        moves players must call invalidate_players() afterwards. (Not an
+        m2m_changed receiver: having one costs players.add() an extra query.)
+        """
+        if self._seated_players is None:
+            self._seated_players = list(
+                self.players.filter(sitting_in=True).select_related('user').order_by('seat_position')
+            )
+        return list(self._seated_players)
+
+
+    def invalidate_players(self):
+        self._seated_players = None
+
+
+    def refresh_from_db(self, *args, **kwargs):
+        self.invalidate_players()
+        super().refresh_from_db(*args, **kwargs)
     
 
     def assign_seats(self):
-        players = self.players_list
+        players = self.players_list()
         if len(players) > 8:
             pass
         for i, player in enumerate(players):
             player.seat_position = i
             player.save()
+        self.invalidate_players()
 
         
     def rotate_dealer_and_blinds(self):
@@ -173,10 +272,11 @@ class Game(models.Model):
 
     
     def use_blinds(self):
-        small_blind_player = next((p for p in self.players.all() if p.is_small_blind), None)
+        players = self.players_list()
+        small_blind_player = next((p for p in players if p.is_small_blind), None)
         if small_blind_player:
             self.bet(small_blind_player, self.small_blind)
-        big_blind_player = next((p for p in self.players.all() if p.is_big_blind), None)
+        big_blind_player = next((p for p in players if p.is_big_blind), None)
         if big_blind_player:
             self.bet(big_blind_player, self.big_blind)
     
@@ -308,55 +408,34 @@ class Game(models.Model):
                 self.betting_sequence(p)
 
 
-    def calculate_all_in_amounts(self):
-        players = self.players_list()
-        for p in players:
-            if p.is_all_in:
-                p.all_in_pot_amount = self.pot
-                for playa in players:
-                    if playa.last_bet < p.last_bet:
-                        if playa is p:
-                            continue
-                        playa.all_in_difference += p.last_bet - playa.last_bet 
-                playa.all_in_pot_amount -= playa.all_in_difference
-
-
-
-    def sort_players_all_in(self):
+    def settle_pots(self):
+        """
+        Pay out the main and side pots at showdown in one pass. What each player
+        put in is their beginning_money minus their money now, every live hand
+        is evaluated once. Returns {player_id: amount won}.
+        """
         players = self.players_list()
-        for p in players:
-            if p.is_all_in:
-                p.is_folded = False
-        all_in_players = [player for player in players if player.is_all_in]
-        all_in_players.sort(key=lambda player: player.beginning_money)
-        for player in all_in_players: 
-            self.determine_winner(self.deck)
-            if self.winner[0] == player and len(self.winner) == 1:
-                winning_amount = player.all_in_pot_amount
-                
-                player.update_money(player.all_in_pot_amount)
-                
-                for p in self.players:
-                    p.all_in_pot_amount -= winning_amount
-                self.pot -= winning_amount
-                
-                for i, current_player in enumerate(all_in_players):
-                    if i < len(all_in_players) - 1:
-                        next_player = all_in_players[i+1]
-                        next_player.all_in_pot_amount -= player.all_in_pot_amount
-                    elif self.pot == current_player.all_in_pot_amount:
-                        break
-                    else:
-                        self.pot -= player.all_in_pot_amount
-            elif len(self.winner) != 1 and player in self.winner:
-                num_winners = len(self.winner)
-                share = player.all_in_pot_amount / num_winners
-                player.update_money(share)
-                self.pot -= share
-                for p in players:
-                    p.all_in_pot_amount -= share
-            player.fold()
-
+        board = self.deck.community_cards
+        contributions = {p.id: round(p.beginning_money * 100) - p.user.chips for p in players}
+        strengths = {
+            p.id: evaluator.evaluate(p.hand + board)
+            for p in players
+            if (not p.is_folded or p.is_all_in) and len(p.hand) == 2
+        }
+        n = len(players)
+        order = [players[(self.dealer_seat_index + 1 + i) % n].id for i in range(n)]
+        payouts = pots.settle(pots.build_pots(contributions, strengths), strengths, order)
+
+        with HandUnitOfWork():
+            won = {p.user_id: payouts.get(p.id, 0) for p in players}
+            unit_of_work.defer(lambda: ChipTransaction.objects.post(won, ChipTransaction.WIN, game=self))
+            for p in players:
+                p.user.chips += payouts.get(p.id, 0)
+            self.pot = 0.0
+            self.winner_determined = True
+            unit_of_work.save(self, 'pot', 'winner_determined')
+        self.winner.set([p for p in players if payouts.get(p.id)])
+        return {player_id: chips / 100 for player_id, chips in payouts.items()}
 
 
     def check_for_all_ins(self):
@@ -365,6 +444,20 @@ class Game(models.Model):
             return True
         else:
             return False
+
+
+    def all_in_equity(self):
+        """
+        Exact equity of every hand still in, for showing odds once
+        check_for_all_ins skips the remaining betting.
+        Returns {player_id: {"win", "tie", "equity"}}, or None before the flop.
+        """
+        board = self.deck.community_cards
+        live_players = [p for p in self.players_list() if not p.is_folded or p.is_all_in]
+        if len(board) < 3 or len(live_players) < 2:
+            return None
+        result = equity.exact_equity([p.hand for p in live_players], board)
+        return {p.id: stats for p, stats in zip(live_players, result["players"])}
         
 
 
@@ -406,30 +499,13 @@ class Game(models.Model):
 
             community = deck.community_cards  # 5 community cards in deck.community
 
-            # Evaluate each player's best 7-card hand
-            results = []
+            # Evaluate each player's best 7-card hand, hands and board are already int cards
             active_players = [p for p in players if not p.is_folded]
-            for p in active_players:
-                seven_cards = p.hand + community  # 7 total (2 hole, 5 community)
-                cat, tie = constants.evaluate_7card_hand_detailed(seven_cards)
-                results.append((p, (cat, tie)))
-
-            # Now pick the single best or tie
-            # best_hand = min(results, key=??) but we must do custom compare:
-            # We'll do a simple pass:
-            best_cat, best_tie = results[0][1]
-            winners = [results[0][0]]  # the player objects
-
-            for (p, (cat, tie)) in results[1:]:
-                if cat < best_cat:
-                    best_cat, best_tie = cat, tie
-                    winners = [p]
-                elif cat == best_cat:
-                    if tie > best_tie:
-                        best_cat, best_tie = cat, tie
-                        winners = [p]
-                    elif tie == best_tie:
-                        winners.append(p)
+            strengths = [evaluator.evaluate(p.hand + community) for p in active_players]
+
+            # Bigger strength is better, everyone sharing the best one splits
+            best = max(strengths)
+            winners = [p for p, strength in zip(active_players, strengths) if strength == best]
             self.winner_determined = True
             self.save()
 
@@ -450,34 +526,148 @@ class Game(models.Model):
 
     
     def start_new_round(self):
-        deck, _ = Deck.objects.get_or_create(game=self)
-        self.deck.build_deck()
-        self.deck.deal_to_all_players()
-        
         """
-                players = self.players_list()
-        for p in players:
-            p.is_folded = False
-            p.is_all_in = False
-            p.last_bet = 0
-            p.beginning_money = p.user.money
-            p.all_in_pot_amount = 0
-            p.all_in_difference = 0
-            p.save()
-        
-        self.deck.build_deck()
-        self.deck.deal_to_all_players()
+        Shuffle and deal a new hand to everyone sitting in, post the blinds
+        and checkpoint it. Returns the engine.HandState, or None when fewer
+        than two players can play (their cards are still dealt). Raises
+        HandInProgressError while the current hand is not over: balances
+        only settle when a hand ends, so dealing over it would void it.
+        """
+        if self.hand_state and self.hand_state["street"] != engine.SHOWDOWN:
+            raise HandInProgressError(f"Game #{self.id} has a hand in progress")
+        deck, _ = Deck.objects.get_or_create(game=self)
+        self.deck = deck
+        players = [p for p in self.players_list() if p.user.chips > 0]
+        if len(players) < 2:
+            with HandUnitOfWork():
+                deck.build_deck()
+                deck.deal_to_all_players()
+            return None
+
         self.dealer_seat_index = (self.dealer_seat_index + 1) % len(players)
-        self.current_bet = 0
-        self.pot = 0
-        self.winner.clear()
-        self.winner_determined = False
-        self.use_blinds()
-        self.save()
-        
+        with HandUnitOfWork():
+            deck.build_deck()
+            for p in players:
+                p.beginning_money = p.user.money
+                unit_of_work.save(p, 'beginning_money')
+            state = engine.HandState.new_hand(
+                [(p.id, p.user.username, p.user.chips) for p in players],
+                deck.order,
+                self.dealer_seat_index,
+                round(self.small_blind * 100),
+                round(self.big_blind * 100),
+            )
+            self.checkpoint(state, players)
+        return state
+
+
+    def load_hand(self):
+        """The hand in progress as an engine.HandState, or None if there is none."""
+        if not self.hand_state:
+            return None
+        return engine.HandState.from_dict(self.hand_state, self.deck.order)
+
+
+    def checkpoint(self, state, players=None):
         """
+        Persist an engine.HandState: the snapshot plus the mirrored Game,
+        Deck and Player fields, all flushed in one unit of work. Balances
+        only move when the hand is over, by one ledger post of every net result.
+        Finished hands go to the hand history once the transaction commits.
+        """
+        if players is None:
+            players = self.players_list()
+        by_id = {p.id: p for p in players}
+        small_blind, big_blind = state.blind_seats()
+
+        with HandUnitOfWork():
+            for i, seat in enumerate(state.seats):
+                p = by_id[seat.player_id]
+                _save_changed(
+                    p,
+                    hand=seat.hand,
+                    last_bet=seat.street_bet / 100,
+                    is_folded=seat.folded,
+                    is_all_in=seat.all_in,
+                    is_dealer=i == state.dealer,
+                    is_small_blind=i == small_blind,
+                    is_big_blind=i == big_blind,
+                )
+
+            _save_changed(self.deck, draw_index=state.draw_index, community_cards=state.board)
+
+            previous = self.hand_state
+            self.pot = state.pot / 100
+            self.current_bet = state.current_bet / 100
+            self.winner_determined = state.finished
+            self.hand_state = state.to_dict()
+            unit_of_work.save(self, 'pot', 'current_bet', 'winner_determined', 'dealer_seat_index', 'hand_state')
+
+            if state.finished:
+                # the whole hand is settled at once: every balance moves by its net result
+                results = {by_id[s.player_id].user_id: state.payouts.get(s.player_id, 0) - s.total_bet for s in state.seats}
+                unit_of_work.defer(lambda: ChipTransaction.objects.post(results, ChipTransaction.HAND, game=self))
+                for seat in state.seats:
+                    by_id[seat.player_id].user.chips += results[by_id[seat.player_id].user_id]
+
+            current = self.hand_state
+
+            def saved():
+                # registered in the flush transaction once the rows are written, so the callbacks
+                # run after the outermost transaction commits, when self.version is final
+                transaction.on_commit(lambda: push.send_hand(self.id, previous, current, self.version))
+                if state.finished:
+                    transaction.on_commit(lambda: history.record(self.id, current))
+
+            unit_of_work.defer(saved)
+
+        if state.finished:
+            self.winner.set([by_id[pid] for pid, chips in state.payouts.items() if chips > 0])
+
+
+    def apply_action(self, player: Player, action: str, amount: float = 0.0, version=None):
+        """
+        Run one betting action through the engine and checkpoint the result.
+        If version is given (what the client last saw) and the game has moved
+        on since, the action is rejected. If another request checkpoints first,
+        the action is re-run on the fresh state, which rejects it if it no
+        longer makes sense there. Every result carries the game version.
+        """
+        try:
+            chips = round(float(amount) * 100)
+        except (TypeError, ValueError):
+            return {"success": False, "message": "Invalid Amount", "version": self.version}
+        if version not in (None, '') and str(version) != str(self.version):
+            return {"success": False, "stale": True, "message": "The table has moved on, refresh and try again.", "version": self.version}
+
+        for _ in range(self.ACTION_ATTEMPTS):
+            state = self.load_hand()
+            if state is None:
+                return {"success": False, "message": "No hand in progress.", "version": self.version}
+            result = state.act(player.id, action, chips)
+            if not result["success"]:
+                break
+            try:
+                self.checkpoint(state)
+                break
+            except StaleGameError:
+                self.reload()
+        else:
+            result = {"success": False, "stale": True, "message": "The table is busy, try again."}
+        result["version"] = self.version
+        return result
+
+
+    def reload(self):
+        """Drop everything loaded for this game (row, players, deck) and read it again."""
+        self.refresh_from_db()
+        self.deck.refresh_from_db()
 
 
+    def deal_street(self, street: str):
+        """Deal the flop, turn or river and write the deck once for the street."""
+        with HandUnitOfWork():
+            getattr(self.deck, f'deal_{street}')()
 
 
     def play_one_round(self):
@@ -487,41 +677,102 @@ class Game(models.Model):
             self.start_new_round()
 
             self.initial_betting_sequence()
-            self.calculate_all_in_amounts()
             if self.check_for_all_ins():
                 skip_betting = True
             if self.if_everyone_folds():
                 return
 
-            self.deck.deal_flop()
+            self.deal_street('flop')
             if not skip_betting:
                 self.post_betting_sequence()
-                self.calculate_all_in_amounts()
                 if self.check_for_all_ins():
                     skip_betting = True
             if self.if_everyone_folds():
                 return
 
-            self.deck.deal_turn()
+            self.deal_street('turn')
             if not skip_betting:
                 self.post_betting_sequence()
-                self.calculate_all_in_amounts()
                 if self.check_for_all_ins():
                     skip_betting = True
             if self.if_everyone_folds():
                 return
 
-            self.deck.deal_river()
+            self.deal_street('river')
             if not skip_betting:
                 self.post_betting_sequence()
-                self.calculate_all_in_amounts()
             if self.if_everyone_folds():
                 return
 
-            self.sort_players_all_in()
+            self.settle_pots()
+            if len(players) < 2:
+                break
 
-            self.determine_winner()
 
-            self.award_money_to_winner()
-            if len(players) < 2:
-                break
\ No newline at end of file
+
+class ChipLedger(models.Manager):
+    def post(self, amounts, reason, game=None):
+        """
+        Apply {user_id: signed cents} as one batch: one INSERT of ledger rows
+        and one UPDATE adding each amount to the cached balance with an F()
+        expression, in one transaction. Nothing reads the balance first, so
+        tables settling at the same time cannot overwrite each other.
+        """
+        amounts = {user_id: amount for user_id, amount in amounts.items() if amount}
+        if not amounts:
+            return []
+        entries = [self.model(user_id=user_id, game=game, amount=amount, reason=reason) for user_id, amount in amounts.items()]
+        change = Case(
+            *[When(pk=user_id, then=Value(amount)) for user_id, amount in amounts.items()],
+            output_field=models.BigIntegerField(),
+        )
+        with transaction.atomic():
+            self.bulk_create(entries)
+            get_user_model().objects.filter(pk__in=amounts).update(chips=F('chips') + change)
+        return entries
+
+    def discrepancies(self):
+        """{user_id: (cached balance, ledger total)} for every user whose two disagree."""
+        users = get_user_model().objects.annotate(ledger_total=Sum('chip_transactions__amount', default=0))
+        return {
+            u.id: (u.chips, u.ledger_total)
+            for u in users.only('id', 'chips')
+            if u.chips != u.ledger_total
+        }
+
+
+class ChipTransaction(models.Model):
+    """One change to a user's balance. Rows are only ever added."""
+
+    OPENING = 'opening'
+    BET = 'bet'
+    WIN = 'win'
+    HAND = 'hand'
+    ADJUSTMENT = 'adjustment'
+    REASONS = [
+        (OPENING, 'Opening balance'), (BET, 'Bet'), (WIN, 'Win'), (HAND, 'Hand result'),
+        (ADJUSTMENT, 'Staff adjustment'),
+    ]
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='chip_transactions')
+    game = models.ForeignKey(Game, null=True, blank=True, on_delete=models.SET_NULL, related_name='chip_transactions')
+    amount = models.BigIntegerField()  # cents, negative for money leaving the balance
+    reason = models.CharField(max_length=16, choices=REASONS)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ChipLedger()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("ledger entries are append-only")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.user_id} {self.amount:+d} ({self.reason})"
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def _open_chip_account(sender, instance, created, raw=False, **kwargs):
+    # new users start with their default balance, record it so the ledger adds up
+    if created and not raw and instance.chips:
+        ChipTransaction.objects.create(user=instance, amount=instance.chips, reason=ChipTransaction.OPENING)
@@ -0,0 +1,63 @@
+"""
+Side pots.
+
+build_pots splits what everyone put into the hand into a main pot and side
+pots in one pass over the contributions sorted once: every distinct amount
+a live player put in closes a layer, and only players who put in at least
+that much can win it. Chips folded players put in go into the layers they
+reach, anything above the biggest live contribution goes to the top pot.
+
+settle pays every pot to the best hand(s) eligible for it, with strengths
+computed once per live player by the caller. Split pots are shared evenly
+and odd chips go to the winners closest to the left of the dealer.
+
+Amounts are integer chips (cents).
+"""
+from typing import Collection, Dict, List, Mapping, NamedTuple, Sequence, Tuple
+
+
+class Pot(NamedTuple):
+    amount: int
+    eligible: Tuple[int, ...]  # player ids, lowest contribution first
+
+
+def build_pots(contributions: Mapping[int, int], live: Collection[int]) -> List[Pot]:
+    """
+    Main pot first, then each side pot. contributions maps every player who
+    put chips in (folded or not) to their total, live are the ids still in.
+    """
+    live = set(live)
+    ordered = sorted(contributions.items(), key=lambda item: item[1])
+    pots: List[Pot] = []
+    level = 0
+    pending = 0  # folded chips between the last layer and the next live contribution
+    for i, (player_id, chips) in enumerate(ordered):
+        if player_id not in live:
+            pending += chips - level
+            continue
+        if chips == level:
+            continue
+        # every player from i on put in at least chips, folded ones included
+        amount = pending + (chips - level) * (len(ordered) - i)
+        pots.append(Pot(amount, tuple(p for p, _ in ordered[i:] if p in live)))
+        level = chips
+        pending = 0
+    if pending and pots:
+        pots[-1] = pots[-1]._replace(amount=pots[-1].amount + pending)
+    return pots
+
+
+def settle(pots: Sequence[Pot], strengths: Mapping[int, int], order: Sequence[int]) -> Dict[int, int]:
+    """
+    Chips won per player id. strengths holds an evaluator strength for every
+    live player, order is every player id clockwise from the dealer's left.
+    """
+    position = {player_id: i for i, player_id in enumerate(order)}
+    payouts: Dict[int, int] = {}
+    for pot in pots:
+        best = max(strengths[p] for p in pot.eligible)
+        winners = sorted((p for p in pot.eligible if strengths[p] == best), key=position.__getitem__)
+        share, odd = divmod(pot.amount, len(winners))
+        for i, player_id in enumerate(winners):
+            payouts[player_id] = payouts.get(player_id, 0) + share + (1 if i < odd else 0)
+    return payouts
@@ -0,0 +1,145 @@
+"""
+Precomputed preflop equity for the 169 starting hand classes.
+
+A class is written in Deck.RANKS notation: "AA" for pairs, "AKs" for suited
+and "AKo" for offsuit hands. Classes live on a 13 x 13 grid: pairs on the
+diagonal, suited hands at [high][low] and offsuit hands at [low][high].
+
+The table file is a 12 byte header followed by float32 equities, little
+endian, one row per class and one column per opponent count (1..8):
+
+    magic b"PFEQ" | version u16 | classes u16 | max opponents u16 | reserved u16
+
+It is built by `manage.py build_preflop_equity` and opened read only with
+mmap when the app starts, so every worker process shares the same pages.
+"""
+import mmap
+import struct
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+from . import evaluator
+
+
+MAGIC = b"PFEQ"
+VERSION = 1
+MAX_OPPONENTS = 8
+NUM_CLASSES = 169
+HEADER = struct.Struct("<4sHHHH")
+
+
+def class_index(hand_class: str) -> int:
+    """Grid index of a class name such as "AKs", "T9o" or "77"."""
+    high = evaluator.RANKS.index(hand_class[0])
+    low = evaluator.RANKS.index(hand_class[1])
+    if high < low:
+        raise ValueError(f"{hand_class!r}: higher rank comes first")
+    if high == low:
+        return high * 13 + high
+    if hand_class[2:] == "s":
+        return high * 13 + low
+    if hand_class[2:] == "o":
+        return low * 13 + high
+    raise ValueError(f"{hand_class!r}: expected an 's' or 'o' suffix")
+
+
+def class_name(index: int) -> str:
+    row, col = divmod(index, 13)
+    if row == col:
+        return evaluator.RANKS[row] * 2
+    if row > col:
+        return evaluator.RANKS[row] + evaluator.RANKS[col] + "s"
+    return evaluator.RANKS[col] + evaluator.RANKS[row] + "o"
+
+
+HAND_CLASSES = [class_name(i) for i in range(NUM_CLASSES)]
+
+
+def hand_class(cards: Sequence[int]) -> str:
+    """Class name of two evaluator int cards."""
+    a, b = cards
+    high, low = max(a >> 2, b >> 2), min(a >> 2, b >> 2)
+    name = evaluator.RANKS[high] + evaluator.RANKS[low]
+    if high == low:
+        return name
+    return name + ("s" if (a & 3) == (b & 3) else "o")
+
+
+def representative(hand_class_: str) -> List[int]:
+    """One concrete pair of int cards belonging to a class."""
+    high = evaluator.RANKS.index(hand_class_[0])
+    low = evaluator.RANKS.index(hand_class_[1])
+    second_suit = 0 if hand_class_.endswith("s") else 1
+    return [high * 4, low * 4 + second_suit]
+
+
+def simulate_class(hand_class_: str, opponents: int, samples: int, seed=None) -> float:
+    """Monte Carlo equity of a class against `opponents` random hands."""
+    rng = np.random.default_rng(seed)
+    hero = np.array(representative(hand_class_), dtype=np.intp)
+    remaining = np.array([c for c in range(52) if c not in hero], dtype=np.intp)
+    needed = 2 * opponents + 5
+
+    picks = remaining[np.argpartition(rng.random((samples, remaining.size)), needed - 1, axis=1)[:, :needed]]
+    board = picks[:, :5]
+    hero_strength = evaluator.evaluate_batch(np.concatenate([np.broadcast_to(hero, (samples, 2)), board], axis=1))
+    opp_strength = np.stack([
+        evaluator.evaluate_batch(np.concatenate([picks[:, 5 + 2 * i:7 + 2 * i], board], axis=1))
+        for i in range(opponents)
+    ])
+    best_opp = opp_strength.max(axis=0)
+    tied = (opp_strength == hero_strength).sum(axis=0)
+    share = np.where(hero_strength > best_opp, 1.0, 0.0)
+    share = np.where(hero_strength == best_opp, 1.0 / (tied + 1), share)
+    return float(share.mean())
+
+
+def write_table(path, equities: np.ndarray):
+    equities = np.asarray(equities, dtype="<f4")
+    if equities.shape != (NUM_CLASSES, MAX_OPPONENTS):
+        raise ValueError(f"expected a {(NUM_CLASSES, MAX_OPPONENTS)} array, got {equities.shape}")
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, NUM_CLASSES, MAX_OPPONENTS, 0))
+        f.write(equities.tobytes())
+
+
+class PreflopTable:
+    """Read only, memory mapped view of a table file."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, classes, opponents, _ = HEADER.unpack_from(self._mmap)
+        if (magic, version, classes, opponents) != (MAGIC, VERSION, NUM_CLASSES, MAX_OPPONENTS):
+            self._mmap.close()
+            raise ValueError(f"{path} is not a preflop equity table this version can read")
+        self.equities = np.frombuffer(self._mmap, dtype="<f4", offset=HEADER.size).reshape(NUM_CLASSES, MAX_OPPONENTS)
+
+    def equity(self, hand_class_: str, opponents: int) -> float:
+        if not 1 <= opponents <= MAX_OPPONENTS:
+            raise ValueError(f"opponents must be between 1 and {MAX_OPPONENTS}")
+        return float(self.equities[class_index(hand_class_), opponents - 1])
+
+    def equity_for_cards(self, cards: Sequence[int], opponents: int) -> float:
+        return self.equity(hand_class(cards), opponents)
+
+
+_table: Optional[PreflopTable] = None
+
+
+def load_table(path) -> Optional[PreflopTable]:
+    """Open the table at path for this process. Missing files leave it unloaded."""
+    global _table
+    if Path(path).exists():
+        _table = PreflopTable(path)
+    else:
+        _table = None
+    return _table
+
+
+def get_table() -> Optional[PreflopTable]:
+    return _table
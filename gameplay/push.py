@@ -0,0 +1,90 @@
+"""
+Live table updates over WebSockets.
+
+Every checkpoint of a hand is turned into events by comparing the previous
+engine snapshot with the new one:
+
+    deal      a new hand: button, blinds, stacks, whose turn, hole cards
+    action    one betting action (including the posted blinds)
+    board     the flop, turn or river came out
+    showdown  the hand is over: payouts and the hands still in
+
+and once the transaction commits send_hand puts them on the table's group
+of the channel layer in a single group_send. gameplay.consumers.TableConsumer
+forwards them to each connected player, with hole cards cut down to the
+player's own until the showdown. Every event carries the game version.
+
+Needs django-channels; without it send_hand() does nothing.
+"""
+from typing import Dict, List, Optional
+
+try:
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+except ImportError:  # channels is optional, without it there is nobody to push to
+    get_channel_layer = None
+
+
+def group_name(game_id: int) -> str:
+    return f"table-{game_id}"
+
+
+def hand_events(previous: Optional[Dict[str, object]], current: Dict[str, object], version: int) -> List[Dict[str, object]]:
+    """Events between two HandState.to_dict() snapshots, previous None or {} for a new hand."""
+    seats = current["seats"]
+    log = [list(entry) for entry in current["log"]]  # tuples in memory, lists once stored
+    # within a hand the hole cards never change and the log only grows
+    same_hand = (
+        previous
+        and [(s[0], s[3]) for s in previous["seats"]] == [(s[0], s[3]) for s in seats]
+        and log[: len(previous["log"])] == [list(entry) for entry in previous["log"]]
+    )
+    events = []
+    if not same_hand:
+        previous = None
+        events.append({
+            "type": "deal",
+            "dealer": current["dealer"],
+            "blinds": current["blinds"],
+            "stacks": {s[0]: s[2] for s in seats},
+            "hands": {s[0]: s[3] for s in seats},
+        })
+
+    for player_id, action, chips in log[len(previous["log"]) if previous else 0:]:
+        events.append({"type": "action", "player_id": player_id, "action": action, "chips": chips})
+
+    board = current["board"]
+    if len(board) > (len(previous["board"]) if previous else 0):
+        events.append({"type": "board", "cards": board})
+
+    if current["payouts"] and not (previous and previous["payouts"]):
+        live = {s[0]: s[3] for s in seats if not s[6]}
+        events.append({
+            "type": "showdown",
+            "payouts": dict(current["payouts"]),
+            "hands": live if len(live) > 1 else {},
+        })
+
+    pot = sum(s[5] for s in seats)
+    to_act = seats[current["to_act"]][0] if current["to_act"] is not None else None
+    for event in events:
+        event.update(version=version, pot=pot, to_act=to_act)
+    return events
+
+
+def for_player(event: Dict[str, object], player_id: Optional[int]) -> Dict[str, object]:
+    """The event as player_id may see it: only their own hole cards before the showdown."""
+    if event["type"] != "deal":
+        return event
+    hands = {pid: cards for pid, cards in event["hands"].items() if pid == player_id}
+    return {**event, "hands": hands}
+
+
+def send_hand(game_id: int, previous: Optional[Dict[str, object]], current: Dict[str, object], version: int):
+    """Push the events between two snapshots to everyone watching the table."""
+    layer = get_channel_layer() if get_channel_layer is not None else None
+    if layer is None:
+        return
+    events = hand_events(previous, current, version)
+    if events:
+        async_to_sync(layer.group_send)(group_name(game_id), {"type": "table.events", "events": events})
@@ -0,0 +1,208 @@
+"""
+Headless self-play on the in-memory hand engine.
+
+play_table deals hands at one table of scripted bots and checks every hand
+for money bugs: chips created or destroyed, payouts that do not add up to
+the pot, negative stacks and payouts to folded players. simulate shards
+tables across a process pool and merges the reports, `manage.py selfplay`
+is the command line front end.
+
+Amounts are integer chips (cents), like in engine.
+"""
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from . import engine
+
+
+Bot = Callable[[engine.HandState, engine.Seat, random.Random], Tuple[str, int]]
+
+# Where play_table spends its time. The action that ends a hand is counted
+# under "settle" since it includes the showdown and payout.
+PHASES = ["deal", "preflop", "flop", "turn", "river", "settle"]
+
+MAX_ACTIONS_PER_HAND = 500
+MAX_EXAMPLES = 20
+
+
+def calling_station(state: engine.HandState, seat: engine.Seat, rng: random.Random) -> Tuple[str, int]:
+    """Never folds, never raises."""
+    return (engine.CALL, 0) if state.current_bet > seat.street_bet else (engine.CHECK, 0)
+
+
+def _raise(state: engine.HandState, seat: engine.Seat, rng: random.Random) -> Tuple[str, int]:
+    """A legal raise between the minimum and the minimum plus the pot, all in when short."""
+    minimum = max(2 * state.current_bet, state.big_blind)
+    amount = minimum + rng.randint(0, state.pot)
+    if amount - seat.street_bet >= seat.stack:
+        return engine.ALL_IN, 0
+    return engine.BET, amount
+
+
+def aggressive(state: engine.HandState, seat: engine.Seat, rng: random.Random) -> Tuple[str, int]:
+    roll = rng.random()
+    if roll < 0.05:
+        return engine.ALL_IN, 0
+    if roll < 0.45:
+        return _raise(state, seat, rng)
+    return calling_station(state, seat, rng)
+
+
+def random_bot(state: engine.HandState, seat: engine.Seat, rng: random.Random) -> Tuple[str, int]:
+    roll = rng.random()
+    if roll < 0.25 and state.current_bet > seat.street_bet:
+        return engine.FOLD, 0
+    if roll < 0.30:
+        return engine.ALL_IN, 0
+    if roll < 0.50:
+        return _raise(state, seat, rng)
+    return calling_station(state, seat, rng)
+
+
+BOTS: Dict[str, Bot] = {
+    "station": calling_station,
+    "aggressive": aggressive,
+    "random": random_bot,
+}
+
+
+def check_hand(state: engine.HandState, chips_before: int) -> List[str]:
+    """Money invariants of a finished hand, one message per broken one."""
+    problems = []
+    chips_after = sum(seat.stack for seat in state.seats)
+    if chips_after != chips_before:
+        problems.append(f"{chips_before} chips before the hand, {chips_after} after")
+    paid = sum(state.payouts.values())
+    if paid != state.pot:
+        problems.append(f"paid out {paid} from a pot of {state.pot}")
+    for seat in state.seats:
+        if seat.stack < 0:
+            problems.append(f"{seat.name} has a negative stack {seat.stack}")
+        if seat.folded and state.payouts.get(seat.player_id):
+            problems.append(f"{seat.name} folded but was paid {state.payouts[seat.player_id]}")
+    return problems
+
+
+def play_table(
+    players: int,
+    hands: int,
+    bots: Sequence[str],
+    seed,
+    stack: int,
+    small_blind: int,
+    big_blind: int,
+) -> Dict[str, object]:
+    """
+    Play hands at one table. Seat i is played by bots[i % len(bots)], busted
+    players rebuy to stack and the button moves every hand.
+    """
+    rng = random.Random(seed)
+    policies = [BOTS[name] for name in bots]
+    stacks = [stack] * players
+    deck = list(range(52))
+    dealer = 0
+    timings = dict.fromkeys(PHASES, 0.0)
+    actions = rejected = showdowns = violations = 0
+    examples: List[str] = []
+    clock = time.perf_counter
+
+    for hand in range(hands):
+        stacks = [s if s >= big_blind else stack for s in stacks]
+        chips_before = sum(stacks)
+        rng.shuffle(deck)
+
+        start = clock()
+        state = engine.HandState.new_hand(
+            [(i, f"bot{i}", s) for i, s in enumerate(stacks)], deck, dealer, small_blind, big_blind
+        )
+        timings["deal"] += clock() - start
+
+        problems = []
+        hand_actions = 0
+        while not state.finished:
+            if hand_actions == MAX_ACTIONS_PER_HAND:
+                problems.append(f"no result after {MAX_ACTIONS_PER_HAND} actions")
+                break
+            hand_actions += 1
+            seat = state.seats[state.to_act]
+            phase = engine.STREET_NAMES[state.street]
+            action, amount = policies[seat.player_id % len(policies)](state, seat, rng)
+
+            start = clock()
+            result = state.act(seat.player_id, action, amount)
+            if not result["success"]:
+                rejected += 1
+                result = state.act(seat.player_id, *calling_station(state, seat, rng))
+            elapsed = clock() - start
+            timings["settle" if state.finished else phase] += elapsed
+            actions += 1
+            if not result["success"]:
+                problems.append(f"{seat.name} could not check or call: {result['message']}")
+                break
+
+        if state.finished:
+            problems += check_hand(state, chips_before)
+            if len(state.board) == engine.BOARD_SIZE[engine.RIVER] and len(state.live_seats()) > 1:
+                showdowns += 1
+        if problems:
+            violations += 1
+            if len(examples) < MAX_EXAMPLES:
+                examples.append(f"seed {seed} hand {hand}: " + "; ".join(problems))
+            # start the next hand from a clean table rather than compound the error
+            stacks = [stack] * players
+        else:
+            stacks = [seat.stack for seat in state.seats]
+        dealer = (dealer + 1) % players
+
+    return {
+        "hands": hands,
+        "actions": actions,
+        "rejected": rejected,
+        "showdowns": showdowns,
+        "violations": violations,
+        "examples": examples,
+        "timings": timings,
+    }
+
+
+def simulate(
+    tables: int,
+    hands_per_table: int,
+    players: int = 6,
+    bots: Sequence[str] = tuple(BOTS),
+    seed=None,
+    workers: Optional[int] = None,
+    stack: int = 1000,
+    small_blind: int = 10,
+    big_blind: int = 25,
+) -> Dict[str, object]:
+    """
+    Run tables independent tables and merge their reports. Tables run in a
+    process pool of workers processes (default: CPU count), workers=0 plays
+    them in this process.
+    """
+    if not 2 <= players <= 9:
+        raise ValueError("a table seats 2 to 9 players")
+    unknown = set(bots) - set(BOTS)
+    if unknown:
+        raise ValueError(f"unknown bots: {', '.join(sorted(unknown))}")
+    base_seed = random.Random(seed).getrandbits(64)
+    seeds = [base_seed + table for table in range(tables)]
+    args = [(players, hands_per_table, list(bots), s, stack, small_blind, big_blind) for s in seeds]
+
+    start = time.perf_counter()
+    if workers == 0:
+        reports = [play_table(*a) for a in args]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            reports = list(pool.map(play_table, *zip(*args)))
+    seconds = time.perf_counter() - start
+
+    merged = {key: sum(r[key] for r in reports) for key in ("hands", "actions", "rejected", "showdowns", "violations")}
+    merged["examples"] = [e for r in reports for e in r["examples"]][:MAX_EXAMPLES]
+    merged["timings"] = {phase: sum(r["timings"][phase] for r in reports) for phase in PHASES}
+    merged["seconds"] = seconds
+    merged["hands_per_sec"] = merged["hands"] / seconds if seconds else 0.0
+    return merged
@@ -0,0 +1,42 @@
+"""
+Deterministic deck order derived from a secret seed.
+
+The seed is 32 random bytes from `secrets`. The order is a Fisher-Yates
+shuffle driven by SHA-256(seed || counter) blocks, with rejection sampling so
+every permutation is equally likely. The same seed always gives the same
+order, which lets Deck persist only the seed and a draw pointer and lets a
+finished hand be replayed for audits.
+"""
+import hashlib
+import secrets
+from functools import lru_cache
+from typing import Iterator, Tuple
+
+
+def new_seed() -> str:
+    return secrets.token_hex(32)
+
+
+def _random_words(seed: bytes) -> Iterator[int]:
+    counter = 0
+    while True:
+        block = hashlib.sha256(seed + counter.to_bytes(8, "big")).digest()
+        for i in range(0, 32, 4):
+            yield int.from_bytes(block[i:i + 4], "big")
+        counter += 1
+
+
+@lru_cache(maxsize=1024)
+def deck_order(seed: str) -> Tuple[int, ...]:
+    """All 52 int cards in the order the deck with this hex seed deals them."""
+    cards = list(range(52))
+    words = _random_words(bytes.fromhex(seed))
+    for i in range(51, 0, -1):
+        bound = i + 1
+        limit = (1 << 32) - (1 << 32) % bound
+        word = next(words)
+        while word >= limit:
+            word = next(words)
+        j = word % bound
+        cards[i], cards[j] = cards[j], cards[i]
+    return tuple(cards)
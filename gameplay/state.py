@@ -0,0 +1,78 @@
+"""
+Compact table state for clients that poll, versioned by Game.version.
+
+The public view of a hand is built from its engine snapshot once per game
+version and kept in the cache, hole cards already stripped. A player's view
+is that plus their own two cards, so redaction is never redone per request:
+
+    street   engine street index
+    board    community cards
+    pot      chips in the middle
+    bet      the bet to call this street
+    dealer   player id on the button
+    to_act   player id whose turn it is, or None
+    blinds   [small, big]
+    seats    [player id, name, stack, street bet, folded, all in] in seat order
+    payouts  {player id: chips} once the hand is over
+    shown    {player id: cards} for the hands still in at a showdown
+    hand     the player's own cards
+
+changes() gives the keys that differ between two versions. The version a
+client last saw is still cached, unless it was evicted, in which case
+the client gets everything again. Amounts are integer chips (cents).
+"""
+from typing import Dict, Optional, Tuple
+
+from django.core.cache import cache
+
+STATE_TIMEOUT = 10 * 60  # seconds a version stays around for deltas against it
+
+PublicState = Tuple[Dict[str, object], Dict[int, list]]
+
+
+def _key(game_id: int, version: int) -> str:
+    return f"table-state:{game_id}:{version}"
+
+
+def build(hand_state: Optional[Dict[str, object]]) -> PublicState:
+    """The public view of an engine snapshot, and the hole cards it left out."""
+    if not hand_state:
+        return {"street": None, "board": [], "pot": 0, "bet": 0, "dealer": None, "to_act": None,
+                "blinds": None, "seats": [], "payouts": {}, "shown": {}}, {}
+    seats = hand_state["seats"]
+    payouts = {pid: chips for pid, chips in hand_state["payouts"]}
+    live = {s[0]: s[3] for s in seats if not s[6]}
+    public = {
+        "street": hand_state["street"],
+        "board": hand_state["board"],
+        "pot": sum(s[5] for s in seats),
+        "bet": hand_state["current_bet"],
+        "dealer": seats[hand_state["dealer"]][0],
+        "to_act": seats[hand_state["to_act"]][0] if hand_state["to_act"] is not None else None,
+        "blinds": hand_state["blinds"],
+        "seats": [[s[0], s[1], s[2], s[4], s[6], s[7]] for s in seats],
+        "payouts": payouts,
+        "shown": live if payouts and len(live) > 1 else {},
+    }
+    return public, {s[0]: s[3] for s in seats}
+
+
+def cached(game_id: int, version: int) -> Optional[PublicState]:
+    return cache.get(_key(game_id, version))
+
+
+def store(game_id: int, version: int, hand_state: Optional[Dict[str, object]]) -> PublicState:
+    """Build the public view for this version once and cache it for every player."""
+    state = build(hand_state)
+    cache.set(_key(game_id, version), state, STATE_TIMEOUT)
+    return state
+
+
+def for_player(state: PublicState, player_id: Optional[int]) -> Dict[str, object]:
+    public, hands = state
+    return {**public, "hand": hands.get(player_id, [])}
+
+
+def changes(old: Dict[str, object], new: Dict[str, object]) -> Dict[str, object]:
+    """The keys of new that differ from old."""
+    return {key: value for key, value in new.items() if old.get(key) != value}
@@ -0,0 +1,173 @@
+"""
+Player statistics over the hand history, computed with NumPy.
+
+StatsColumns keeps one row per player per recorded hand in flat column
+files, opened with np.memmap so a query only pages in the columns it reads
+and every process shares them:
+
+    hand_id     i8   the hand the row belongs to
+    player_id   i8   gameplay Player id
+    flags       u1   VPIP, PFR, SAW_FLOP, SHOWDOWN, WON_SHOWDOWN bits
+    aggressive  u1   bets and raises after the flop
+    calls       u1   calls after the flop
+    net         i8   chips won minus chips put in (cents)
+
+update() appends the hands recorded in a history.HandHistory since the last
+update. meta.json (row count, last hand id) is replaced after the columns
+are written, so an interrupted update leaves extra rows that the next one
+trims. summary() reduces the columns per player with bincounts:
+
+    hands              hands played
+    vpip               share of hands with chips put in voluntarily preflop
+    pfr                share of hands raised preflop
+    aggression         postflop bets and raises per call, None without calls
+    showdown_win_rate  share of showdowns won, None without showdowns
+    net                chips won overall
+"""
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from . import engine
+from .history import HandHistory, HandRecord
+
+
+COLUMNS = {
+    "hand_id": np.dtype("<i8"),
+    "player_id": np.dtype("<i8"),
+    "flags": np.dtype("u1"),
+    "aggressive": np.dtype("u1"),
+    "calls": np.dtype("u1"),
+    "net": np.dtype("<i8"),
+}
+VPIP, PFR, SAW_FLOP, SHOWDOWN, WON_SHOWDOWN = 1, 2, 4, 8, 16
+BLINDS = ("small_blind", "big_blind")
+
+
+def hand_rows(hand: HandRecord) -> List[Tuple[int, int, int, int, int, int]]:
+    """(hand_id, player_id, flags, aggressive, calls, net) for every seat of a hand."""
+    flop = hand.streets[0] if hand.streets else len(hand.actions)
+    new_street = set(hand.streets)
+    flags = {s.player_id: 0 for s in hand.seats}
+    aggressive = dict.fromkeys(flags, 0)
+    calls = dict.fromkeys(flags, 0)
+    folded_preflop = set()
+    street_bets: Dict[int, int] = {}
+    current_bet = 0
+    for i, (player_id, action, chips) in enumerate(hand.actions):
+        if i in new_street:
+            street_bets, current_bet = {}, 0
+        street_bets[player_id] = street_bets.get(player_id, 0) + chips
+        raised = street_bets[player_id] > current_bet
+        current_bet = max(current_bet, street_bets[player_id])
+        if action in BLINDS:
+            continue
+        aggression = action in (engine.BET, engine.ALL_IN) and raised
+        if i < flop:
+            if action == engine.FOLD:
+                folded_preflop.add(player_id)
+            elif chips:
+                flags[player_id] |= VPIP | (PFR if aggression else 0)
+        elif aggression:
+            aggressive[player_id] += 1
+        elif chips:
+            calls[player_id] += 1
+
+    showdown = sum(not s.folded for s in hand.seats) > 1
+    rows = []
+    for seat in hand.seats:
+        f = flags[seat.player_id]
+        if hand.streets and seat.player_id not in folded_preflop:
+            f |= SAW_FLOP
+        if showdown and not seat.folded:
+            f |= SHOWDOWN | (WON_SHOWDOWN if seat.payout else 0)
+        rows.append((
+            hand.hand_id, seat.player_id, f,
+            min(aggressive[seat.player_id], 255), min(calls[seat.player_id], 255), seat.payout - seat.bet,
+        ))
+    return rows
+
+
+class StatsColumns:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        meta = self.path / "meta.json"
+        data = json.loads(meta.read_text()) if meta.exists() else {}
+        self.rows = data.get("rows", 0)
+        self.last_hand_id = data.get("last_hand_id", 0)
+
+    def column(self, name: str) -> np.ndarray:
+        if not self.rows:
+            return np.zeros(0, dtype=COLUMNS[name])
+        return np.memmap(self.path / f"{name}.bin", dtype=COLUMNS[name], mode="r", shape=(self.rows,))
+
+    def update(self, history: HandHistory, batch: int = 100_000) -> int:
+        """Add the hands recorded since the last update, batch rows at a time. Returns the hand count."""
+        for name, dtype in COLUMNS.items():
+            file = self.path / f"{name}.bin"
+            if file.exists() and file.stat().st_size > self.rows * dtype.itemsize:
+                os.truncate(file, self.rows * dtype.itemsize)
+        hands = 0
+        pending: List[Tuple[int, int, int, int, int, int]] = []
+        for hand in history.scan(self.last_hand_id + 1):
+            pending += hand_rows(hand)
+            hands += 1
+            if len(pending) >= batch:
+                self._append(pending, hand.hand_id)
+                pending = []
+        if pending:
+            self._append(pending, pending[-1][0])
+        return hands
+
+    def _append(self, rows, last_hand_id: int):
+        values = list(zip(*rows))
+        for (name, dtype), column in zip(COLUMNS.items(), values):
+            with open(self.path / f"{name}.bin", "ab") as f:
+                f.write(np.asarray(column, dtype=dtype).tobytes())
+        self.rows += len(rows)
+        self.last_hand_id = last_hand_id
+        meta = self.path / "meta.json"
+        tmp = meta.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"rows": self.rows, "last_hand_id": last_hand_id}))
+        os.replace(tmp, meta)
+
+    def summary(self, player_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict[str, object]]:
+        """Stats per player id, for every player or only player_ids."""
+        players = self.column("player_id")
+        selected = slice(None)
+        if player_ids is not None:
+            selected = np.flatnonzero(np.isin(players, np.fromiter(player_ids, dtype=np.int64)))
+            players = players[selected]
+        if not len(players):
+            return {}
+
+        size = int(players.max()) + 1
+
+        def total(values):
+            return np.bincount(players, weights=values, minlength=size)
+
+        flags = self.column("flags")[selected]
+        hands = np.bincount(players, minlength=size)
+        vpip = total((flags & VPIP) != 0)
+        pfr = total((flags & PFR) != 0)
+        showdowns = total((flags & SHOWDOWN) != 0)
+        won = total((flags & WON_SHOWDOWN) != 0)
+        aggressive = total(self.column("aggressive")[selected])
+        calls = total(self.column("calls")[selected])
+        net = total(self.column("net")[selected])
+
+        return {
+            int(p): {
+                "hands": int(hands[p]),
+                "vpip": vpip[p] / hands[p],
+                "pfr": pfr[p] / hands[p],
+                "aggression": aggressive[p] / calls[p] if calls[p] else None,
+                "showdown_win_rate": won[p] / showdowns[p] if showdowns[p] else None,
+                "net": int(round(net[p])),
+            }
+            for p in np.flatnonzero(hands)
+        }
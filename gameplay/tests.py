@@ -1,3 +1,1418 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import random
+import tempfile
+import threading
+import unittest.mock
+from itertools import combinations
+from pathlib import Path
 
-# Create your tests here.
+import numpy as np
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import (
+    actors, benchmarks, constants, engine, equity, evaluator, export, history, isomorphism, lobby, pots, preflop, push,
+    seating, selfplay, shuffle, state, stats, unit_of_work, views,
+)
+from .models import ChipTransaction, Deck, Game, HandInProgressError, Player, StaleGameError
+
+
+DECK = [(rank, suit) for rank in evaluator.RANKS for suit in evaluator.SUITS]
+
+
+def reference_7card(cards):
+    """The original 21 subset loop, kept here as the oracle for the table evaluator."""
+    best = (9, [-1, -1, -1, -1, -1])
+    for combo in combinations(cards, 5):
+        cat, tie = constants.evaluate_5card_hand_detailed(list(combo))
+        if cat < best[0] or (cat == best[0] and tie > best[1]):
+            best = (cat, tie)
+    return best
+
+
+class EvaluatorTests(TestCase):
+    def test_card_encoding_round_trip(self):
+        self.assertEqual(evaluator.encode_card(("2", "S")), 0)
+        self.assertEqual(evaluator.encode_card(("A", "D")), 51)
+        for card in DECK:
+            self.assertEqual(evaluator.decode_card(evaluator.encode_card(card)), card)
+
+    def test_detailed_api_matches_reference(self):
+        rng = random.Random(7)
+        for _ in range(2000):
+            hand = rng.sample(DECK, 7)
+            self.assertEqual(constants.evaluate_7card_hand_detailed(hand), reference_7card(hand))
+
+    def test_strength_ordering_matches_reference(self):
+        rng = random.Random(11)
+        for _ in range(1000):
+            a, b = rng.sample(DECK, 7), rng.sample(DECK, 7)
+            cat_a, tie_a = reference_7card(a)
+            cat_b, tie_b = reference_7card(b)
+            strength_a = evaluator.evaluate(evaluator.encode_cards(a))
+            strength_b = evaluator.evaluate(evaluator.encode_cards(b))
+            self.assertEqual((-cat_a, tie_a) > (-cat_b, tie_b), strength_a > strength_b)
+            self.assertEqual((cat_a, tie_a) == (cat_b, tie_b), strength_a == strength_b)
+
+    def test_special_hands(self):
+        wheel = [("A", "S"), ("2", "S"), ("3", "S"), ("4", "S"), ("5", "S"), ("K", "D"), ("K", "H")]
+        self.assertEqual(constants.evaluate_7card_hand_detailed(wheel), (1, [5]))
+        boat = [("9", "S"), ("9", "C"), ("9", "H"), ("4", "S"), ("4", "D"), ("4", "C"), ("2", "H")]
+        self.assertEqual(constants.evaluate_7card_hand_detailed(boat), (3, [9, 4]))
+
+    def test_batch_matches_scalar(self):
+        rng = random.Random(5)
+        rows = [rng.sample(range(52), 7) for _ in range(3000)]
+        strengths = evaluator.evaluate_batch(rows)
+        self.assertEqual(strengths.shape, (3000,))
+        self.assertEqual(strengths.tolist(), [evaluator.evaluate(r) for r in rows])
+        five = [r[:5] for r in rows]
+        self.assertEqual(evaluator.evaluate_batch(five).tolist(), [evaluator.evaluate(r) for r in five])
+
+    def test_batch_rejects_bad_shape(self):
+        with self.assertRaises(ValueError):
+            evaluator.evaluate_batch([[1, 2, 3]])
+
+
+def make_player(game, username, hand, seat, chips=1000):
+    user = get_user_model().objects.create_user(username=username, chips=chips)
+    player = Player.objects.create(user=user, hand=hand, seat_position=seat, sitting_in=True)
+    game.players.add(player)
+    return player
+
+
+def fold_out(game):
+    """End the hand in progress by folding everyone to one player."""
+    state = game.load_hand()
+    while not state.finished:
+        state.act(state.seats[state.to_act].player_id, engine.FOLD)
+    game.checkpoint(state)
+
+
+class EquityTests(TestCase):
+    def test_monte_carlo_preflop(self):
+        aces = evaluator.encode_cards([("A", "S"), ("A", "C")])
+        kings = evaluator.encode_cards([("K", "S"), ("K", "C")])
+        result = equity.monte_carlo_equity([aces, kings], workers=0, margin=0.01, seed=1)
+        self.assertAlmostEqual(result["players"][0]["equity"], 0.82, delta=0.02)
+        self.assertAlmostEqual(sum(p["equity"] for p in result["players"]), 1.0)
+        self.assertLessEqual(result["margin"], 0.01)
+
+    def test_monte_carlo_complete_board_is_exact(self):
+        board = evaluator.encode_cards([("2", "S"), ("7", "D"), ("9", "H"), ("J", "C"), ("Q", "D")])
+        hands = [evaluator.encode_cards([("3", "S"), ("4", "C")]), evaluator.encode_cards([("3", "H"), ("4", "D")])]
+        result = equity.monte_carlo_equity(hands, board, workers=0)
+        self.assertEqual([p["tie"] for p in result["players"]], [1.0, 1.0])
+        self.assertEqual([p["equity"] for p in result["players"]], [0.5, 0.5])
+
+    def test_exact_flop_matches_brute_force(self):
+        hands = [evaluator.encode_cards([("A", "S"), ("A", "C")]), evaluator.encode_cards([("K", "S"), ("K", "C")])]
+        flop = evaluator.encode_cards([("2", "S"), ("7", "S"), ("9", "H")])
+        result = equity.exact_equity(hands, flop)
+        self.assertEqual(result["samples"], 990)
+
+        remaining = [c for c in range(52) if c not in flop + hands[0] + hands[1]]
+        aces_win = ties = 0
+        for runout in combinations(remaining, 2):
+            a = evaluator.evaluate(hands[0] + flop + list(runout))
+            b = evaluator.evaluate(hands[1] + flop + list(runout))
+            aces_win += a > b
+            ties += a == b
+        self.assertAlmostEqual(result["players"][0]["win"], aces_win / 990)
+        self.assertAlmostEqual(result["players"][0]["tie"], ties / 990)
+
+    def test_exact_turn(self):
+        hands = [evaluator.encode_cards([("A", "S"), ("A", "C")]), evaluator.encode_cards([("K", "S"), ("K", "C")])]
+        turn = evaluator.encode_cards([("2", "D"), ("7", "D"), ("9", "H"), ("K", "D")])
+        result = equity.exact_equity(hands, turn)
+        self.assertEqual(result["samples"], 44)
+        self.assertAlmostEqual(result["players"][0]["equity"], 2 / 44)
+
+    def test_duplicate_cards_rejected(self):
+        with self.assertRaises(ValueError):
+            equity.monte_carlo_equity([[0, 1], [1, 2]], workers=0)
+
+    @override_settings(EQUITY_WORKERS=0)
+    def test_all_in_equity(self):
+        game = Game.objects.create()
+        Deck.objects.create(game=game, community_cards=evaluator.encode_cards([("2", "S"), ("7", "D"), ("9", "H"), ("J", "C")]))
+        alice = make_player(game, "alice", evaluator.encode_cards([("A", "S"), ("A", "C")]), 0)
+        bob = make_player(game, "bob", evaluator.encode_cards([("K", "S"), ("K", "C")]), 1)
+        odds = game.all_in_equity()
+        self.assertAlmostEqual(odds[alice.id]["equity"] + odds[bob.id]["equity"], 1.0)
+        self.assertAlmostEqual(odds[bob.id]["equity"], 2 / 44)
+
+
+class EquityViewTests(TestCase):
+    def setUp(self):
+        self.game = Game.objects.create()
+        self.alice = make_player(self.game, "alice", [], 0)
+        self.bob = make_player(self.game, "bob", [], 1)
+        self.game.start_new_round()
+        self.url = reverse("gameplay:equity", args=[self.game.id])
+
+    def act(self, action):
+        state = self.game.load_hand()
+        player = Player.objects.get(pk=state.seats[state.to_act].player_id)
+        self.assertTrue(self.game.apply_action(player, action)["success"])
+
+    def test_hidden_from_players_while_betting_is_open(self):
+        self.client.force_login(self.alice.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        staff = get_user_model().objects.create_user(username="staff", is_staff=True)
+        self.client.force_login(staff)
+        self.act(engine.CALL)
+        self.act(engine.CHECK)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["board"]), 3)
+
+    def test_all_in_odds_on_the_board_when_the_chips_went_in(self):
+        self.act(engine.CALL)
+        self.act(engine.CHECK)
+        self.act(engine.ALL_IN)
+        self.act(engine.CALL)
+        self.assertEqual(len(self.game.load_hand().board), 5)  # run out to the river
+        self.client.force_login(self.alice.user)
+        body = self.client.get(self.url).json()
+        self.assertEqual(body["board"], self.game.load_hand().board[:3])
+        self.assertTrue(body["exact"])
+        hand = self.game.load_hand()
+        expected = equity.exact_equity([seat.hand for seat in hand.seats], hand.board[:3])["players"]
+        self.assertEqual(body["equity"], {str(seat.player_id): odds for seat, odds in zip(hand.seats, expected)})
+
+
+class PreflopTableTests(TestCase):
+    def test_hand_classes(self):
+        self.assertEqual(len(set(preflop.HAND_CLASSES)), 169)
+        for i, name in enumerate(preflop.HAND_CLASSES):
+            self.assertEqual(preflop.class_index(name), i)
+            self.assertEqual(preflop.hand_class(preflop.representative(name)), name)
+        self.assertEqual(preflop.hand_class(evaluator.encode_cards([("K", "H"), ("A", "H")])), "AKs")
+        self.assertEqual(preflop.hand_class(evaluator.encode_cards([("7", "S"), ("2", "D")])), "72o")
+
+    def test_table_round_trip(self):
+        equities = np.random.default_rng(0).random((169, 8)).astype(np.float32)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "table.bin"
+            preflop.write_table(path, equities)
+            table = preflop.PreflopTable(path)
+            self.assertAlmostEqual(table.equity("AKs", 3), float(equities[preflop.class_index("AKs"), 2]))
+            self.assertAlmostEqual(table.equity("22", 8), float(equities[preflop.class_index("22"), 7]))
+            with self.assertRaises(ValueError):
+                table.equity("AA", 9)
+
+    def test_simulate_class(self):
+        self.assertAlmostEqual(preflop.simulate_class("AA", 1, 20000, seed=1), 0.85, delta=0.02)
+
+
+class DeckTests(TestCase):
+    def test_deck_deals_int_cards(self):
+        game = Game.objects.create()
+        make_player(game, "alice", [], 0)
+        make_player(game, "bob", [], 1)
+        game.start_new_round()
+
+        deck = Deck.objects.get(game=game)
+        hands = [p.hand for p in game.players.all()]
+        self.assertEqual(len(deck.cards), 48)
+        self.assertTrue(all(isinstance(c, int) for hand in hands for c in hand))
+        self.assertEqual(sorted(deck.cards + hands[0] + hands[1]), list(range(52)))
+        self.assertEqual(deck.draw_index, 4)
+        self.assertEqual(hands[0] + hands[1], list(deck.order[:4]))
+
+    def test_seed_gives_a_deterministic_permutation(self):
+        seed = shuffle.new_seed()
+        self.assertEqual(shuffle.deck_order(seed), shuffle.deck_order(seed))
+        self.assertEqual(sorted(shuffle.deck_order(seed)), list(range(52)))
+        self.assertNotEqual(shuffle.deck_order(seed), shuffle.deck_order(shuffle.new_seed()))
+
+    def test_draw_only_writes_the_pointer(self):
+        game = Game.objects.create()
+        deck = Deck.objects.create(game=game)
+        deck.build_deck()
+        with CaptureQueriesContext(connection) as ctx:
+            deck.deal_flop()
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn("draw_index", ctx.captured_queries[0]["sql"])
+        self.assertNotIn("seed", ctx.captured_queries[0]["sql"])
+
+        replay = Deck.objects.get(pk=deck.pk)
+        self.assertEqual(replay.community_cards, list(shuffle.deck_order(deck.seed)[:3]))
+        self.assertEqual(replay.cards, deck.cards)
+
+    @override_settings(GAMEPLAY_DB_THREADS=0)
+    def test_start_round_view_sends_int_cards(self):
+        game = Game.objects.create()
+        make_player(game, "bob", [], 1)
+        user = get_user_model().objects.create_user(username="alice")
+        self.client.force_login(user)
+
+        response = self.client.post(reverse("gameplay:start_round_ajax", args=[game.id]))
+        hands = response.json()["hands"]
+        self.assertEqual(list(hands), [str(user.player_profile.id)])  # bob's cards are not sent to alice
+        self.assertTrue(all(0 <= c < 52 for c in hands[str(user.player_profile.id)]))
+
+
+class BenchmarkCompareTests(TestCase):
+    def test_compare_flags_regressions(self):
+        baseline = {
+            "a.queries": {"value": 10, "unit": "queries", "better": "lower"},
+            "a.ms": {"value": 10.0, "unit": "ms", "better": "lower"},
+            "b.per_sec": {"value": 1000.0, "unit": "hands/s", "better": "higher"},
+        }
+        ok = {
+            "a.queries": {"value": 9, "unit": "queries", "better": "lower"},
+            "a.ms": {"value": 12.0, "unit": "ms", "better": "lower"},
+            "b.per_sec": {"value": 800.0, "unit": "hands/s", "better": "higher"},
+        }
+        self.assertEqual(benchmarks.compare(ok, baseline, 0.25), [])
+
+        bad = {
+            "a.queries": {"value": 11, "unit": "queries", "better": "lower"},
+            "a.ms": {"value": 13.0, "unit": "ms", "better": "lower"},
+            "b.per_sec": {"value": 700.0, "unit": "hands/s", "better": "higher"},
+        }
+        self.assertEqual(len(benchmarks.compare(bad, baseline, 0.25)), 3)
+
+    def test_round_setup_benchmark_runs(self):
+        metrics = benchmarks.bench_round_setup(num_players=3, repeat=1)
+        self.assertGreater(metrics["start_new_round.queries"]["value"], 0)
+
+
+def permute_suits(cards, permutation):
+    return [(c & ~3) | permutation[c & 3] for c in cards]
+
+
+class IsomorphismTests(TestCase):
+    def test_key_ignores_suit_names(self):
+        rng = random.Random(3)
+        for _ in range(500):
+            cards = rng.sample(range(52), 7)
+            board, hand = cards[:5], cards[5:]
+            permutation = rng.sample(range(4), 4)
+            self.assertEqual(
+                isomorphism.canonical_key(board, hand),
+                isomorphism.canonical_key(permute_suits(board, permutation), permute_suits(hand, permutation)),
+            )
+
+    def test_representative_keeps_strength(self):
+        rng = random.Random(4)
+        for _ in range(500):
+            cards = rng.sample(range(52), 7)
+            (canonical,) = isomorphism.canonicalize(cards)
+            self.assertEqual(evaluator.evaluate(canonical), evaluator.evaluate(cards))
+            self.assertEqual(isomorphism.canonical_key(canonical), isomorphism.canonical_key(cards))
+
+    def test_lru_cache_counts_and_evicts(self):
+        cache = isomorphism.LRUCache(maxsize=2)
+        cache.get_or_compute("a", lambda: 1)
+        cache.get_or_compute("b", lambda: 2)
+        self.assertEqual(cache.get_or_compute("a", lambda: 99), 1)
+        cache.get_or_compute("c", lambda: 3)
+        self.assertEqual(cache.get_or_compute("b", lambda: 4), 4)
+        self.assertEqual(cache.info(), {"hits": 1, "misses": 4, "evictions": 2, "size": 2, "maxsize": 2})
+
+    def test_exact_equity_cache(self):
+        isomorphism.equity_cache.clear()
+        hands = [evaluator.encode_cards([("A", "S"), ("A", "C")]), evaluator.encode_cards([("K", "S"), ("K", "C")])]
+        flop = evaluator.encode_cards([("2", "S"), ("7", "S"), ("9", "H")])
+        first = equity.exact_equity(hands, flop)
+        swapped = [0, 2, 1, 3]  # clubs <-> hearts
+        second = equity.exact_equity([permute_suits(h, swapped) for h in hands], permute_suits(flop, swapped))
+        self.assertEqual(first, second)
+        self.assertEqual(isomorphism.equity_cache.info()["hits"], 1)
+
+
+class UnitOfWorkTests(TestCase):
+    def test_start_new_round_writes_once_per_model(self):
+        game = Game.objects.create()
+        for seat in range(6):
+            make_player(game, f"player{seat}", [], seat)
+        game.start_new_round()
+        fold_out(game)
+
+        with CaptureQueriesContext(connection) as ctx:
+            game.start_new_round()
+        # executemany is logged once, as "<n> times: UPDATE ..."
+        updates = [q["sql"] for q in ctx.captured_queries if "UPDATE" in q["sql"]]
+        self.assertEqual(len(updates), 3)  # one each for the deck, players and game, balances move at hand end
+        self.assertEqual(len(Deck.objects.get(game=game).cards), 40)
+
+    def test_street_deal_is_one_write(self):
+        game = Game.objects.create()
+        make_player(game, "alice", [], 0)
+        make_player(game, "bob", [], 1)
+        game.start_new_round()
+
+        with CaptureQueriesContext(connection) as ctx:
+            game.deal_street("flop")
+        self.assertEqual(len([q for q in ctx.captured_queries if q["sql"].startswith("UPDATE")]), 1)
+        self.assertEqual(len(Deck.objects.get(game=game).community_cards), 3)
+
+    def test_nothing_written_until_exit(self):
+        game = Game.objects.create()
+        player = make_player(game, "alice", [], 0)
+        with unit_of_work.HandUnitOfWork():
+            player.fold()
+            with unit_of_work.HandUnitOfWork():
+                player.sit_in()
+            self.assertFalse(Player.objects.get(pk=player.pk).is_folded)
+        player.refresh_from_db()
+        self.assertTrue(player.is_folded)
+
+    def test_error_discards_changes(self):
+        game = Game.objects.create()
+        player = make_player(game, "alice", [], 0)
+        with self.assertRaises(RuntimeError):
+            with unit_of_work.HandUnitOfWork():
+                player.fold()
+                raise RuntimeError
+        player.refresh_from_db()
+        self.assertFalse(player.is_folded)
+
+
+def cards(*names):
+    return evaluator.encode_cards([(name[0], name[1]) for name in names])
+
+
+def stacked_deck(hands, board):
+    """A deck order that deals hands (in seat order) and then the board."""
+    top = [c for hand in hands for c in hand] + board
+    return top + [c for c in range(52) if c not in top]
+
+
+class PlayerIdentityMapTests(TestCase):
+    def test_players_loaded_once_and_shared(self):
+        game = Game.objects.create()
+        make_player(game, "alice", [], 0)
+        make_player(game, "bob", [], 1)
+        game = Game.objects.get(pk=game.pk)
+
+        with CaptureQueriesContext(connection) as ctx:
+            first = game.players_list()
+            second = game.players_list()
+            names = [p.user.username for p in second]
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertEqual(names, ["alice", "bob"])
+        self.assertIs(first[0], second[0])
+
+    def test_action_queries_do_not_grow_with_players(self):
+        counts = []
+        for num_players in (3, 8):
+            game = Game.objects.create()
+            for seat in range(num_players):
+                make_player(game, f"p{num_players}-{seat}", [], seat)
+            state = game.start_new_round()
+            game = Game.objects.get(pk=game.pk)
+            player = Player.objects.get(pk=state.seats[state.to_act].player_id)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertTrue(game.apply_action(player, engine.FOLD)["success"])
+            counts.append(len(ctx.captured_queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_seat_changes_invalidate(self):
+        game = Game.objects.create()
+        make_player(game, "alice", [], 0)
+        self.assertEqual(len(game.players_list()), 1)
+        make_player(game, "bob", [], 1)
+        self.assertEqual(len(game.players_list()), 1)
+        game.invalidate_players()
+        self.assertEqual(len(game.players_list()), 2)
+
+        Player.objects.filter(user__username="alice").update(seat_position=5)
+        self.assertEqual([p.user.username for p in game.players_list()], ["alice", "bob"])  # still cached
+        game.refresh_from_db()
+        self.assertEqual([p.user.username for p in game.players_list()], ["bob", "alice"])
+
+        game.assign_seats()
+        self.assertEqual([p.seat_position for p in game.players_list()], [0, 1])
+
+
+class ChipLedgerTests(TestCase):
+    def test_new_users_get_an_opening_entry(self):
+        user = get_user_model().objects.create_user(username="alice")
+        self.assertEqual(user.chips, 1000)
+        self.assertEqual(user.money, 10.0)
+        self.assertEqual(list(user.chip_transactions.values_list("amount", "reason")), [(1000, ChipTransaction.OPENING)])
+
+    def test_post_is_one_insert_and_one_update(self):
+        User = get_user_model()
+        alice = User.objects.create_user(username="alice")
+        bob = User.objects.create_user(username="bob")
+        stale = User.objects.get(pk=alice.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            ChipTransaction.objects.post({alice.id: -250, bob.id: 250}, ChipTransaction.HAND)
+        writes = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith(("INSERT", "UPDATE"))]
+        self.assertEqual(len(writes), 2)
+
+        # a second change made from an older copy adds on top instead of overwriting
+        ChipTransaction.objects.post({stale.id: 100}, ChipTransaction.WIN)
+        self.assertEqual(User.objects.get(pk=alice.pk).chips, 850)
+        self.assertEqual(User.objects.get(pk=bob.pk).chips, 1250)
+        self.assertEqual(ChipTransaction.objects.discrepancies(), {})
+
+    def test_entries_are_append_only(self):
+        user = get_user_model().objects.create_user(username="alice")
+        entry = user.chip_transactions.get()
+        entry.amount = 5
+        with self.assertRaises(ValueError):
+            entry.save()
+
+    def test_update_money_goes_through_the_ledger(self):
+        game = Game.objects.create()
+        player = make_player(game, "alice", [], 0)
+        with unit_of_work.HandUnitOfWork():
+            player.update_money(-0.25)
+            self.assertEqual(player.user.chips, 975)
+            self.assertEqual(get_user_model().objects.get(pk=player.user_id).chips, 1000)
+        self.assertEqual(get_user_model().objects.get(pk=player.user_id).chips, 975)
+        self.assertEqual(ChipTransaction.objects.discrepancies(), {})
+
+    def test_balances_are_not_editable_outside_the_ledger(self):
+        from django.contrib import admin
+        from accounts.forms import CustomUserChangeForm, CustomUserCreationForm
+
+        self.assertNotIn("chips", CustomUserCreationForm.base_fields)
+        self.assertNotIn("chips", CustomUserChangeForm.base_fields)
+        self.assertIn("chips", admin.site._registry[get_user_model()].readonly_fields)
+
+    def test_admin_adjust_chips_posts_to_the_ledger(self):
+        alice = get_user_model().objects.create_user(username="alice")
+        staff = get_user_model().objects.create_superuser(username="staff", password="pw")
+        self.client.force_login(staff)
+        url = reverse("admin:accounts_customuser_changelist")
+        response = self.client.post(url, {
+            "action": "adjust_chips", "index": 0, "amount": "-2.50", "_selected_action": [alice.id, staff.id],
+        }, follow=True)
+        self.assertContains(response, "2 balances adjusted by -2.50")
+        alice.refresh_from_db()
+        self.assertEqual(alice.chips, 750)
+        self.assertEqual(ChipTransaction.objects.filter(reason=ChipTransaction.ADJUSTMENT).count(), 2)
+        self.assertEqual(ChipTransaction.objects.discrepancies(), {})
+
+        response = self.client.post(url, {"action": "adjust_chips", "index": 0, "_selected_action": [alice.id]}, follow=True)
+        self.assertContains(response, "Enter an amount of chips")
+
+
+class EngineTests(TestCase):
+    def test_blinds_and_first_to_act(self):
+        deck = list(range(52))
+        state = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000), (3, "c", 1000)], deck, 0, 10, 25)
+        self.assertEqual([s.street_bet for s in state.seats], [0, 10, 25])
+        self.assertEqual(state.to_act, 0)
+        self.assertEqual(state.pot, 35)
+
+        heads_up = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000)], deck, 0, 10, 25)
+        self.assertEqual([s.street_bet for s in heads_up.seats], [10, 25])
+        self.assertEqual(heads_up.to_act, 0)
+
+    def test_fold_awards_pot(self):
+        state = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000)], list(range(52)), 0, 10, 25)
+        self.assertTrue(state.act(1, engine.FOLD)["success"])
+        self.assertTrue(state.finished)
+        self.assertEqual(state.payouts, {2: 35})
+        self.assertEqual([s.stack for s in state.seats], [990, 1010])
+
+    def test_betting_rules(self):
+        state = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000)], list(range(52)), 0, 10, 25)
+        self.assertFalse(state.act(2, engine.CALL)["success"])  # not b's turn
+        self.assertFalse(state.act(1, engine.CHECK)["success"])
+        self.assertFalse(state.act(1, engine.BET, 40)["success"])  # less than double
+        self.assertTrue(state.act(1, engine.BET, 50)["success"])
+        self.assertTrue(state.act(2, engine.CALL)["success"])
+        self.assertEqual(state.street, engine.FLOP)
+        self.assertEqual(len(state.board), 3)
+        self.assertEqual(state.streets, [4])  # the flop came after blinds, bet and call
+        self.assertEqual(state.seats[state.to_act].player_id, 2)
+
+    def test_checked_down_hand_reaches_showdown(self):
+        deck = stacked_deck([cards("AS", "AC"), cards("KS", "KC")], cards("2D", "7H", "9C", "JD", "3S"))
+        state = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000)], deck, 0, 10, 25)
+        state.act(1, engine.CALL)
+        state.act(2, engine.CHECK)
+        for _ in range(3):
+            state.act(2, engine.CHECK)
+            state.act(1, engine.CHECK)
+        self.assertTrue(state.finished)
+        self.assertEqual(state.payouts, {1: 50})
+        self.assertEqual(sum(s.stack for s in state.seats), 2000)
+
+    def test_all_in_side_pot(self):
+        # c is short and has the best hand, b beats a for the side pot
+        deck = stacked_deck(
+            [cards("7S", "2C"), cards("KS", "KC"), cards("AS", "AC")],
+            cards("3D", "8H", "9C", "JD", "4S"),
+        )
+        state = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000), (3, "c", 300)], deck, 2, 10, 25)
+        self.assertEqual(state.seats[state.to_act].player_id, 3)
+        state.act(3, engine.ALL_IN)
+        state.act(1, engine.CALL)
+        state.act(2, engine.ALL_IN)
+        state.act(1, engine.CALL)
+        self.assertTrue(state.finished)
+        self.assertEqual(state.payouts, {3: 900, 2: 1400})
+        self.assertEqual(sum(s.stack for s in state.seats), 2300)
+
+    def test_split_pot_odd_chip(self):
+        deck = stacked_deck([cards("2S", "3C"), cards("2H", "3D")], cards("AD", "AH", "KC", "KD", "QS"))
+        state = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000)], deck, 0, 10, 25)
+        state.act(1, engine.BET, 51)
+        state.act(2, engine.CALL)
+        state.act(2, engine.BET, 25)
+        state.act(1, engine.CALL)
+        state.act(2, engine.CHECK)
+        state.act(1, engine.CHECK)
+        state.act(2, engine.CHECK)
+        state.act(1, engine.CHECK)
+        self.assertEqual(state.pot, 152)
+        self.assertEqual(sorted(state.payouts.values()), [76, 76])
+
+    def test_snapshot_round_trip(self):
+        deck = list(range(52))
+        state = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000)], deck, 0, 10, 25)
+        state.act(1, engine.CALL)
+        copy = engine.HandState.from_dict(state.to_dict(), deck)
+        self.assertEqual(copy.to_dict(), state.to_dict())
+        copy.act(2, engine.CHECK)
+        self.assertEqual(copy.street, engine.FLOP)
+
+
+class PotTests(TestCase):
+    def test_layers_with_folded_chips(self):
+        # a folded for 300, c all in for 100, b and d in for 500
+        side_pots = pots.build_pots({1: 300, 2: 500, 3: 100, 4: 500}, live=[2, 3, 4])
+        self.assertEqual(side_pots, [pots.Pot(400, (3, 2, 4)), pots.Pot(1000, (2, 4))])
+
+    def test_folded_chips_above_every_live_player_go_to_top_pot(self):
+        side_pots = pots.build_pots({1: 800, 2: 200, 3: 200}, live=[2, 3])
+        self.assertEqual(side_pots, [pots.Pot(1200, (2, 3))])
+
+    def test_settle_splits_and_odd_chips(self):
+        side_pots = [pots.Pot(301, (1, 2, 3)), pots.Pot(200, (2, 3))]
+        strengths = {1: 9, 2: 5, 3: 5}
+        # order from the dealer's left: 3, 1, 2, so 3 takes the odd chip of the split pot
+        self.assertEqual(pots.settle(side_pots, strengths, [3, 1, 2]), {1: 301, 3: 100, 2: 100})
+
+    def test_game_settle_pots(self):
+        game = Game.objects.create()
+        Deck.objects.create(game=game, community_cards=cards("3D", "8H", "9C", "JD", "4S"))
+        a = make_player(game, "a", cards("7S", "2C"), 0, chips=0)
+        b = make_player(game, "b", cards("KS", "KC"), 1, chips=0)
+        c = make_player(game, "c", cards("AS", "AC"), 2, chips=0)
+        for p, beginning in ((a, 10.0), (b, 10.0), (c, 3.0)):
+            p.beginning_money = beginning
+            p.is_all_in = True
+            p.is_folded = True  # all_in() marks players folded too
+            p.save()
+        game.pot = 23.0
+        game.save()
+
+        self.assertEqual(game.settle_pots(), {c.id: 9.0, b.id: 14.0})
+        game.refresh_from_db()
+        self.assertEqual(game.pot, 0.0)
+        self.assertEqual(set(game.winner.all()), {b, c})
+        b.user.refresh_from_db()
+        self.assertEqual(b.user.chips, 1400)
+
+
+class SelfPlayTests(TestCase):
+    def test_simulation_conserves_chips(self):
+        report = selfplay.simulate(2, 200, players=4, seed=3, workers=0)
+        self.assertEqual(report["hands"], 400)
+        self.assertEqual(report["violations"], 0, report["examples"])
+        self.assertEqual(report["rejected"], 0)
+        self.assertEqual(set(report["timings"]), set(selfplay.PHASES))
+
+    def test_check_hand_flags_lost_chips(self):
+        state = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000)], list(range(52)), 0, 10, 25)
+        state.act(1, engine.FOLD)
+        self.assertEqual(selfplay.check_hand(state, 2000), [])
+        state.seats[1].stack -= 1
+        state.payouts[1] = 1
+        self.assertEqual(len(selfplay.check_hand(state, 2000)), 3)
+
+    def test_rejects_unknown_bot(self):
+        with self.assertRaises(ValueError):
+            selfplay.simulate(1, 1, bots=["nobody"], workers=0)
+
+
+class GameHandTests(TestCase):
+    def test_round_is_checkpointed_to_models(self):
+        game = Game.objects.create()
+        alice = make_player(game, "alice", [], 0)
+        bob = make_player(game, "bob", [], 1)
+        game.start_new_round()
+
+        game = Game.objects.get(pk=game.pk)
+        self.assertAlmostEqual(game.pot, 0.35)
+        state = game.load_hand()
+        first = Player.objects.get(pk=state.seats[state.to_act].player_id)
+        self.assertEqual(state.seat_of(first.id).stack, 990)  # heads up the dealer posts the small blind
+        self.assertEqual(first.user.chips, 1000)  # balances only move when the hand is settled
+
+        self.assertFalse(game.apply_action(first, engine.CHECK)["success"])
+        self.assertTrue(game.apply_action(first, engine.FOLD)["success"])
+        game = Game.objects.get(pk=game.pk)
+        self.assertTrue(game.winner_determined)
+        other = bob if first.id == alice.id else alice
+        self.assertEqual(list(game.winner.all()), [other])
+        other.user.refresh_from_db()
+        first.user.refresh_from_db()
+        self.assertEqual((other.user.chips, first.user.chips), (1010, 990))
+        self.assertEqual(ChipTransaction.objects.discrepancies(), {})
+
+    @override_settings(GAMEPLAY_DB_THREADS=0)
+    def test_no_new_hand_until_the_current_one_is_over(self):
+        game = Game.objects.create()
+        alice = make_player(game, "alice", [], 0)
+        make_player(game, "bob", [], 1)
+        state = game.start_new_round()
+        first = Player.objects.get(pk=state.seats[state.to_act].player_id)
+        self.assertTrue(game.apply_action(first, engine.ALL_IN)["success"])
+
+        with self.assertRaises(HandInProgressError):
+            game.start_new_round()
+        self.client.force_login(alice.user)
+        response = self.client.post(reverse("gameplay:start_round_ajax", args=[game.id]))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Game.objects.get(pk=game.pk).load_hand().log, state.log + [(first.id, engine.ALL_IN, 990)])
+        self.assertFalse(ChipTransaction.objects.filter(reason=ChipTransaction.HAND).exists())
+
+        fold_out(game)
+        self.assertEqual(self.client.post(reverse("gameplay:start_round_ajax", args=[game.id])).status_code, 200)
+
+    @override_settings(GAMEPLAY_DB_THREADS=0)
+    def test_action_view(self):
+        game = Game.objects.create()
+        make_player(game, "alice", [], 0)
+        make_player(game, "bob", [], 1)
+        state = game.start_new_round()
+        first = Player.objects.get(pk=state.seats[state.to_act].player_id)
+        self.client.force_login(first.user)
+
+        url = reverse("gameplay:action", args=[game.id])
+        self.assertEqual(self.client.post(url, {"action": "bet", "amount": "0.30"}).status_code, 400)
+        response = self.client.post(url, {"action": "bet", "amount": "0.50"})
+        self.assertEqual(response.json(), {"success": True, "message": f"{first.user.username} bets 0.50", "version": 2})
+
+
+class GameVersionTests(TestCase):
+    def setUp(self):
+        self.game = Game.objects.create()
+        self.alice = make_player(self.game, "alice", [], 0)
+        self.bob = make_player(self.game, "bob", [], 1)
+        state = self.game.start_new_round()
+        self.first = Player.objects.get(pk=state.seats[state.to_act].player_id)
+
+    def test_stale_instance_cannot_overwrite(self):
+        one = Game.objects.get(pk=self.game.pk)
+        two = Game.objects.get(pk=self.game.pk)
+        one.pot = 1.0
+        one.save()
+        self.assertEqual(one.version, 2)
+        two.pot = 2.0
+        with self.assertRaises(StaleGameError), transaction.atomic():
+            two.save()
+        self.assertEqual(Game.objects.get(pk=self.game.pk).pot, 1.0)
+
+    def test_losing_request_reruns_on_fresh_state(self):
+        one = Game.objects.get(pk=self.game.pk)
+        two = Game.objects.get(pk=self.game.pk)
+        self.assertTrue(one.apply_action(self.first, engine.CALL)["success"])
+
+        # the same call again was decided on a state that is gone: on the
+        # fresh state it is no longer this player's turn, so it is rejected
+        result = two.apply_action(self.first, engine.CALL)
+        self.assertFalse(result["success"])
+        self.assertEqual(result["version"], 2)
+
+        # an action that is still valid after reloading goes through
+        three = Game.objects.get(pk=self.game.pk)
+        one.refresh_from_db()
+        one.save(update_fields=["pot"])
+        other = self.bob if self.first.id == self.alice.id else self.alice
+        result = three.apply_action(other, engine.CHECK)
+        self.assertTrue(result["success"], result)
+        self.assertEqual(result["version"], 4)
+
+    @override_settings(GAMEPLAY_DB_THREADS=0)
+    def test_client_version_must_match(self):
+        self.client.force_login(self.first.user)
+        url = reverse("gameplay:action", args=[self.game.id])
+        response = self.client.post(url, {"action": "call", "version": "0"})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["version"], 1)
+        response = self.client.post(url, {"action": "call", "version": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["version"], 2)
+
+
+class TableActorTests(TestCase):
+    def setUp(self):
+        self.game = Game.objects.create()
+        make_player(self.game, "alice", [], 0)
+        make_player(self.game, "bob", [], 1)
+        self.runtime = actors.TableRuntime(workers=0, snapshot_every=3, snapshot_interval=60)
+
+    def to_act(self, game_id):
+        state = self.runtime.worker_for(game_id).tables[game_id].state
+        return state.seats[state.to_act].player_id
+
+    def test_actions_stay_in_memory_until_snapshot(self):
+        self.assertEqual(self.runtime.start_round(self.game.id)["version"], 1)
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertTrue(self.runtime.act(self.game.id, self.to_act(self.game.id), engine.CALL, 0)["success"])
+            self.assertTrue(self.runtime.act(self.game.id, self.to_act(self.game.id), engine.CHECK, 0)["success"])
+        self.assertEqual(len(ctx.captured_queries), 0)
+        self.assertEqual(Game.objects.get(pk=self.game.pk).version, 1)
+
+        # the third action reaches snapshot_every
+        result = self.runtime.act(self.game.id, self.to_act(self.game.id), engine.CHECK, 0)
+        self.assertEqual(result["version"], 2)
+        game = Game.objects.get(pk=self.game.pk)
+        self.assertEqual(len(game.deck.community_cards), 3)
+        self.assertEqual(game.load_hand().to_dict(), self.runtime.worker_for(game.id).tables[game.id].state.to_dict())
+
+    def test_hand_end_settles_and_shutdown_snapshots(self):
+        self.runtime.start_round(self.game.id)
+        self.runtime.act(self.game.id, self.to_act(self.game.id), engine.FOLD, 0)
+        self.assertTrue(Game.objects.get(pk=self.game.pk).winner_determined)
+        self.assertEqual(ChipTransaction.objects.discrepancies(), {})
+
+        self.runtime.start_round(self.game.id)
+        self.runtime.act(self.game.id, self.to_act(self.game.id), engine.CALL, 0)
+        self.runtime.act(self.game.id, self.to_act(self.game.id), engine.CHECK, 0)
+        self.runtime.shutdown()
+        self.assertEqual(Game.objects.get(pk=self.game.pk).load_hand().street, engine.FLOP)
+
+    def test_outside_write_fails_later_actions_until_reload(self):
+        self.runtime.start_round(self.game.id)
+        self.runtime.act(self.game.id, self.to_act(self.game.id), engine.CALL, 0)
+        self.runtime.act(self.game.id, self.to_act(self.game.id), engine.CHECK, 0)
+        Game.objects.get(pk=self.game.pk).save(update_fields=["pot"])
+
+        # the third action reaches snapshot_every and finds the outside write
+        with self.assertLogs("gameplay.actors", "ERROR"):
+            result = self.runtime.act(self.game.id, self.to_act(self.game.id), engine.CHECK, 0)
+        self.assertEqual((result["success"], result["stale"]), (False, True))
+        self.assertTrue(self.runtime.act(self.game.id, self.to_act(self.game.id), engine.CHECK, 0)["stale"])
+        self.runtime.shutdown()  # no retry of the stale table
+        self.assertEqual(Game.objects.get(pk=self.game.pk).load_hand().street, engine.PREFLOP)
+
+        # starting again reloads the hand saved in the database, which is not over yet
+        with self.assertRaises(HandInProgressError):
+            self.runtime.start_round(self.game.id)
+        self.assertTrue(self.runtime.act(self.game.id, self.to_act(self.game.id), engine.CALL, 0)["success"])
+
+    def test_failed_checkpoint_is_logged_and_retried(self):
+        self.runtime = runtime = actors.TableRuntime(workers=0, snapshot_every=20, snapshot_interval=0)
+        runtime.start_round(self.game.id)
+        with unittest.mock.patch.object(Game, "checkpoint", side_effect=DatabaseError("gone")):
+            with self.assertLogs("gameplay.actors", "ERROR"):
+                self.assertTrue(runtime.act(self.game.id, self.to_act(self.game.id), engine.CALL, 0)["success"])
+        self.assertEqual(runtime.worker_for(self.game.id).tables[self.game.id].pending, 1)
+        runtime.act(self.game.id, self.to_act(self.game.id), engine.CHECK, 0)
+        self.assertEqual(Game.objects.get(pk=self.game.pk).load_hand().street, engine.FLOP)
+
+
+class ThreadedTableActorTests(TransactionTestCase):
+    @override_settings(TABLE_ACTORS=True, HAND_HISTORY_DIR=None)
+    def test_views_go_through_the_table_owner(self):
+        game = Game.objects.create()
+        alice = make_player(game, "alice", [], 0)
+        bob = make_player(game, "bob", [], 1)
+        runtime = actors.TableRuntime(workers=2, snapshot_every=1, snapshot_interval=60)
+        self.addCleanup(runtime.shutdown)
+        with unittest.mock.patch.object(actors, "get_runtime", return_value=runtime):
+            self.client.force_login(alice.user)
+            response = self.client.post(reverse("gameplay:start_round_ajax", args=[game.id]))
+            self.assertEqual(set(response.json()["hands"]), {str(alice.id)})
+
+            state = runtime.worker_for(game.id).tables[game.id].state
+            first = alice if state.seats[state.to_act].player_id == alice.id else bob
+            self.client.force_login(first.user)
+            response = self.client.post(reverse("gameplay:action", args=[game.id]), {"action": "fold"})
+            self.assertEqual(response.status_code, 200, response.json())
+        self.assertTrue(Game.objects.get(pk=game.pk).winner_determined)
+
+
+class PushEventTests(TestCase):
+    def new_state(self):
+        deck = stacked_deck([cards("AS", "AC"), cards("KS", "KC")], cards("2D", "7H", "9C", "JD", "3S"))
+        return engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000)], deck, 0, 10, 25)
+
+    def test_events_between_snapshots(self):
+        state = self.new_state()
+        first = state.to_dict()
+        events = push.hand_events(None, first, version=1)
+        self.assertEqual([e["type"] for e in events], ["deal", "action", "action"])
+        self.assertEqual(events[0]["hands"], {1: cards("AS", "AC"), 2: cards("KS", "KC")})
+        self.assertEqual({(e["version"], e["pot"], e["to_act"]) for e in events}, {(1, 35, 1)})
+
+        state.act(1, engine.CALL)
+        state.act(2, engine.CHECK)
+        events = push.hand_events(first, state.to_dict(), version=2)
+        self.assertEqual([e["type"] for e in events], ["action", "action", "board"])
+        self.assertEqual(events[-1]["cards"], cards("2D", "7H", "9C"))
+
+        before = state.to_dict()
+        state.act(2, engine.BET, 50)
+        state.act(1, engine.FOLD)
+        events = push.hand_events(before, state.to_dict(), version=3)
+        self.assertEqual([e["type"] for e in events], ["action", "action", "showdown"])
+        self.assertEqual(events[-1]["payouts"], {2: 100})
+        self.assertEqual(events[-1]["hands"], {})  # nobody shows an uncontested hand
+
+    def test_stored_snapshot_is_the_same_hand(self):
+        # the previous snapshot comes back from the JSON field with lists for tuples
+        state = self.new_state()
+        stored = json.loads(json.dumps(state.to_dict()))
+        state.act(1, engine.CALL)
+        self.assertEqual([e["type"] for e in push.hand_events(stored, state.to_dict(), 2)], ["action"])
+
+    def test_players_only_see_their_own_cards(self):
+        deal = push.hand_events(None, self.new_state().to_dict(), version=1)[0]
+        self.assertEqual(push.for_player(deal, 2)["hands"], {2: cards("KS", "KC")})
+        self.assertEqual(push.for_player(deal, None)["hands"], {})
+
+    @unittest.skipIf(push.get_channel_layer is None, "channels is not installed")
+    def test_consumer_forwards_events(self):
+        from asgiref.sync import async_to_sync
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+
+        from .routing import websocket_urlpatterns
+
+        game = Game.objects.create()
+        alice = make_player(game, "alice", [], 0)
+        make_player(game, "bob", [], 1)
+
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/games/{game.id}/")
+            communicator.scope["user"] = alice.user
+            connected, _ = await communicator.connect()
+            self.assertTrue(connected)
+            state = self.new_state()
+            await push.get_channel_layer().group_send(
+                push.group_name(game.id),
+                {"type": "table.events", "events": push.hand_events(None, state.to_dict(), 1)},
+            )
+            message = await communicator.receive_json_from()
+            await communicator.disconnect()
+            return message
+
+        message = async_to_sync(scenario)()
+        self.assertEqual(message["events"][0]["type"], "deal")
+        self.assertEqual(message["events"][0]["hands"], {})  # alice is not seat 1 or 2 of this state
+
+    @unittest.skipIf(push.get_channel_layer is None, "channels is not installed")
+    def test_consumer_rejects_anonymous_users_with_a_code(self):
+        from asgiref.sync import async_to_sync
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from django.contrib.auth.models import AnonymousUser
+
+        from .consumers import REJECTED
+        from .routing import websocket_urlpatterns
+
+        async def scenario():
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/games/1/")
+            communicator.scope["user"] = AnonymousUser()
+            await communicator.connect()
+            return await communicator.receive_output()
+
+        self.assertEqual(async_to_sync(scenario)(), {"type": "websocket.close", "code": REJECTED})
+
+    def test_table_page_has_board_and_pot(self):
+        game = Game.objects.create()
+        alice = make_player(game, "alice", [], 0)
+        self.client.force_login(alice.user)
+        response = self.client.get(reverse("gameplay:gameplay", args=[game.id]))
+        for i in range(1, 6):
+            self.assertContains(response, f'id="board-card{i}"')
+        self.assertContains(response, '<span id="pot">0.00</span>', html=True)
+
+    def test_asgi_application_loads(self):
+        from django_project import asgi
+
+        self.assertTrue(callable(asgi.application))
+
+
+class PushCommitTests(TransactionTestCase):
+    """Outside a request transaction on_commit runs at once: the pushes must still wait for the flush."""
+
+    @override_settings(HAND_HISTORY_DIR=None)
+    def test_pushed_version_is_the_saved_one(self):
+        game = Game.objects.create()
+        alice = make_player(game, "alice", [], 0)
+        bob = make_player(game, "bob", [], 1)
+        pushed, recorded = [], []
+
+        def send_hand(game_id, previous, current, version):
+            saved = Game.objects.get(pk=game_id)
+            pushed.append((version, saved.version, json.loads(json.dumps(current)) == saved.hand_state))
+
+        def record(game_id, snapshot):
+            recorded.append(Game.objects.get(pk=game_id).hand_state == json.loads(json.dumps(snapshot)))
+
+        with unittest.mock.patch.object(push, "send_hand", send_hand), \
+                unittest.mock.patch.object(history, "record", record):
+            state = game.start_new_round()
+            first = alice if state.seats[state.to_act].player_id == alice.id else bob
+            game.apply_action(first, engine.FOLD)
+        self.assertEqual(pushed, [(1, 1, True), (2, 2, True)])
+        self.assertEqual(recorded, [True])
+
+
+class StateViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.game = Game.objects.create()
+        self.alice = make_player(self.game, "alice", [], 0)
+        self.bob = make_player(self.game, "bob", [], 1)
+        state = self.game.start_new_round()
+        self.first = Player.objects.get(pk=state.seats[state.to_act].player_id)
+        self.client.force_login(self.alice.user)
+        self.url = reverse("gameplay:state", args=[self.game.id])
+
+    def test_full_state_hides_other_hands(self):
+        body = self.client.get(self.url).json()
+        self.assertTrue(body["full"])
+        self.assertEqual(body["version"], 1)
+        changes = body["changes"]
+        self.assertEqual(changes["hand"], Player.objects.get(pk=self.alice.pk).hand)
+        self.assertEqual(changes["pot"], 35)
+        self.assertNotIn(str(Player.objects.get(pk=self.bob.pk).hand), json.dumps(changes["seats"]))
+
+    def test_unchanged_version_is_not_modified(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(3):  # session, user, version
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.game.apply_action(self.first, engine.CALL)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_delta_since_a_version(self):
+        self.client.get(self.url)
+        self.game.apply_action(self.first, engine.CALL)
+        body = self.client.get(self.url, {"since": 1}).json()
+        self.assertFalse(body["full"])
+        self.assertEqual(body["version"], 2)
+        self.assertEqual(set(body["changes"]), {"pot", "to_act", "seats"})
+        self.assertEqual(body["changes"]["pot"], 50)
+
+    def test_unknown_version_gets_everything(self):
+        body = self.client.get(self.url, {"since": 99}).json()
+        self.assertTrue(body["full"])
+        self.assertIn("seats", body["changes"])
+
+    def test_public_state_is_built_once_per_version(self):
+        self.client.get(self.url)
+        self.client.force_login(self.bob.user)
+        with unittest.mock.patch.object(state, "build") as build:
+            body = self.client.get(self.url).json()
+        build.assert_not_called()
+        self.assertEqual(body["changes"]["hand"], Player.objects.get(pk=self.bob.pk).hand)
+
+
+@override_settings(LOBBY_PAGE_SIZE=2)
+class LobbyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.games = [Game.objects.create() for _ in range(3)]
+        for i, name in enumerate(["alice", "bob", "carol"]):
+            make_player(self.games[0], name, [], i)
+        self.high = Game.objects.create(small_blind=1.0, big_blind=2.0)
+        Game.objects.create(game_active=False)
+
+    def test_pages_newest_first_with_seat_counts(self):
+        with self.assertNumQueries(1):
+            first = lobby.page()
+        self.assertEqual([g["id"] for g in first["games"]], [self.high.id, self.games[2].id])
+        second = lobby.page(after=first["next"])
+        self.assertEqual([g["id"] for g in second["games"]], [self.games[1].id, self.games[0].id])
+        self.assertIsNone(second["next"])
+        self.assertEqual(second["games"][1]["seats"], 3)
+        self.assertEqual(second["games"][1]["stakes"], 30.0)
+
+    def test_filter_by_blind_level(self):
+        self.assertEqual([g["id"] for g in lobby.page(big_blind=2.0)["games"]], [self.high.id])
+        self.assertEqual(lobby.blind_levels(), [0.25, 2.0])
+
+    def test_pages_are_cached_until_seats_change(self):
+        lobby.page()
+        with self.assertNumQueries(0):
+            lobby.page()
+        user = get_user_model().objects.create_user(username="dave", password="pw")
+        self.client.force_login(user)
+        self.client.post(reverse("gameplay:join_game", args=[self.high.id]))
+        self.assertEqual(lobby.page()["games"][0]["seats"], 1)
+
+    def test_admin_seat_action_refreshes_pages(self):
+        lobby.page()
+        staff = get_user_model().objects.create_superuser(username="staff", password="pw")
+        self.client.force_login(staff)
+        self.client.post(reverse("admin:accounts_customuser_changelist"), {
+            "action": "seat_users", "index": 0, "game": self.high.id, "_selected_action": [staff.id],
+        })
+        self.assertEqual(lobby.page()["games"][0]["seats"], 1)
+
+    def test_lobby_view(self):
+        self.client.force_login(get_user_model().objects.get(username="alice"))
+        response = self.client.get(reverse("gameplay:lobby"), {"big_blind": "0.25"})
+        self.assertEqual([g["id"] for g in response.context["games"]], [self.games[2].id, self.games[1].id])
+        self.assertContains(response, f"?after={self.games[1].id}&big_blind=0.25")
+
+
+class AsyncViewTests(TransactionTestCase):
+    @override_settings(GAMEPLAY_DB_THREADS=2)
+    def test_dealing_runs_on_the_database_pool(self):
+        game = Game.objects.create()
+        alice = make_player(game, "alice", [], 0)
+        make_player(game, "bob", [], 1)
+        threads = []
+        deal = views.StartRoundAjaxView.deal
+
+        def record(game):
+            threads.append(threading.current_thread().name)
+            return deal(game)
+
+        async def scenario():
+            client = AsyncClient()
+            await client.aforce_login(alice.user)
+            return await client.post(reverse("gameplay:start_round_ajax", args=[game.id]))
+
+        with unittest.mock.patch.object(views.StartRoundAjaxView, "deal", staticmethod(record)):
+            response = async_to_sync(scenario)()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.json()["hands"]), [str(alice.id)])
+        self.assertTrue(threads[0].startswith("gameplay-db"), threads)
+        self.assertEqual(Game.objects.get(pk=game.pk).version, 1)
+
+    def test_concurrent_joins(self):
+        game = Game.objects.create()
+        users = [get_user_model().objects.create_user(username=f"user{i}", password="pw") for i in range(5)]
+
+        async def join(user):
+            client = AsyncClient()
+            await client.aforce_login(user)
+            return await client.post(reverse("gameplay:join_game", args=[game.id]))
+
+        async def scenario():
+            return await asyncio.gather(*(join(user) for user in users))
+
+        responses = async_to_sync(scenario)()
+        self.assertEqual({r.status_code for r in responses}, {302})
+        self.assertEqual(game.players.count(), 5)
+
+
+class HandHistoryTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+
+    def finished_hand(self, dealer=0):
+        deck = stacked_deck([cards("AS", "AC"), cards("KS", "KC"), cards("2S", "7C")], cards("2D", "7H", "9C", "JD", "3S"))
+        state = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000), (3, "c", 500)], deck, dealer, 10, 25)
+        while not state.finished:
+            seat = state.seats[state.to_act]
+            if seat.player_id == 3:
+                state.act(seat.player_id, engine.ALL_IN)
+            else:
+                state.act(seat.player_id, *selfplay.calling_station(state, seat, None))
+        return state.to_dict()
+
+    def test_record_round_trip(self):
+        snapshot = self.finished_hand()
+        hand = history.decode(history.encode(7, 3, 1.5, snapshot))
+        self.assertEqual((hand.hand_id, hand.game_id, hand.played_at, hand.pot), (7, 3, 1.5, 1500))
+        self.assertEqual((hand.small_blind, hand.big_blind, hand.dealer), (10, 25, 0))
+        self.assertEqual(hand.board, tuple(snapshot["board"]))
+        self.assertEqual([list(a) for a in hand.actions], [list(a) for a in snapshot["log"]])
+        self.assertEqual(hand.actions[0][1], "small_blind")
+        self.assertEqual(list(hand.streets), snapshot["streets"])
+        a, b, c = hand.seats
+        self.assertEqual((a.stack, a.bet, a.payout, list(a.hand)), (1000, 500, 0, cards("AS", "AC")))
+        self.assertEqual((c.stack, c.payout, c.all_in, c.folded), (500, 1500, True, False))  # two pair beats aces
+        self.assertEqual(sum(s.payout for s in hand.seats), hand.pot)
+
+    def test_random_access_across_segments(self):
+        store = history.HandHistory(self.dir.name, segment_bytes=200)
+        snapshot = self.finished_hand()
+        ids = []
+        for game_id in range(1, 6):
+            ids += store.append([(game_id, 0.0, snapshot), (game_id, 1.0, snapshot)])
+        self.assertEqual(ids, list(range(1, 11)))
+        self.assertGreater(len(list(Path(self.dir.name).glob("*.hands"))), 1)
+
+        reopened = history.HandHistory(self.dir.name, segment_bytes=200)
+        self.assertEqual(reopened.next_hand_id, 11)
+        self.assertEqual(reopened.get(6).game_id, 3)
+        self.assertIsNone(reopened.get(11))
+        self.assertEqual([h.hand_id for h in reopened.scan(4)], list(range(4, 11)))
+
+    def test_recorder_batches_in_the_background(self):
+        store = history.HandHistory(self.dir.name)
+        recorder = history.Recorder(store, flush_every=3, flush_interval=60)
+        self.addCleanup(recorder.stop)
+        snapshot = self.finished_hand()
+        for game_id in range(4):
+            recorder.submit(game_id, snapshot)
+        recorder.flush(timeout=5)
+        index = np.fromfile(next(Path(self.dir.name).glob("*.idx")), dtype=history.INDEX)
+        self.assertEqual(len(set(index["block"])), 2)  # one full batch, then the flush
+        self.assertEqual([h.game_id for h in store.scan()], [0, 1, 2, 3])
+
+    def test_writers_sharing_a_directory(self):
+        # two processes, as far as the files are concerned: neither sees the other's appends in memory
+        one = history.HandHistory(self.dir.name, segment_bytes=200)
+        two = history.HandHistory(self.dir.name, segment_bytes=200)
+        snapshot = self.finished_hand()
+        ids = []
+        for game_id in range(1, 5):
+            ids += (one if game_id % 2 else two).append([(game_id, 0.0, snapshot)] * 2)
+        self.assertEqual(ids, list(range(1, 9)))
+        self.assertEqual([h.game_id for h in history.HandHistory(self.dir.name).scan()], [1, 1, 2, 2, 3, 3, 4, 4])
+
+    def test_recorder_survives_a_failed_write(self):
+        store = history.HandHistory(self.dir.name)
+        recorder = history.Recorder(store, flush_every=100, flush_interval=60)
+        self.addCleanup(recorder.stop)
+        snapshot = self.finished_hand()
+        with unittest.mock.patch.object(store, "append", side_effect=ValueError("bad hand")):
+            recorder.submit(1, snapshot)
+            with self.assertRaises(ValueError), self.assertLogs("gameplay.history", "ERROR"):
+                recorder.flush(timeout=5)
+        recorder.submit(2, snapshot)
+        recorder.flush(timeout=5)
+        self.assertEqual([h.game_id for h in store.scan()], [2])
+
+    def test_finished_hands_are_recorded_after_commit(self):
+        game = Game.objects.create()
+        alice = make_player(game, "alice", [], 0)
+        bob = make_player(game, "bob", [], 1)
+        with override_settings(HAND_HISTORY_DIR=self.dir.name):
+            with self.captureOnCommitCallbacks(execute=True):
+                state = game.start_new_round()
+            first = alice if state.seats[state.to_act].player_id == alice.id else bob
+            with self.captureOnCommitCallbacks(execute=True):
+                with self.assertNumQueries(0):
+                    history.record(game.id, game.hand_state)  # the recording itself never touches the database
+                game.apply_action(first, engine.FOLD)
+            recorder = history.get_recorder(self.dir.name)
+            recorder.flush(timeout=5)
+        self.addCleanup(recorder.stop)
+        hands = list(history.HandHistory(self.dir.name).scan())
+        self.assertEqual(len(hands), 2)
+        self.assertEqual(hands[1].actions[-1], (first.id, engine.FOLD, 0))
+        self.assertEqual(hands[1].pot, 35)
+
+
+class PlayerStatsTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.history = history.HandHistory(Path(self.dir.name) / "hands")
+
+    def play(self, script):
+        """A hand at a three handed table where everyone checks or calls unless script says otherwise."""
+        deck = stacked_deck([cards("AS", "AC"), cards("KS", "KC"), cards("2S", "7C")], cards("2D", "8H", "9C", "JD", "3S"))
+        state = engine.HandState.new_hand([(1, "a", 1000), (2, "b", 1000), (3, "c", 1000)], deck, 0, 10, 25)
+        script = list(script)
+        while not state.finished:
+            seat = state.seats[state.to_act]
+            if script and script[0][0] == seat.player_id:
+                self.assertTrue(state.act(*script.pop(0))["success"])
+            else:
+                state.act(seat.player_id, *selfplay.calling_station(state, seat, None))
+        return state.to_dict()
+
+    def test_command_with_history_off(self):
+        with override_settings(HAND_HISTORY_DIR=None), self.assertRaises(CommandError):
+            call_command("player_stats", output=self.dir.name, stdout=io.StringIO())
+
+    def test_hand_rows(self):
+        # a raises, b calls, c folds; on the flop b bets and a calls, then it checks down
+        snapshot = self.play([(1, engine.BET, 100), (3, engine.FOLD), (2, engine.BET, 50)])
+        rows = {r[1]: r for r in stats.hand_rows(history.decode(history.encode(1, 1, 0.0, snapshot)))}
+        a, b, c = rows[1], rows[2], rows[3]
+        self.assertEqual(a[2], stats.VPIP | stats.PFR | stats.SAW_FLOP | stats.SHOWDOWN | stats.WON_SHOWDOWN)
+        self.assertEqual(b[2], stats.VPIP | stats.SAW_FLOP | stats.SHOWDOWN)
+        self.assertEqual(c[2], 0)
+        self.assertEqual((a[3], a[4]), (0, 1))
+        self.assertEqual((b[3], b[4]), (1, 0))
+        self.assertEqual((a[5], b[5], c[5]), (175, -150, -25))
+
+    def test_summary_over_incremental_updates(self):
+        self.history.append([(1, 0.0, self.play([(1, engine.BET, 100), (3, engine.FOLD)]))])
+        columns = stats.StatsColumns(Path(self.dir.name) / "stats")
+        self.assertEqual(columns.update(self.history), 1)
+        self.history.append([(1, 0.0, self.play([])), (1, 0.0, self.play([(1, engine.FOLD)]))])
+        self.assertEqual(columns.update(self.history), 2)
+        self.assertEqual(columns.update(self.history), 0)
+
+        reopened = stats.StatsColumns(Path(self.dir.name) / "stats")
+        self.assertEqual(reopened.rows, 9)
+        self.assertIsInstance(reopened.column("net"), np.memmap)
+        summary = reopened.summary()
+        self.assertEqual(set(summary), {1, 2, 3})
+        a = summary[1]
+        self.assertEqual(a["hands"], 3)
+        self.assertAlmostEqual(a["vpip"], 2 / 3)
+        self.assertAlmostEqual(a["pfr"], 1 / 3)
+        self.assertEqual(sum(row["net"] for row in summary.values()), 0)
+        self.assertEqual(reopened.summary([2]), {2: summary[2]})
+        self.assertEqual(reopened.summary([99]), {})
+
+    def test_command(self):
+        make_player(Game.objects.create(), "alice", [], 0)
+        alice = Player.objects.get(user__username="alice")
+        snapshot = self.play([])
+        for seat in snapshot["seats"]:
+            seat[0] = alice.id if seat[0] == 1 else seat[0] + 1000
+        snapshot["payouts"] = [[alice.id if pid == 1 else pid + 1000, chips] for pid, chips in snapshot["payouts"]]
+        snapshot["log"] = [[alice.id if pid == 1 else pid + 1000, action, chips] for pid, action, chips in snapshot["log"]]
+        self.history.append([(1, 0.0, snapshot)])
+        out = io.StringIO()
+        call_command(
+            "player_stats", "alice", history=str(Path(self.dir.name) / "hands"),
+            output=str(Path(self.dir.name) / "stats"), stdout=out,
+        )
+        self.assertIn("Added 1 hands", out.getvalue())
+        self.assertRegex(out.getvalue(), r"alice\s+1\s+100.0%")
+        with self.assertRaises(CommandError):
+            call_command("player_stats", "nobody", output=str(Path(self.dir.name) / "stats"), no_update=True, stdout=out)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.game = Game.objects.create()
+        self.alice = make_player(self.game, "alice", [], 0)
+        self.bob = make_player(self.game, "bob", [], 1)
+        ChipTransaction.objects.post({self.alice.user_id: -25, self.bob.user_id: 25}, ChipTransaction.HAND, game=self.game)
+        self.staff = get_user_model().objects.create_user(username="auditor", password="pw", is_staff=True)
+
+        deck = stacked_deck([cards("AS", "AC"), cards("KS", "KC")], cards("2D", "8H", "9C", "JD", "3S"))
+        state = engine.HandState.new_hand([(self.alice.id, "alice", 1000), (self.bob.id, "bob", 1000)], deck, 0, 10, 25)
+        state.act(self.alice.id, engine.FOLD)
+        store = history.HandHistory(self.dir.name)
+        store.append([(self.game.id, 1_000_000.0, state.to_dict()), (self.game.id + 1, 2_000_000.0, state.to_dict())])
+
+    def test_staff_only(self):
+        url = reverse("gameplay:export")
+        self.client.force_login(self.alice.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_ledger_jsonl_for_a_user(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("gameplay:export"), {"kind": "ledger", "user": "bob"})
+        self.assertTrue(response.streaming)
+        rows = [json.loads(line) for line in b"".join(response.streaming_content).decode().splitlines()]
+        self.assertEqual([(r["username"], r["amount"], r["reason"]) for r in rows], [("bob", 1000, "opening"), ("bob", 25, "hand")])
+
+    def test_until_keeps_hands_appended_out_of_order(self):
+        store = history.HandHistory(self.dir.name)
+        hand = next(store.scan())
+        # another process's block of an earlier hand, written after the later ones
+        state = engine.HandState.new_hand([(self.alice.id, "alice", 1000), (self.bob.id, "bob", 1000)], list(range(52)), 0, 10, 25)
+        state.act(self.alice.id, engine.FOLD)
+        store.append([(self.game.id, 500_000.0, state.to_dict())])
+        found = export.hands(store, until=export.parse_moment("1970-01-18T08:40:00+00:00"))  # unix time 1_500_000
+        self.assertEqual([h.hand_id for h in found], [hand.hand_id, 3])
+
+    def test_hands_view_with_history_off(self):
+        self.client.force_login(self.staff)
+        with override_settings(HAND_HISTORY_DIR=None):
+            response = self.client.get(reverse("gameplay:export"), {"kind": "hands"})
+            with self.assertRaises(CommandError):
+                call_command("export", "hands", stdout=io.StringIO())
+        self.assertEqual(response.status_code, 404)
+
+    def test_ledger_date_range(self):
+        rows = list(export.ledger_rows(until=export.parse_moment("2000-01-01", end=True)))
+        self.assertEqual(rows, [])
+        self.assertEqual(len(list(export.ledger_rows(game_id=self.game.id, chunk_size=1))), 2)
+        with self.assertRaises(ValueError):
+            export.parse_moment("yesterday")
+
+    def test_hands_csv_view(self):
+        self.client.force_login(self.staff)
+        with override_settings(HAND_HISTORY_DIR=self.dir.name):
+            response = self.client.get(
+                reverse("gameplay:export"), {"kind": "hands", "format": "csv", "game": self.game.id}
+            )
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], ",".join(export.HAND_FIELDS))
+        self.assertEqual(len(lines), 3)  # one row per seat of the one hand in this game
+        self.assertIn("AS AC", lines[1])
+        self.assertIn("small_blind 10; fold 0", lines[1])
+
+    def test_hands_command_with_filters(self):
+        out = io.StringIO()
+        call_command("export", "hands", history=self.dir.name, user="bob", since="1970-01-20T00:00:00+00:00", stdout=out)
+        hands = [json.loads(line) for line in out.getvalue().splitlines()]
+        self.assertEqual([h["hand_id"] for h in hands], [2])  # hand 1 was played on January 12th
+        self.assertEqual(hands[0]["seats"][1]["payout"], 35)
+        self.assertEqual(hands[0]["actions"][-1], {"player_id": self.alice.id, "action": "fold", "chips": 0})
+
+
+class SeatingTests(TestCase):
+    def setUp(self):
+        self.game = Game.objects.create()
+        make_player(self.game, "alice", [], 0)
+        self.users = [get_user_model().objects.create_user(username=f"user{i}") for i in range(40)]
+
+    def test_query_count_does_not_grow_with_users(self):
+        Player.objects.create(user=self.users[0], seat_position=7, sitting_in=False)
+        other = Game.objects.create()
+        with CaptureQueriesContext(connection) as few:
+            seating.seat_users(other, [u.id for u in self.users[:4]])
+        with CaptureQueriesContext(connection) as many:
+            seated = seating.seat_users(self.game, [u.id for u in self.users])
+        self.assertEqual(len(few), len(many))
+        self.assertEqual(len(seated), 40)
+
+    def test_seats_follow_the_players_already_seated(self):
+        alice = Player.objects.get(user__username="alice")
+        existing = Player.objects.create(user=self.users[1], seat_position=5, sitting_in=False)
+        ids = [self.users[0].id, alice.user_id, self.users[1].id, self.users[0].id]
+        seated = seating.seat_users(self.game, ids)
+        self.assertEqual([p.user_id for p in seated], [self.users[0].id, self.users[1].id])
+        existing.refresh_from_db()
+        self.assertEqual((existing.seat_position, existing.sitting_in), (2, True))
+        self.assertEqual(sorted(self.game.players.values_list("seat_position", flat=True)), [0, 1, 2])
+        self.assertEqual(seating.seat_users(self.game, ids), [])
+
+    def test_admin_action(self):
+        staff = get_user_model().objects.create_superuser(username="staff", password="pw")
+        self.client.force_login(staff)
+        response = self.client.post(reverse("admin:accounts_customuser_changelist"), {
+            "action": "seat_users", "index": 0, "game": self.game.id,
+            "_selected_action": [u.id for u in self.users[:3]],
+        }, follow=True)
+        self.assertContains(response, f"3 users seated in Game #{self.game.id}")
+        self.assertEqual(self.game.players.count(), 4)
+
+    def test_command_creates_load_test_users(self):
+        out = io.StringIO()
+        call_command("seat_users", self.game.id, "user3", create=5, prefix="load", stdout=out)
+        self.assertEqual(out.getvalue().strip(), f"Seated 6 users in Game #{self.game.id}")
+        call_command("seat_users", self.game.id, create=5, prefix="load", stdout=out)
+        self.assertEqual(self.game.players.count(), 7)
+        self.assertEqual(ChipTransaction.objects.discrepancies(), {})
+        with self.assertRaises(CommandError):
+            call_command("seat_users", self.game.id, "nobody")
@@ -0,0 +1,132 @@
+"""
+Hand scoped unit of work.
+
+Model methods that change hand state (dealing, folding, moving money) call
+unit_of_work.save(obj, *fields) instead of obj.save(). Outside a unit of work
+that is a plain save(update_fields=...). Inside
+
+    with HandUnitOfWork():
+        ...
+
+the change is only recorded, and every recorded row is written when the
+outermost block exits: one UPDATE per model (an executemany when several
+rows of it changed), all in a single transaction. Game
+opens one per street, so a street costs a couple of writes no matter how
+many cards are drawn or players touched. unit_of_work.defer(fn) runs fn
+inside that same transaction, after the rows are written.
+"""
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.db import connections, models, router, transaction
+
+
+_current: ContextVar[Optional["HandUnitOfWork"]] = ContextVar("hand_unit_of_work", default=None)
+
+
+class HandUnitOfWork:
+    def __init__(self):
+        # (model class, pk) -> (instance, fields to write)
+        self._dirty: Dict[Tuple[type, object], Tuple[models.Model, set]] = {}
+        self._deferred: List[Callable[[], object]] = []
+        self._token = None
+
+    def __enter__(self):
+        # a nested block joins the unit of work that is already open
+        if _current.get() is not None:
+            return _current.get()
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._token is None:
+            return
+        _current.reset(self._token)
+        self._token = None
+        if exc_type is None:
+            self.flush()
+
+    def register(self, obj: models.Model, *fields: str):
+        """Mark fields of obj as changed. Unsaved objects are saved right away."""
+        if obj.pk is None:
+            obj.save()
+            return
+        if not fields:
+            fields = [f.name for f in obj._meta.concrete_fields if not f.primary_key]
+        key = (type(obj), obj.pk)
+        _, dirty_fields = self._dirty.get(key, (obj, set()))
+        # the latest instance wins, it holds the newest in-memory state
+        self._dirty[key] = (obj, dirty_fields | set(fields))
+
+    def defer(self, fn: Callable[[], object]):
+        """Run fn in the flush transaction, after the registered rows are written."""
+        self._deferred.append(fn)
+
+    def flush(self):
+        """Write everything registered so far in one transaction."""
+        if not self._dirty and not self._deferred:
+            return
+        by_model: Dict[type, Tuple[list, set]] = {}
+        for (model, _), (obj, fields) in self._dirty.items():
+            objs, all_fields = by_model.setdefault(model, ([], set()))
+            objs.append(obj)
+            all_fields |= fields
+        with transaction.atomic():
+            for model, (objs, fields) in by_model.items():
+                if len(objs) == 1:
+                    # a plain UPDATE, bulk_update's CASE building is not worth it for one row
+                    objs[0].save(update_fields=sorted(fields))
+                else:
+                    _update_rows(model, objs, sorted(fields))
+            for fn in self._deferred:
+                fn()
+        self._dirty.clear()
+        self._deferred.clear()
+
+
+def _update_rows(model, objs, field_names):
+    """
+    One parameterised UPDATE run with executemany, a row of values per object.
+    Does what bulk_update does for plain field values, without building a
+    CASE expression per field and row, which dominated flush time.
+    """
+    connection = connections[router.db_for_write(model)]
+    meta = model._meta
+    fields = [meta.get_field(name) for name in field_names]
+    qn = connection.ops.quote_name
+    sql = "UPDATE {} SET {} WHERE {} = %s".format(
+        qn(meta.db_table),
+        ", ".join(f"{qn(f.column)} = %s" for f in fields),
+        qn(meta.pk.column),
+    )
+    rows = [
+        [f.get_db_prep_save(getattr(obj, f.attname), connection) for f in fields]
+        + [meta.pk.get_db_prep_value(obj.pk, connection)]
+        for obj in objs
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def current() -> Optional[HandUnitOfWork]:
+    return _current.get()
+
+
+def save(obj: models.Model, *fields: str):
+    """Save fields of obj now, or defer them to the open unit of work."""
+    uow = _current.get()
+    if uow is not None:
+        uow.register(obj, *fields)
+    elif fields and obj.pk is not None:
+        obj.save(update_fields=fields)
+    else:
+        obj.save()
+
+
+def defer(fn: Callable[[], object]):
+    """Run fn when the open unit of work flushes, or right away outside one."""
+    uow = _current.get()
+    if uow is not None:
+        uow.defer(fn)
+    else:
+        fn()
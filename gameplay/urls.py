@@ -9,5 +9,9 @@ urlpatterns = [
     path("lobby/", LobbyView.as_view(), name="lobby"),
     path("new/", CreateNewGame.as_view(), name="new_game"),
     path("<int:game_id>/start-ajax/", StartRoundAjaxView.as_view(), name="start_round_ajax"), 
+    path("<int:game_id>/action/", ActionAjaxView.as_view(), name="action"),
+    path("<int:game_id>/state/", StateView.as_view(), name="state"),
+    path("<int:game_id>/equity/", EquityAjaxView.as_view(), name="equity"),
     path("<int:game_id>/join/", JoinGameView.as_view(), name="join_game"),
+    path("export/", ExportView.as_view(), name="export"),
 ]
\ No newline at end of file
@@ -1,10 +1,15 @@
 from django.shortcuts import redirect
 from django.views.generic import DetailView, ListView, View
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404
+from django.contrib.auth import get_user_model
+from django.contrib.auth.mixins import UserPassesTestMixin
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404
 from django.template.defaultfilters import register
+from django.utils.cache import get_conditional_response
+from django.conf import settings
 
 from .models import *
+from . import actors, db_threads, engine, equity, export, history, lobby, preflop, state
 
 class GameplayView(DetailView):
     model = Game
@@ -14,48 +19,226 @@ class GameplayView(DetailView):
 
 
 class LobbyView(ListView):
+    """Active games a page at a time: ?after=<last id> for the next page, ?big_blind= to filter."""
     model = Game
     template_name = "gameplay/lobby.html"
-    context_object_name = "game"
+    context_object_name = "games"
 
     def get_queryset(self):
-        return Game.objects.filter(game_active=True).order_by("-id")
+        try:
+            big_blind = float(self.request.GET["big_blind"])
+        except (KeyError, ValueError):
+            big_blind = None
+        after = self.request.GET.get("after", "")
+        self.page = lobby.page(big_blind, int(after) if after.isdigit() else None)
+        self.big_blind = big_blind
+        return self.page["games"]
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context.update(next_after=self.page["next"], big_blind=self.big_blind, blind_levels=lobby.blind_levels())
+        return context
 
 
 class CreateNewGame(View):
     def post(self, request, *args, **kwargs):
-        game = Game.objects.create()    
+        game = Game.objects.create()
+        lobby.invalidate()
         return redirect("gameplay:gameplay", game_id=game.id)
     
 
 class StartRoundAjaxView(View):
-    def post(self, request, game_id, *args, **kwargs):
-        game = get_object_or_404(Game, pk=game_id)
-        player, _ = Player.objects.get_or_create(user=request.user)
-        if not game.players.filter(id=player.id).exists():
-            game.players.add(player)
+    """Async: ORM lookups are awaited, dealing the hand runs on the database pool."""
+
+    async def post(self, request, game_id, *args, **kwargs):
+        game = await aget_object_or_404(Game, pk=game_id)
+        player, _ = await Player.objects.aget_or_create(user=await request.auser())
+        if not await game.players.filter(id=player.id).aexists():
+            await game.players.aadd(player)
             player.sitting_in = True
-            player.save()
+            await player.asave()
+            game.invalidate_players()
+            lobby.invalidate()
+
+        try:
+            if settings.TABLE_ACTORS:
+                result = await actors.get_runtime().astart_round(game.id)
+            else:
+                result = {"hands": await db_threads.run(self.deal, game), "version": game.version}
+        except StaleGameError:
+            return JsonResponse({"success": False, "message": "The table changed, try again."}, status=409)
+        except HandInProgressError:
+            return JsonResponse({"success": False, "message": "Finish the current hand first."}, status=409)
+        # only the caller's own cards, like state.for_player and push.for_player
+        hands = {pid: hand for pid, hand in result["hands"].items() if pid == player.id}
+        return JsonResponse({"hands": hands, "version": result["version"]})
 
+    @staticmethod
+    def deal(game):
         game.start_new_round()
+        return {p.id: p.hand for p in game.players_list()}
 
-        hands = {p.id: p.hand for p in game.players.all()}
-        return JsonResponse({"hands": hands})
-    
 
+class ActionAjaxView(View):
+    async def post(self, request, game_id, *args, **kwargs):
+        player = await aget_object_or_404(Player, user=await request.auser())
+        action, amount, version = request.POST.get("action", ""), request.POST.get("amount", 0), request.POST.get("version")
+        if settings.TABLE_ACTORS:
+            # the table's owner holds the hand, the game row is not read here
+            try:
+                chips = round(float(amount) * 100)
+            except (TypeError, ValueError):
+                return JsonResponse({"success": False, "message": "Invalid Amount"}, status=400)
+            try:
+                result = await actors.get_runtime().aact(game_id, player.id, action, chips, version)
+            except Game.DoesNotExist:
+                raise Http404("No Game matches the given query.")
+        else:
+            game = await aget_object_or_404(Game, pk=game_id)
+            result = await db_threads.run(game.apply_action, player, action, amount, version)
+        if result["success"]:
+            status = 200
+        else:
+            status = 409 if result.get("stale") else 400
+        return JsonResponse(result, status=status)
 
-class JoinGameView(View):
-    def post(self, request, game_id, *args, **kwargs):
+
+class StateView(View):
+    """
+    GET ?since=<version>: what changed at the table since that version, see
+    gameplay.state. 304 when the client's ETag is the current version.
+    """
+
+    def get(self, request, game_id, *args, **kwargs):
+        version = Game.objects.filter(pk=game_id).values_list("version", flat=True).first()
+        if version is None:
+            raise Http404("No Game matches the given query.")
+        etag = f'"{version}-{request.user.pk}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+        current = state.cached(game_id, version)
+        if current is None:
+            # read both together: the snapshot must be the one of the version it is cached under
+            version, hand_state = Game.objects.filter(pk=game_id).values_list("version", "hand_state").get()
+            etag = f'"{version}-{request.user.pk}"'
+            current = state.store(game_id, version, hand_state)
+        player_id = Player.objects.filter(user_id=request.user.pk).values_list("id", flat=True).first()
+        view = state.for_player(current, player_id)
+
+        since = request.GET.get("since", "")
+        previous = state.cached(game_id, int(since)) if since.isdigit() else None
+        if previous is not None:
+            body = {"version": version, "full": False, "changes": state.changes(state.for_player(previous, player_id), view)}
+        else:
+            body = {"version": version, "full": True, "changes": view}
+        response = JsonResponse(body, json_dumps_params={"separators": (",", ":")})
+        response["ETag"] = etag
+        return response
+
+
+class EquityAjaxView(View):
+    """
+    Win odds of the hands still in. They are worked out from everyone's hole
+    cards, so only staff see them while there is betting left; everyone else
+    once the hand is all in or shown down, on the board as it stood when the
+    last chips went in.
+    """
+
+    def get(self, request, game_id, *args, **kwargs):
         game = get_object_or_404(Game, pk=game_id)
-        player, _ = Player.objects.get_or_create(user=request.user)
+        hand = game.load_hand()
+        if hand is None:
+            return JsonResponse({"success": False, "message": "No hand in progress"}, status=400)
+        if hand.to_act is None:
+            dealt = sum(start < len(hand.log) for start in hand.streets)
+            board = hand.board[:engine.BOARD_SIZE[dealt]]
+        elif request.user.is_staff:
+            board = list(hand.board)
+        else:
+            return JsonResponse({"success": False, "message": "Equity is shown once the betting is over"}, status=403)
+        live_seats = hand.live_seats()
+        if len(live_seats) < 2:
+            return JsonResponse({"success": False, "message": "Need at least two live players"}, status=400)
+
+        hands = [seat.hand for seat in live_seats]
+        exact = len(board) >= 3
+        if exact:
+            result = equity.exact_equity(hands, board)
+        else:
+            result = equity.monte_carlo_equity(
+                hands,
+                board,
+                confidence=settings.EQUITY_CONFIDENCE,
+                margin=settings.EQUITY_MARGIN,
+                max_samples=settings.EQUITY_MAX_SAMPLES,
+            )
+        odds = {seat.player_id: stats for seat, stats in zip(live_seats, result["players"])}
+        table = preflop.get_table()
+        if not board and table is not None:
+            opponents = min(len(live_seats) - 1, preflop.MAX_OPPONENTS)
+            for seat, cards in zip(live_seats, hands):
+                odds[seat.player_id]["vs_random"] = table.equity_for_cards(cards, opponents)
+        return JsonResponse(
+            {"success": True, "equity": odds, "board": board, "samples": result["samples"], "exact": exact}
+        )
 
-        if not game.players.filter(id=player.id).exists():
-            game.players.add(player)
+
+
+class JoinGameView(View):
+    async def post(self, request, game_id, *args, **kwargs):
+        game = await aget_object_or_404(Game, pk=game_id)
+        player, _ = await Player.objects.aget_or_create(user=await request.auser())
+        await game.players.aadd(player)  # a no-op for a player already seated
 
         player.sitting_in = True
         player.is_folded = False
         player.is_all_in = False
-        player.seat_position = game.players.count() - 1
-        player.save()
+        player.seat_position = await game.players.acount() - 1
+        await player.asave()
+        game.invalidate_players()
+        lobby.invalidate()
+
+        return redirect('gameplay:gameplay', game_id )
+
+
+class ExportView(UserPassesTestMixin, View):
+    """
+    Staff only. GET ?kind=hands|ledger&format=jsonl|csv, optionally filtered by
+    game=<id>, user=<username>, since= and until= (dates or times), streamed
+    as a download. See gameplay.export.
+    """
+
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        kind, fmt = request.GET.get("kind", "ledger"), request.GET.get("format", "jsonl")
+        if kind not in export.KINDS or fmt not in export.FORMATS:
+            return JsonResponse({"success": False, "message": "Unknown kind or format"}, status=400)
+        filters = {}
+        try:
+            if request.GET.get("game"):
+                filters["game_id"] = int(request.GET["game"])
+            filters["since"] = export.parse_moment(request.GET.get("since"))
+            filters["until"] = export.parse_moment(request.GET.get("until"), end=True)
+        except ValueError as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=400)
+        if request.GET.get("user"):
+            user = get_user_model().objects.filter(username=request.GET["user"]).only("id").first()
+            if user is None:
+                return JsonResponse({"success": False, "message": "Unknown user"}, status=400)
+            filters["user_id"] = user.id
 
-        return redirect('gameplay:gameplay', game_id )
\ No newline at end of file
+        store = None
+        if kind == "hands":
+            if settings.HAND_HISTORY_DIR is None:
+                return JsonResponse({"success": False, "message": "Hand history is turned off"}, status=404)
+            store = history.HandHistory(settings.HAND_HISTORY_DIR)
+        lines = export.export(kind, fmt, store, **filters)
+        response = StreamingHttpResponse(
+            export.chunked(lines), content_type="text/csv" if fmt == "csv" else "application/x-ndjson"
+        )
+        response["Content-Disposition"] = f'attachment; filename="{kind}.{fmt}"'
+        return response
@@ -1,5 +1,13 @@
-function cardPath(rankSuitArr) {
-    return `/static/images/cards/${rankSuitArr[0]}${rankSuitArr[1]}.png`;
+// cards arrive as ints 0..51: rank index * 4 + suit index (see gameplay/evaluator.py)
+const RANKS = "23456789TJQKA";
+const SUITS = "SCHD";
+
+function cardName(card) {
+    return `${RANKS[card >> 2]}${SUITS[card & 3]}`;
+  }
+
+function cardPath(card) {
+    return `/static/images/cards/${cardName(card)}.png`;
   }
   
   // update the two <img> tags that already exist in the HTML
@@ -25,10 +33,48 @@ function cardPath(rankSuitArr) {
     });
   }
   
+  // live table updates pushed over a WebSocket, see gameplay/push.py for the events
+  function applyTableEvent(event) {
+    if (event.type === "deal" || event.type === "showdown") {
+      updateCards(event.hands);
+    } else if (event.type === "board") {
+      event.cards.forEach((card, i) => {
+        const img = document.querySelector(`#board-card${i + 1}`);
+        if (img) img.src = cardPath(card);
+      });
+    }
+    const pot = document.querySelector("#pot");
+    if (pot) pot.textContent = (event.pot / 100).toFixed(2);
+  }
+
+  // the consumer accepts and then closes with this code when the user is not logged in
+  const SOCKET_REJECTED = 4003;
+  const MAX_RETRY_DELAY = 30000;
+  const MAX_FAILED_CONNECTS = 8;
+
+  function connectTable(path, failures = 0) {
+    const scheme = window.location.protocol === "https:" ? "wss" : "ws";
+    const socket = new WebSocket(`${scheme}://${window.location.host}${path}`);
+    let opened = false;
+    socket.addEventListener("open", () => { opened = true; });
+    socket.addEventListener("message", (message) => {
+      JSON.parse(message.data).events.forEach(applyTableEvent);
+    });
+    // reconnect after server restarts or network drops, backing off while it keeps failing
+    socket.addEventListener("close", (event) => {
+      if (event.code === SOCKET_REJECTED) return;
+      failures = opened ? 0 : failures + 1;
+      if (failures >= MAX_FAILED_CONNECTS) return;
+      const delay = Math.min(MAX_RETRY_DELAY, 1000 * 2 ** failures) * (0.5 + Math.random() / 2);
+      setTimeout(() => connectTable(path, failures), delay);
+    });
+  }
+
   // one-time wiring for the Start button
   document.addEventListener("DOMContentLoaded", () => {
     const btn = document.getElementById("start-btn");
     if (!btn) return;
+    if (btn.dataset.socketPath) connectTable(btn.dataset.socketPath);
   
     btn.addEventListener("click", async () => {
       const url   = btn.dataset.url;
@@ -44,7 +90,7 @@ function cardPath(rankSuitArr) {
         return;
       }
   
-      const data = await res.json();   // {hands: {12:[["A","S"],["K","C"]], …}}
+      const data = await res.json();   // {hands: {12:[48, 45], …}}
       updateCards(data.hands);
     });
   });